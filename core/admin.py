@@ -1,8 +1,15 @@
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
 from adminsortable2.admin import SortableInlineAdminMixin, SortableAdminBase
 from django.utils.safestring import mark_safe
-from .models import Propiedad, ImagenPropiedad, Agente, Lead, CarouselSlide
+from django.db.models import Count, Q
+from django.utils.text import smart_split, unescape_string_literal
+from .models import (
+    Propiedad, ImagenPropiedad, Agente, Lead, CarouselSlide, BusquedaGuardada, AvisoBusqueda, ValorMercadoComuna,
+    FotoPendiente,
+)
+from .texto import normalizar
+from . import cola_fotos
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -77,6 +84,43 @@ class ImagenPropiedadInline(admin.TabularInline):
     preview.short_description = "Vista Previa"
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# ESTADO DE LAS FOTOS SUBIDAS EN LOTE (las procesa `procesar_fotos`)
+# ─────────────────────────────────────────────────────────────────────────────
+
+COLORES_ESTADO_FOTO = {
+    FotoPendiente.PENDIENTE:  "#6c757d",
+    FotoPendiente.PROCESANDO: "#0d6efd",
+    FotoPendiente.LISTA:      "#198754",
+    FotoPendiente.ERROR:      "#dc3545",
+}
+
+
+def estado_foto_badge(obj):
+    color = COLORES_ESTADO_FOTO.get(obj.estado, "#6c757d")
+    return mark_safe(
+        f'<span style="background:{color};color:#fff;padding:2px 10px;'
+        f'border-radius:20px;font-size:0.78rem;font-weight:600;">{obj.get_estado_display()}</span>'
+    )
+estado_foto_badge.short_description = "Estado"
+
+
+class FotoPendienteInline(admin.TabularInline):
+    model = FotoPendiente
+    extra = 0
+    can_delete = False
+    verbose_name_plural = "⏳ Fotos subidas en lote — se agregan a la galería al terminar de procesarse"
+    fields = ("nombre", "estado_badge", "error", "creado", "actualizado")
+    readonly_fields = fields
+
+    def estado_badge(self, obj):
+        return estado_foto_badge(obj)
+    estado_badge.short_description = "Estado"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # FORMULARIO DE PROPIEDAD (con campo múltiple corregido)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -87,7 +131,8 @@ class PropiedadAdminForm(forms.ModelForm):
         label="Fotos múltiples",
         help_text=(
             "Selecciona varias imágenes a la vez (Ctrl+clic o Cmd+clic). "
-            "Las fotos subidas aquí aparecerán ordenadas visualmente en la galería de abajo."
+            "Se procesan en segundo plano: su estado aparece en «Fotos subidas en lote» "
+            "y al quedar listas se agregan al final de la galería."
         ),
     )
 
@@ -108,9 +153,10 @@ class PropiedadAdmin(SortableAdminBase, admin.ModelAdmin):
         "comuna", "precio_uf", "publicada", "destacada", "fotos_count"
     )
     list_filter  = ("tipo_operacion", "tipo_propiedad", "comuna", "publicada", "destacada")
-    search_fields = ("titulo", "descripcion", "comuna", "direccion")
+    # Columnas normalizadas: "penalolen" encuentra "Peñalolén" (ver get_search_results)
+    search_fields = ("titulo_norm", "descripcion_norm", "comuna_norm", "direccion")
     prepopulated_fields = {"slug": ("titulo",)}
-    inlines = [ImagenPropiedadInline]
+    inlines = [ImagenPropiedadInline, FotoPendienteInline]
     list_editable = ("publicada", "destacada")
 
     fieldsets = (
@@ -123,7 +169,8 @@ class PropiedadAdmin(SortableAdminBase, admin.ModelAdmin):
             "description": "Ingresa el valor en UF. El campo CLP es solo para compatibilidad con registros antiguos.",
         }),
         ("Ubicación", {
-            "fields": ("region", "comuna", "direccion"),
+            "fields": ("region", "comuna", "direccion", ("latitud", "longitud")),
+            "description": "Sin coordenadas, el mapa ubica la propiedad en el centro de su comuna.",
         }),
         ("Características", {
             "fields": (
@@ -148,8 +195,12 @@ class PropiedadAdmin(SortableAdminBase, admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Conteo de fotos en el mismo SELECT del changelist (antes un COUNT por fila)
+        return super().get_queryset(request).annotate(_fotos=Count("imagenes"))
+
     def fotos_count(self, obj):
-        count = obj.imagenes.count()
+        count = obj._fotos
         if count == 0:
             color = "#dc3545"
             texto = "Sin fotos"
@@ -163,17 +214,37 @@ class PropiedadAdmin(SortableAdminBase, admin.ModelAdmin):
             f'<span style="color:{color};font-weight:600;">{texto}</span>'
         )
     fotos_count.short_description = "Galería"
+    fotos_count.admin_order_field = "_fotos"
 
     class Media:
         js = ('core/js/drag_drop.js',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Como el admin: cada palabra debe estar en alguno de los campos. En las
+        # columnas *_norm va normalizada; en el resto (direccion), tal cual.
+        condicion = Q()
+        for palabra in smart_split(search_term):
+            if palabra[:1] in ('"', "'") and palabra[-1:] == palabra[:1]:
+                palabra = unescape_string_literal(palabra)
+            alguna = Q()
+            for campo in self.search_fields:
+                termino = normalizar(palabra) if campo.endswith("_norm") else palabra
+                alguna |= Q(**{f"{campo}__icontains": termino})
+            condicion &= alguna
+        return queryset.filter(condicion), False
+
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        # Procesar la lista de archivos del campo múltiple
-        archivos = form.cleaned_data.get('fotos_multiples') or []
-        for f in archivos:
-            if f:
-                ImagenPropiedad.objects.create(propiedad=obj, imagen=f)
+        # Las fotos del campo múltiple solo se dejan en cola: subirlas al
+        # storage dentro del request hacía que gunicorn lo cortara
+        archivos = [f for f in form.cleaned_data.get('fotos_multiples') or [] if f]
+        if archivos:
+            cola_fotos.encolar(obj, archivos)
+            messages.info(
+                request,
+                f"{len(archivos)} foto{'s' if len(archivos) != 1 else ''} en proceso; "
+                "se agregarán a la galería en unos minutos.",
+            )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -198,6 +269,7 @@ class LeadAdmin(admin.ModelAdmin):
     search_fields = ("nombre", "email", "telefono", "mensaje")
     readonly_fields = ("creado",)
     date_hierarchy = "creado"
+    list_select_related = ("propiedad",)
 
     def origen_badge(self, obj):
         colores = {
@@ -242,3 +314,74 @@ class CarouselSlideAdmin(admin.ModelAdmin):
         return "—"
     preview.short_description = "Preview"
     preview.admin_order_field = "imagen"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ADMIN DE BÚSQUEDAS GUARDADAS Y AVISOS
+# ─────────────────────────────────────────────────────────────────────────────
+
+@admin.register(BusquedaGuardada)
+class BusquedaGuardadaAdmin(admin.ModelAdmin):
+    list_display  = ("email", "filtros", "activa", "confirmada", "creado")
+    list_filter   = ("activa", ("confirmada", admin.EmptyFieldListFilter), "tipo_operacion", "tipo_propiedad", "comuna")
+    search_fields = ("email",)
+    list_editable = ("activa",)
+    readonly_fields = ("token", "confirmada", "creado")
+
+    def filtros(self, obj):
+        return obj.querystring() or "—"
+    filtros.short_description = "Filtros"
+
+
+@admin.register(AvisoBusqueda)
+class AvisoBusquedaAdmin(admin.ModelAdmin):
+    list_display  = ("busqueda", "propiedad", "creado", "enviado")
+    list_filter   = ("enviado",)
+    search_fields = ("busqueda__email",)
+    list_select_related = ("busqueda", "propiedad")
+    raw_id_fields = ("busqueda", "propiedad")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ADMIN DE VALORES DE MERCADO (solo lectura: los calculan las señales)
+# ─────────────────────────────────────────────────────────────────────────────
+
+@admin.register(ValorMercadoComuna)
+class ValorMercadoComunaAdmin(admin.ModelAdmin):
+    list_display  = ("comuna", "tipo_propiedad", "uf_m2", "muestras", "actualizado")
+    list_filter   = ("tipo_propiedad",)
+    search_fields = ("comuna",)
+    ordering      = ("comuna", "tipo_propiedad")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ADMIN DE FOTOS EN PROCESO
+# ─────────────────────────────────────────────────────────────────────────────
+
+@admin.register(FotoPendiente)
+class FotoPendienteAdmin(admin.ModelAdmin):
+    list_display  = ("nombre", "propiedad", "estado_badge", "creado", "actualizado")
+    list_filter   = ("estado",)
+    search_fields = ("nombre", "propiedad__titulo")
+    list_select_related = ("propiedad",)
+    readonly_fields = ("propiedad", "archivo", "nombre", "orden", "estado", "error", "imagen", "creado", "actualizado")
+    actions = ("reintentar",)
+
+    def estado_badge(self, obj):
+        return estado_foto_badge(obj)
+    estado_badge.short_description = "Estado"
+    estado_badge.admin_order_field = "estado"
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Reintentar las fotos con error")
+    def reintentar(self, request, queryset):
+        n = cola_fotos.reintentar(queryset)
+        self.message_user(request, f"{n} foto{'s' if n != 1 else ''} de vuelta en la cola.")
@@ -0,0 +1,233 @@
+"""
+Avisos de búsquedas guardadas: qué búsquedas calzan con una propiedad
+recién publicada, sin recorrerlas todas.
+
+IndiceBusquedas es un índice invertido en forma de bitmaps (NumPy): por cada
+valor de comuna, operación y tipo hay un arreglo booleano con las búsquedas
+que lo piden o que no filtran por ese campo, y lo mismo por tramo de precio
+(tramos de medio octavo en UF: un rango 3.000-6.000 cae en 2-3 tramos).
+Los candidatos de una propiedad son el AND de 4 bitmaps; el resto de los
+filtros (precio exacto, dormitorios, región, texto) se verifica solo sobre
+esos candidatos.
+
+Solo participan las búsquedas confirmadas por email (doble opt-in:
+`enviar_confirmacion` al guardarla). Flujo: la señal de Propiedad deja una PublicacionPendiente; el comando
+`enviar_avisos_busquedas` arma el índice una vez, empareja todo el lote
+pendiente, deja los calces en AvisoBusqueda (bandeja de salida) y despacha
+un solo correo por email.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import AvisoBusqueda, BusquedaGuardada, Propiedad, PublicacionPendiente
+from .texto import normalizar
+
+CAMPOS_BUSQUEDA = (
+    "id", "q", "region", "tipo_operacion", "tipo_propiedad", "comuna",
+    "min_precio", "max_precio", "dormitorios",
+)
+CAMPOS_PROPIEDAD = (
+    "id", "titulo_norm", "descripcion_norm", "comuna_norm", "region", "tipo_operacion",
+    "tipo_propiedad", "comuna", "precio_uf_efectivo", "dormitorios",
+)
+# Campos indexados con bitmap por valor
+CAMPOS_INVERTIDOS = ("comuna", "tipo_operacion", "tipo_propiedad")
+
+TRAMOS_POR_OCTAVO = 2
+# Tramo máximo (~1.000.000 UF): los rangos abiertos "desde X" llegan hasta acá
+TRAMO_MAX = int(math.log2(1_000_000) * TRAMOS_POR_OCTAVO)
+SIN_PRECIO = 0  # tramo de propiedades sin precio (solo calzan búsquedas sin rango)
+
+
+def tramo(precio):
+    if not precio or precio < 1:
+        return SIN_PRECIO
+    return min(TRAMO_MAX, 1 + int(math.log2(float(precio)) * TRAMOS_POR_OCTAVO))
+
+
+class IndiceBusquedas:
+    def __init__(self, busquedas):
+        busquedas = list(busquedas)
+        n = len(busquedas)
+        self.n = n
+        self.ids = np.array([b["id"] for b in busquedas], dtype=np.int64)
+        self.min_precio = np.array([b["min_precio"] or 0 for b in busquedas], dtype=np.float64)
+        self.max_precio = np.array(
+            [b["max_precio"] if b["max_precio"] is not None else np.inf for b in busquedas], dtype=np.float64
+        )
+        self.dormitorios = np.array([b["dormitorios"] or 0 for b in busquedas], dtype=np.int32)
+        # Filtros poco comunes: se verifican en Python sobre los candidatos
+        self.region = {i: b["region"] for i, b in enumerate(busquedas) if b["region"]}
+        self.q = {i: normalizar(b["q"]) for i, b in enumerate(busquedas) if b["q"]}
+        self.con_extra = np.zeros(n, dtype=bool)
+        self.con_extra[list(self.region.keys() | self.q.keys())] = True
+
+        # Bitmaps por valor (incluye las búsquedas sin ese filtro)
+        self.bitmaps = {}
+        self._comodin = {}
+        for campo in CAMPOS_INVERTIDOS:
+            valores = np.array([b[campo] or "" for b in busquedas], dtype=object)
+            comodin = valores == ""
+            self._comodin[campo] = comodin
+            self.bitmaps[campo] = {
+                v: (valores == v) | comodin for v in set(valores.tolist()) if v
+            }
+
+        # Bitmaps por tramo de precio
+        sin_rango = (self.min_precio <= 0) & np.isinf(self.max_precio)
+        desde = np.array([tramo(p) if p > 0 else 1 for p in self.min_precio], dtype=np.int32)
+        hasta = np.array([tramo(p) if np.isfinite(p) else TRAMO_MAX for p in self.max_precio], dtype=np.int32)
+        self.tramos = np.zeros((TRAMO_MAX + 1, n), dtype=bool)
+        self.tramos[SIN_PRECIO] = sin_rango
+        for t in range(1, TRAMO_MAX + 1):
+            self.tramos[t] = sin_rango | ((desde <= t) & (hasta >= t))
+
+    @classmethod
+    def desde_bd(cls):
+        return cls(
+            BusquedaGuardada.objects.filter(activa=True, confirmada__isnull=False)
+            .order_by("id")
+            .values(*CAMPOS_BUSQUEDA)
+            .iterator(chunk_size=5000)
+        )
+
+    def _bitmap(self, campo, valor):
+        bitmap = self.bitmaps[campo].get(valor)
+        return bitmap if bitmap is not None else self._comodin[campo]
+
+    def calces(self, prop):
+        """Ids de las búsquedas que calzan con `prop` (dict de CAMPOS_PROPIEDAD)."""
+        if not self.n:
+            return []
+        # Mismo precio que filtra el listado: las publicadas solo en pesos van a la UF del día
+        precio = float(prop["precio_uf_efectivo"]) if prop["precio_uf_efectivo"] else None
+        mascara = self.tramos[tramo(precio)].copy()
+        for campo in CAMPOS_INVERTIDOS:
+            mascara &= self._bitmap(campo, prop[campo])
+        candidatos = np.flatnonzero(mascara)
+        if not len(candidatos):
+            return []
+
+        # Verificación exacta, vectorizada sobre los candidatos
+        if precio is not None:
+            candidatos = candidatos[
+                (self.min_precio[candidatos] <= precio) & (self.max_precio[candidatos] >= precio)
+            ]
+        candidatos = candidatos[self.dormitorios[candidatos] <= (prop["dormitorios"] or 0)]
+
+        # Región y texto (pocas búsquedas los usan): en Python, solo para esas
+        con_extra = self.con_extra[candidatos]
+        resultado = self.ids[candidatos[~con_extra]].tolist()
+        textos = (prop["titulo_norm"], prop["descripcion_norm"], prop["comuna_norm"])
+        for i in candidatos[con_extra].tolist():
+            region = self.region.get(i)
+            if region and region != prop["region"]:
+                continue
+            termino = self.q.get(i)
+            # Misma semántica que busqueda.filtro_fallback
+            if termino and not any(termino in t for t in textos):
+                continue
+            resultado.append(int(self.ids[i]))
+        return resultado
+
+
+# ===========================
+# Emparejar y despachar
+# ===========================
+def marcar_publicada(prop):
+    """La llama la señal cuando una propiedad pasa a publicada."""
+    PublicacionPendiente.objects.get_or_create(propiedad=prop)
+
+
+def emparejar_pendientes(lote=500, indice=None):
+    """
+    Compara las publicaciones pendientes contra todas las búsquedas activas
+    y deja los calces en la bandeja de salida. Retorna (propiedades, avisos).
+    """
+    pendientes = list(PublicacionPendiente.objects.order_by("id")[:lote])
+    if not pendientes:
+        return 0, 0
+    indice = indice or IndiceBusquedas.desde_bd()
+    props = Propiedad.objects.filter(
+        id__in=[p.propiedad_id for p in pendientes], publicada=True
+    ).values(*CAMPOS_PROPIEDAD)
+
+    avisos = [
+        AvisoBusqueda(busqueda_id=busqueda_id, propiedad_id=prop["id"])
+        for prop in props
+        for busqueda_id in indice.calces(prop)
+    ]
+    with transaction.atomic():
+        AvisoBusqueda.objects.bulk_create(avisos, batch_size=1000, ignore_conflicts=True)
+        PublicacionPendiente.objects.filter(id__in=[p.id for p in pendientes]).delete()
+    return len(pendientes), len(avisos)
+
+
+def _mensaje(email, avisos, base_url):
+    lineas = ["Hay nuevas propiedades que calzan con tus búsquedas guardadas:", ""]
+    bajas = {}
+    for aviso in avisos:
+        prop = aviso.propiedad
+        url = base_url + reverse("core:propiedad_detail", args=[prop.slug])
+        precio = f" — {prop.precio_uf_efectivo:,.0f} UF".replace(",", ".") if prop.precio_uf_efectivo else ""
+        lineas.append(f"• {prop.titulo} ({prop.comuna}){precio}\n  {url}")
+        bajas[aviso.busqueda.token] = aviso.busqueda
+    lineas += ["", "Para dejar de recibir estos avisos:"]
+    for token, busqueda in bajas.items():
+        url = base_url + reverse("core:busqueda_baja", args=[token])
+        lineas.append(f"  {busqueda.querystring() or 'todas las propiedades'}: {url}")
+    return EmailMessage(
+        subject="Nuevas propiedades para tu búsqueda | KCM",
+        body="\n".join(lineas),
+        to=[email],
+    )
+
+
+def enviar_confirmacion(busqueda, base_url=None):
+    """Correo con el link para confirmar una búsqueda recién guardada (sin confirmar no hay avisos)."""
+    base_url = (base_url or getattr(settings, "SITIO_URL", "")).rstrip("/")
+    url = base_url + reverse("core:busqueda_confirmar", args=[busqueda.token])
+    EmailMessage(
+        subject="Confirma tu búsqueda guardada | KCM",
+        body="\n".join([
+            "Alguien (ojalá tú) pidió avisos a este correo de nuevas propiedades para:",
+            f"  {busqueda.querystring() or 'todas las propiedades'}",
+            "",
+            f"Para activarlos, confirma aquí: {url}",
+            "",
+            "Si no fuiste tú, ignora este correo: no te enviaremos nada más.",
+        ]),
+        to=[busqueda.email],
+    ).send()
+
+
+def enviar(lote=1000, base_url=None):
+    """
+    Despacha los avisos pendientes agrupados por email (un correo por
+    persona, una sola conexión SMTP). Retorna cuántos correos salieron.
+    """
+    base_url = (base_url or getattr(settings, "SITIO_URL", "")).rstrip("/")
+    avisos = list(
+        AvisoBusqueda.objects.filter(
+            enviado__isnull=True, busqueda__activa=True, busqueda__confirmada__isnull=False
+        )
+        .select_related("busqueda", "propiedad")
+        .order_by("id")[:lote]
+    )
+    if not avisos:
+        return 0
+    por_email = defaultdict(list)
+    for aviso in avisos:
+        por_email[aviso.busqueda.email].append(aviso)
+
+    mensajes = [_mensaje(email, grupo, base_url) for email, grupo in por_email.items()]
+    get_connection().send_messages(mensajes)
+    AvisoBusqueda.objects.filter(id__in=[a.id for a in avisos]).update(enviado=timezone.now())
+    return len(mensajes)
@@ -0,0 +1,186 @@
+"""
+Autocompletado del buscador: índice de prefijos (trie) en memoria del proceso.
+
+Sugiere comunas (COMUNAS_RM), tipos de propiedad y títulos publicados. Cada
+nodo del trie guarda ya calculadas sus mejores `TOP_POR_NODO` sugerencias,
+así que responder un prefijo cuesta recorrer len(prefijo) nodos: nada de BD
+por tecla.
+
+Todo se indexa normalizado (core.texto.normalizar) y por cada palabra, de
+modo que "condes" y "penalolen" encuentran "Las Condes" y "Peñalolén".
+
+El índice vive en una CacheLocal de una entrada: las señales de Propiedad lo
+descartan y el siguiente request lo reconstruye (una sola vez por worker).
+En los demás workers manda el TTL.
+"""
+import threading
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+
+from .cache_local import CacheLocal
+from .models import COMUNAS_RM, TIPO_PROPIEDAD, Propiedad
+from .texto import normalizar
+
+TOP_POR_NODO = 10
+# Nadie escribe más que esto antes de elegir: acota el tamaño del trie
+MAX_PROFUNDIDAD = 20
+# Palabras más cortas ("en", "de", "la") no inician una entrada propia
+MIN_LARGO_PALABRA = 3
+
+# Peso base por tipo: a igual prefijo, primero comunas, luego tipos y títulos
+PESO_COMUNA = 3_000_000
+PESO_TIPO = 2_000_000
+PESO_TITULO = 0
+
+# Campos de Propiedad que cambian las sugerencias
+CAMPOS_ESTADO = ("publicada", "titulo", "slug", "destacada")
+
+cache = CacheLocal(
+    "autocompletar",
+    max_entradas=1,
+    ttl=getattr(settings, "AUTOCOMPLETAR_TTL", 5 * 60),
+)
+_lock_construccion = threading.Lock()
+_ultimo = None  # último trie construido, para responder durante una reconstrucción
+
+
+class Sugerencia:
+    __slots__ = ("texto", "tipo", "url", "peso")
+
+    def __init__(self, texto, tipo, url, peso):
+        self.texto = texto
+        self.tipo = tipo
+        self.url = url
+        self.peso = peso
+
+    def como_dict(self):
+        return {"texto": self.texto, "tipo": self.tipo, "url": self.url}
+
+
+class _Nodo:
+    __slots__ = ("hijos", "mejores")
+
+    def __init__(self):
+        self.hijos = {}
+        self.mejores = []  # Sugerencias, de mayor a menor peso, máx. TOP_POR_NODO
+
+
+class Trie:
+    def __init__(self):
+        self.raiz = _Nodo()
+
+    def agregar(self, clave, sugerencia):
+        """Indexa `sugerencia` bajo los prefijos de `clave` (ya normalizada)."""
+        nodo = self.raiz
+        for ch in clave[:MAX_PROFUNDIDAD]:
+            nodo = nodo.hijos.setdefault(ch, _Nodo())
+            mejores = nodo.mejores
+            if sugerencia in mejores:
+                continue  # otra palabra de la misma sugerencia ya pasó por aquí
+            if len(mejores) < TOP_POR_NODO or sugerencia.peso > mejores[-1].peso:
+                mejores.append(sugerencia)
+                mejores.sort(key=lambda s: -s.peso)
+                del mejores[TOP_POR_NODO:]
+
+    def agregar_texto(self, texto, sugerencia):
+        """Indexa por el texto completo y desde cada palabra siguiente."""
+        norm = normalizar(texto)
+        self.agregar(norm, sugerencia)
+        palabras = norm.split(" ")
+        for i in range(1, len(palabras)):
+            if len(palabras[i]) >= MIN_LARGO_PALABRA:
+                self.agregar(" ".join(palabras[i:]), sugerencia)
+
+    def buscar(self, prefijo, limite=TOP_POR_NODO):
+        nodo = self.raiz
+        for ch in normalizar(prefijo)[:MAX_PROFUNDIDAD]:
+            nodo = nodo.hijos.get(ch)
+            if nodo is None:
+                return []
+        return nodo.mejores[:limite]
+
+
+def construir(titulos=None):
+    """
+    Arma el trie. `titulos` es un iterable de (titulo, slug, destacada);
+    por defecto, los de las propiedades publicadas (una sola consulta).
+    """
+    from . import facetas
+
+    conteos = facetas.conteos()
+    por_comuna = conteos.get("comuna", {})
+    por_tipo = conteos.get("tipo_propiedad", {})
+    listado = reverse("core:propiedad_list")
+    # Un reverse() por título sale caro con miles de filas
+    detalle = reverse("core:propiedad_detail", args=["slug"]).rsplit("slug", 1)
+
+    trie = Trie()
+    for comuna in COMUNAS_RM:
+        trie.agregar_texto(comuna, Sugerencia(
+            comuna, "comuna", f"{listado}?{urlencode({'comuna': comuna})}", PESO_COMUNA + por_comuna.get(comuna, 0),
+        ))
+    for valor, etiqueta in TIPO_PROPIEDAD:
+        trie.agregar_texto(etiqueta, Sugerencia(
+            etiqueta, "tipo_propiedad", f"{listado}?{urlencode({'tipo_propiedad': valor})}", PESO_TIPO + por_tipo.get(valor, 0),
+        ))
+
+    if titulos is None:
+        titulos = (
+            Propiedad.objects.filter(publicada=True)
+            .order_by("-creado")
+            .values_list("titulo", "slug", "destacada")
+            .iterator(chunk_size=2000)
+        )
+    # Más recientes primero: el peso decrece con el orden de llegada
+    for i, (titulo, slug, destacada) in enumerate(titulos):
+        peso = PESO_TITULO + (1_000_000 if destacada else 0) - i
+        trie.agregar_texto(titulo, Sugerencia(
+            titulo, "propiedad", slug.join(detalle), peso,
+        ))
+    return trie
+
+
+def indice():
+    """
+    Trie vigente. Si hay que reconstruirlo, lo hace un solo thread; los
+    demás siguen respondiendo con el anterior mientras tanto (si existe).
+    """
+    global _ultimo
+    trie = cache.obtener("indice")
+    if trie is not None:
+        return trie
+    if _ultimo is not None and not _lock_construccion.acquire(blocking=False):
+        return _ultimo
+    if _ultimo is None:
+        _lock_construccion.acquire()
+    try:
+        trie = cache.obtener("indice")
+        if trie is None:
+            trie = cache.guardar("indice", construir())
+            _ultimo = trie
+        return trie
+    finally:
+        _lock_construccion.release()
+
+
+def sugerir(q, limite=8):
+    q = (q or "").strip()
+    if not q:
+        return []
+    return [s.como_dict() for s in indice().buscar(q, limite)]
+
+
+def invalidar():
+    cache.descartar_si(lambda clave, valor: True)
+
+
+def invalidar_por_cambio(anterior, nuevo):
+    """Descarta el índice solo si cambió algo que se sugiere."""
+    if anterior is None or nuevo is None:
+        if (anterior or nuevo or {}).get("publicada"):
+            invalidar()
+        return
+    if any(anterior.get(c) != nuevo.get(c) for c in CAMPOS_ESTADO):
+        invalidar()
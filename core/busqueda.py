@@ -0,0 +1,150 @@
+"""
+Motor de búsqueda de texto para el parámetro `q` del listado.
+
+- SQLite: tabla virtual FTS5 `core_propiedad_fts` (rowid = id de Propiedad),
+  sincronizada desde las señales de Propiedad.
+- MySQL (USE_MYSQL=1): índice FULLTEXT sobre core_propiedad; MySQL lo
+  mantiene solo.
+- Cualquier otro caso (SQLite sin FTS5, otra base): contains sobre las
+  columnas normalizadas *_norm (ver filtro_fallback).
+
+La búsqueda devuelve ids ordenados por relevancia; la vista pagina sobre esa
+lista, así que la latencia depende de los aciertos y no del tamaño del catálogo.
+Los demás filtros (publicada, comuna, precio...) entran en el mismo SELECT,
+antes del LIMIT: si no, el tope se llenaría con filas que después se descartan.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .texto import normalizar
+
+FTS_TABLA = "core_propiedad_fts"
+FULLTEXT_INDICE = "prop_fulltext_idx"
+FULLTEXT_COLUMNAS = ("titulo", "descripcion", "comuna")
+
+# Tope de resultados rankeados: nadie navega más allá de esto en una búsqueda
+MAX_RESULTADOS = 1000
+
+# Pesos bm25 por columna (titulo, descripcion, comuna)
+PESOS_BM25 = (10.0, 1.0, 5.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Caché por proceso de "¿existe la tabla FTS?" (alias de conexión -> bool)
+_fts_disponible = {}
+
+
+def _tokens(q):
+    return _TOKEN_RE.findall(q or "")
+
+
+def motor():
+    """
+    Retorna 'fts5', 'mysql' o None según lo que soporte la conexión actual.
+    """
+    if connection.vendor == "mysql":
+        return "mysql"
+    if connection.vendor != "sqlite":
+        return None
+    alias = connection.alias
+    if alias not in _fts_disponible:
+        _fts_disponible[alias] = FTS_TABLA in connection.introspection.table_names()
+    return "fts5" if _fts_disponible[alias] else None
+
+
+def _expresion_fts5(tokens):
+    # Cada término entre comillas (escapa operadores FTS) y como prefijo
+    return " ".join('"{}"*'.format(t.replace('"', '""')) for t in tokens)
+
+
+def _expresion_mysql(tokens):
+    # Modo BOOLEAN: todos los términos obligatorios y como prefijo
+    return " ".join(f"+{t}*" for t in tokens)
+
+
+def buscar_ids(q, queryset=None, limite=MAX_RESULTADOS):
+    """
+    Ids de Propiedad que calzan con `q`, del más al menos relevante.
+    Con `queryset` (los demás filtros del listado) solo cuentan sus filas.
+    Retorna None si no hay motor de texto disponible (usar `filtro_fallback`).
+    """
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+
+    m = motor()
+    if m is None:
+        return None
+    filtro, filtro_params = "", []
+    if queryset is not None:
+        subconsulta, filtro_params = queryset.order_by().values("pk").query.sql_with_params()
+        filtro = f" AND {'rowid' if m == 'fts5' else 'id'} IN ({subconsulta})"
+    if m == "fts5":
+        pesos = ", ".join(str(p) for p in PESOS_BM25)
+        sql = (
+            f"SELECT rowid FROM {FTS_TABLA} WHERE {FTS_TABLA} MATCH %s{filtro} "
+            f"ORDER BY bm25({FTS_TABLA}, {pesos}) LIMIT %s"
+        )
+        params = [_expresion_fts5(tokens), *filtro_params, limite]
+    else:
+        cols = ", ".join(FULLTEXT_COLUMNAS)
+        match = f"MATCH({cols}) AGAINST (%s IN BOOLEAN MODE)"
+        sql = f"SELECT id FROM core_propiedad WHERE {match}{filtro} ORDER BY {match} DESC LIMIT %s"
+        expr = _expresion_mysql(tokens)
+        params = [expr, *filtro_params, expr, limite]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filtro_fallback(q):
+    """
+    Filtro sin motor de texto: contains sobre las columnas *_norm, con el
+    término normalizado igual que ellas ("nunoa" encuentra "Ñuñoa").
+    """
+    termino = normalizar(q)
+    return (
+        Q(titulo_norm__contains=termino)
+        | Q(descripcion_norm__contains=termino)
+        | Q(comuna_norm__contains=termino)
+    )
+
+
+# ===========================
+# Sincronización del índice FTS5
+# ===========================
+def indexar(prop):
+    if motor() != "fts5":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLA} WHERE rowid = %s", [prop.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLA} (rowid, titulo, descripcion, comuna) VALUES (%s, %s, %s, %s)",
+            [prop.pk, prop.titulo, prop.descripcion, prop.comuna],
+        )
+
+
+def desindexar(pk):
+    if motor() != "fts5":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLA} WHERE rowid = %s", [pk])
+
+
+def reconstruir_indice():
+    """
+    Repuebla el índice desde core_propiedad (p.ej. tras bulk_create o
+    un queryset.update(), que no disparan señales). Retorna filas indexadas.
+    """
+    if motor() != "fts5":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLA}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLA} (rowid, titulo, descripcion, comuna) "
+            f"SELECT id, titulo, descripcion, comuna FROM core_propiedad"
+        )
+        return cursor.rowcount
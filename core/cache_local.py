@@ -0,0 +1,91 @@
+"""
+Caché en memoria del proceso (por worker de gunicorn): LRU acotada con TTL y
+contadores de aciertos/fallos.
+
+Se usa para estructuras que no conviene serializar a la caché de Django en
+cada request (listas de ids, índices). La invalidación la hacen las señales
+de Propiedad en el worker que escribe; en los demás workers manda el TTL.
+
+Cada instancia queda registrada por nombre para poder verlas en
+/api/metricas/ y limpiarlas todas de una vez (tests, deploys).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_registro = {}
+
+
+class CacheLocal:
+    def __init__(self, nombre, max_entradas=256, ttl=120, reloj=time.monotonic):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._reloj = reloj
+        self._datos = OrderedDict()  # clave -> (expira, valor)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+        _registro[nombre] = self
+
+    def obtener(self, clave):
+        ahora = self._reloj()
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None or item[0] <= ahora:
+                if item is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return item[1]
+
+    def guardar(self, clave, valor):
+        if not self.max_entradas or not self.ttl:
+            return valor
+        with self._lock:
+            self._datos[clave] = (self._reloj() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+        return valor
+
+    def descartar_si(self, predicado):
+        """Borra las entradas cuya (clave, valor) cumpla `predicado`. Retorna cuántas."""
+        with self._lock:
+            borrar = [k for k, (_, v) in self._datos.items() if predicado(k, v)]
+            for k in borrar:
+                del self._datos[k]
+            self.invalidaciones += len(borrar)
+        return len(borrar)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+                "desalojos": self.desalojos,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+def limpiar_todas():
+    for c in _registro.values():
+        c.limpiar()
+
+
+def metricas():
+    return {nombre: c.metricas() for nombre, c in _registro.items()}
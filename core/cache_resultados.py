@@ -0,0 +1,141 @@
+"""
+Caché de resultados del listado: filtros normalizados -> ids ordenados.
+
+La mayoría del tráfico de /propiedades/ repite unas pocas combinaciones (los
+links del navbar), así que se guarda la lista de ids en el orden del listado
+(o de relevancia, si hay `q`) y cada página sale de ahí con un in_bulk.
+
+Invalidación precisa: cuando una Propiedad cambia, solo se descartan las
+entradas cuyos filtros calzan con su estado anterior o con el nuevo.
+"""
+from functools import cached_property
+
+from django.conf import settings
+from django.db import transaction
+
+from . import precios
+from .cache_local import CacheLocal
+from .texto import normalizar
+
+ORDEN_LISTADO = ("-destacada", "-creado", "id")
+
+CAMPOS_FILTRO = (
+    "q", "tipo_operacion", "tipo_propiedad", "region",
+    "min_precio", "max_precio", "moneda", "dormitorios", "comuna",
+)
+CAMPOS_PRECIO = ("min_precio", "max_precio")
+
+# Campos de Propiedad que deciden si calza con un filtro (estado previo de las señales)
+CAMPOS_ESTADO = (
+    "publicada", "tipo_operacion", "tipo_propiedad", "region",
+    "precio_uf_efectivo", "precio_clp_efectivo", "dormitorios", "comuna",
+)
+
+cache = CacheLocal(
+    "resultados",
+    max_entradas=getattr(settings, "RESULTADOS_CACHE_MAX_ENTRADAS", 256),
+    ttl=getattr(settings, "RESULTADOS_CACHE_TTL", 120),
+)
+
+
+class ListaIds:
+    """Ids de un resultado en orden; `completa` es False si se truncó a max_ids."""
+
+    def __init__(self, ids, completa, por_relevancia=False):
+        self.ids = tuple(ids)
+        self.completa = completa
+        self.por_relevancia = por_relevancia
+
+    @cached_property
+    def posiciones(self):
+        return {pk: i for i, pk in enumerate(self.ids)}
+
+    @classmethod
+    def desde_queryset(cls, qs, ids_relevancia=None):
+        if ids_relevancia is not None:
+            visibles = set(qs.values_list("id", flat=True))
+            return cls([pk for pk in ids_relevancia if pk in visibles], completa=True, por_relevancia=True)
+        max_ids = getattr(settings, "RESULTADOS_CACHE_MAX_IDS", 1000)
+        ids = list(qs.order_by(*ORDEN_LISTADO).values_list("id", flat=True)[: max_ids + 1])
+        return cls(ids[:max_ids], completa=len(ids) <= max_ids)
+
+
+def filtros_de_form(form):
+    """
+    Clave canónica de la búsqueda: tupla ordenada de (campo, valor) no vacíos,
+    con `q` normalizado y precios ya parseados por _parse_int_relaxed.
+    La moneda solo cuenta si es CLP y hay rango de precio (UF es el defecto).
+    Un form inválido equivale a "sin filtros" (así lo trata la vista).
+    """
+    if not form.is_bound or not form.is_valid():
+        return ()
+    con_precio = any(form.cleaned_data.get(c) is not None for c in CAMPOS_PRECIO)
+    items = []
+    for campo in CAMPOS_FILTRO:
+        valor = form.cleaned_data.get(campo)
+        if campo == "q":
+            valor = normalizar(valor)
+        elif campo == "moneda" and (valor == precios.MONEDA_DEFECTO or not con_precio):
+            continue
+        if valor in (None, "", 0):
+            continue
+        items.append((campo, valor))
+    return tuple(items)
+
+
+def obtener(filtros):
+    return cache.obtener(filtros)
+
+
+def guardar(filtros, lista):
+    return cache.guardar(filtros, lista)
+
+
+def _calza(filtros, estado):
+    """¿Una propiedad con `estado` aparecería en el resultado de `filtros`?"""
+    if not estado or not estado.get("publicada"):
+        return False
+    campo_precio = precios.campo(dict(filtros).get("moneda"))
+    for campo, valor in filtros:
+        if campo in ("q", "moneda"):
+            continue  # q: no evaluable sin el motor de texto, se asume que calza
+        if campo == "min_precio":
+            precio = estado.get(campo_precio)
+            if precio is None or precio < valor:
+                return False
+        elif campo == "max_precio":
+            precio = estado.get(campo_precio)
+            if precio is None or precio > valor:
+                return False
+        elif campo == "dormitorios":
+            if (estado.get("dormitorios") or 0) < valor:
+                return False
+        elif estado.get(campo) != valor:
+            return False
+    return True
+
+
+def invalidar_por_cambio(anterior, nuevo):
+    """
+    Descarta las entradas afectadas por el paso de `anterior` a `nuevo`
+    (dicts de CAMPOS_ESTADO, o None si no existía / se borró). Se repite al
+    hacer commit por si otro request recargó la entrada entre medio.
+    """
+    def afectada(filtros, _lista):
+        return _calza(filtros, anterior) or _calza(filtros, nuevo)
+
+    cache.descartar_si(afectada)
+    transaction.on_commit(lambda: cache.descartar_si(afectada))
+
+
+def invalidar_precios():
+    """Tras recalcular los precios efectivos en bloque: descarta las búsquedas con rango de precio."""
+    def con_precio(filtros, _lista):
+        return any(campo in CAMPOS_PRECIO for campo, _ in filtros)
+
+    cache.descartar_si(con_precio)
+    transaction.on_commit(lambda: cache.descartar_si(con_precio))
+
+
+def estado(prop):
+    return {campo: getattr(prop, campo) for campo in CAMPOS_ESTADO}
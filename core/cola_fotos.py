@@ -0,0 +1,175 @@
+"""
+Procesamiento en segundo plano de las fotos subidas en lote desde el admin.
+
+Antes PropiedadAdmin.save_model subía cada foto al storage dentro del
+request: con 40 fotos de celular el request tardaba minutos y gunicorn lo
+cortaba. Ahora:
+
+1. encolar(): el request solo copia los archivos al staging local
+   (FOTOS_STAGING_DIR, disco del servidor) y crea una FotoPendiente por foto.
+2. `python manage.py procesar_fotos` reclama las pendientes y con un pool de
+   hilos (FOTOS_HILOS) corrige la orientación EXIF, baja la resolución a
+   FOTOS_MAX_LADO, re-codifica (JPEG, o PNG si hay transparencia; sin
+   metadatos EXIF) y sube el resultado como ImagenPropiedad. Las derivadas
+   WebP (core/imagenes.py) quedan en cola y las genera el mismo comando.
+3. El estado de cada foto (pendiente, procesando, lista, error) se ve en el
+   admin de la propiedad.
+
+El staging debe ser un directorio compartido entre la web y el worker (mismo
+servidor). Una foto que quedó "procesando" por una caída del worker vuelve a
+pendiente pasados FOTOS_PROCESANDO_TIMEOUT segundos.
+"""
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import FotoPendiente, ImagenPropiedad
+
+logger = logging.getLogger(__name__)
+
+
+def _directorio():
+    carpeta = Path(getattr(settings, "FOTOS_STAGING_DIR", Path(settings.BASE_DIR) / "var" / "fotos"))
+    carpeta.mkdir(parents=True, exist_ok=True)
+    return carpeta
+
+
+def _siguiente_orden(propiedad):
+    ultimos = [
+        ImagenPropiedad.objects.filter(propiedad=propiedad).aggregate(m=Max("orden"))["m"],
+        FotoPendiente.objects.filter(propiedad=propiedad).exclude(estado=FotoPendiente.LISTA)
+        .aggregate(m=Max("orden"))["m"],
+    ]
+    return max((u for u in ultimos if u is not None), default=-1) + 1
+
+
+def encolar(propiedad, archivos):
+    """
+    Copia los archivos subidos al staging y crea sus FotoPendiente (quedan
+    al final de la galería, en el orden en que se subieron). Retorna las creadas.
+    """
+    carpeta = _directorio()
+    orden = _siguiente_orden(propiedad)
+    fotos = []
+    for i, archivo in enumerate(archivos):
+        nombre = f"{uuid.uuid4().hex}{Path(archivo.name).suffix.lower()[:10]}"
+        with open(carpeta / nombre, "wb") as destino:
+            for parte in archivo.chunks():
+                destino.write(parte)
+        fotos.append(FotoPendiente(
+            propiedad=propiedad, archivo=nombre, nombre=archivo.name[:255], orden=orden + i,
+        ))
+    return FotoPendiente.objects.bulk_create(fotos)
+
+
+# ===========================
+# Worker
+# ===========================
+def recuperar_colgadas():
+    """Devuelve a pendiente las fotos "procesando" de un worker que se cayó."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, "FOTOS_PROCESANDO_TIMEOUT", 15 * 60))
+    return FotoPendiente.objects.filter(
+        estado=FotoPendiente.PROCESANDO, actualizado__lt=limite
+    ).update(estado=FotoPendiente.PENDIENTE, actualizado=timezone.now())
+
+
+def reclamar(lote):
+    """
+    Marca hasta `lote` pendientes como procesando y las retorna. El UPDATE
+    es condicional por foto: dos workers nunca toman la misma.
+    """
+    ids = FotoPendiente.objects.filter(estado=FotoPendiente.PENDIENTE).order_by("id").values_list("id", flat=True)
+    mias = [
+        pk for pk in list(ids[:lote])
+        if FotoPendiente.objects.filter(pk=pk, estado=FotoPendiente.PENDIENTE)
+        .update(estado=FotoPendiente.PROCESANDO, actualizado=timezone.now())
+    ]
+    return list(FotoPendiente.objects.filter(pk__in=mias).order_by("id"))
+
+
+def reencodear(img, nombre):
+    """(bytes, nombre de archivo) de la foto lista para publicar."""
+    lado = getattr(settings, "FOTOS_MAX_LADO", 2560)
+    # JPEG: decodifica directo a una escala reducida (mucho más rápido con fotos de 12+ MP)
+    img.draft("RGB", (lado, lado))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+    base = Path(nombre).stem[:80] or "foto"
+    buf = io.BytesIO()
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        img.save(buf, "PNG", optimize=True)
+        return buf.getvalue(), f"{base}.png"
+    img.convert("RGB").save(
+        buf, "JPEG", quality=getattr(settings, "FOTOS_CALIDAD_JPEG", 85), optimize=True, progressive=True
+    )
+    return buf.getvalue(), f"{base}.jpg"
+
+
+def procesar_una(foto):
+    """Procesa una FotoPendiente ya reclamada. Retorna True si quedó publicada."""
+    ruta = _directorio() / foto.archivo
+    try:
+        with Image.open(ruta) as img:
+            contenido, nombre = reencodear(img, foto.nombre)
+        imagen = ImagenPropiedad(propiedad_id=foto.propiedad_id, orden=foto.orden)
+        # La subida al storage (lo lento) va fuera de la transacción
+        imagen.imagen.save(nombre, ContentFile(contenido), save=False)
+        with transaction.atomic():
+            imagen.save()
+            FotoPendiente.objects.filter(pk=foto.pk).update(
+                estado=FotoPendiente.LISTA, imagen=imagen, error="", actualizado=timezone.now()
+            )
+    except Exception as exc:
+        logger.exception("No se pudo procesar la foto %s (%s)", foto.pk, foto.nombre)
+        FotoPendiente.objects.filter(pk=foto.pk).update(
+            estado=FotoPendiente.ERROR, error=f"{type(exc).__name__}: {exc}"[:1000], actualizado=timezone.now()
+        )
+        return False
+    ruta.unlink(missing_ok=True)
+    return True
+
+
+def _en_hilo(foto):
+    try:
+        return procesar_una(foto)
+    finally:
+        # Cada hilo abre sus propias conexiones
+        connections.close_all()
+
+
+def procesar(lote=50, hilos=None):
+    """
+    Procesa hasta `lote` fotos pendientes. Retorna (listas, con_error).
+    Con hilos=1 trabaja en el hilo actual (tests, depuración).
+    """
+    hilos = hilos or getattr(settings, "FOTOS_HILOS", 4)
+    recuperar_colgadas()
+    fotos = reclamar(lote)
+    if not fotos:
+        return 0, 0
+    if hilos <= 1:
+        resultados = [procesar_una(f) for f in fotos]
+    else:
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fotos") as pool:
+            resultados = list(pool.map(_en_hilo, fotos))
+    listas = sum(resultados)
+    return listas, len(resultados) - listas
+
+
+def reintentar(queryset):
+    """Vuelve a poner en cola las fotos con error cuyo archivo sigue en staging."""
+    carpeta = _directorio()
+    ids = [f.pk for f in queryset.filter(estado=FotoPendiente.ERROR) if (carpeta / f.archivo).exists()]
+    return FotoPendiente.objects.filter(pk__in=ids).update(
+        estado=FotoPendiente.PENDIENTE, error="", actualizado=timezone.now()
+    )
@@ -0,0 +1,142 @@
+"""
+Cola local de leads (spool en disco) para no escribir en la BD dentro del
+request del tasador virtual.
+
+encolar() deja cada lead como un archivo JSON en LEADS_SPOOL_DIR/nuevos:
+se escribe en tmp/, se hace fsync y se mueve con os.replace (atómico), así
+que un archivo en nuevos/ siempre está completo. El comando
+`procesar_leads` los pasa a la BD en lotes con bulk_create.
+
+Sin pérdida ni duplicados ante caídas: un archivo solo se borra después de
+que su lote quedó confirmado en la BD, y cada lead lleva un `ref_externa`
+único. Si el worker cae entre el INSERT y el borrado, la próxima pasada
+reinserta el lote y la BD ignora los ya guardados (ignore_conflicts).
+Si el lote completo falla en la BD, se insertan uno a uno y el que siga
+fallando va a errores/: un lead malo no traba la cola.
+"""
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Lead
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ("nombre", "email", "telefono", "mensaje", "comuna", "origen")
+
+
+def _directorio(nombre):
+    raiz = Path(getattr(settings, "LEADS_SPOOL_DIR", Path(settings.BASE_DIR) / "var" / "leads"))
+    carpeta = raiz / nombre
+    carpeta.mkdir(parents=True, exist_ok=True)
+    return carpeta
+
+
+def _fsync_directorio(carpeta):
+    """Asegura en disco el rename (POSIX; en Windows no aplica)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(carpeta, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encolar(**datos):
+    """
+    Deja un lead en la cola y retorna su ref_externa. Si el disco falla,
+    lo guarda directo en la BD: un lead nunca se descarta.
+    """
+    ref = uuid.uuid4()
+    registro = {c: _recortado(c, datos.get(c, "")) for c in CAMPOS}
+    registro.update(ref_externa=str(ref), creado=timezone.now().isoformat())
+    nombre = f"{timezone.now():%Y%m%d%H%M%S%f}-{ref.hex}.json"
+    try:
+        tmp = _directorio("tmp") / nombre
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(registro, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        nuevos = _directorio("nuevos")
+        os.replace(tmp, nuevos / nombre)
+        _fsync_directorio(nuevos)
+    except OSError:
+        logger.exception("No se pudo encolar el lead; se guarda directo")
+        Lead.objects.create(**_campos_lead(registro))
+    return ref
+
+
+def _recortado(campo, valor):
+    """El valor como texto, cortado al max_length de la columna (MySQL estricto rechaza el exceso)."""
+    valor = str(valor or "")
+    largo = Lead._meta.get_field(campo).max_length
+    return valor[:largo] if largo else valor
+
+
+def _campos_lead(registro):
+    return {
+        **{c: _recortado(c, registro.get(c)) for c in CAMPOS},
+        "origen": registro.get("origen") or "web",
+        "ref_externa": uuid.UUID(registro["ref_externa"]),
+        "creado": datetime.fromisoformat(registro["creado"]),
+    }
+
+
+def pendientes():
+    """Archivos en cola, del más antiguo al más nuevo."""
+    return sorted(_directorio("nuevos").glob("*.json"))
+
+
+def procesar(lote=500):
+    """
+    Pasa a la BD hasta `lote` leads de la cola. Retorna (guardados, con_error).
+    Los archivos ilegibles se apartan en errores/ para revisarlos a mano.
+    """
+    archivos = pendientes()[:lote]
+    if not archivos:
+        return 0, 0
+    leads, leidos, malos = [], [], 0
+    for archivo in archivos:
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                leads.append(Lead(**_campos_lead(json.load(f))))
+            leidos.append(archivo)
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Lead en cola ilegible: %s", archivo.name)
+            os.replace(archivo, _directorio("errores") / archivo.name)
+            malos += 1
+
+    try:
+        with transaction.atomic():
+            Lead.objects.bulk_create(leads, batch_size=500, ignore_conflicts=True)
+    except DatabaseError:
+        logger.exception("Falló el lote de leads; se reintenta uno a uno")
+        return _procesar_uno_a_uno(leads, leidos, malos)
+    for archivo in leidos:
+        archivo.unlink(missing_ok=True)
+    return len(leads), malos
+
+
+def _procesar_uno_a_uno(leads, archivos, malos):
+    """Inserta cada lead por separado; el que falla se aparta en errores/."""
+    guardados = 0
+    for lead, archivo in zip(leads, archivos):
+        try:
+            with transaction.atomic():
+                Lead.objects.bulk_create([lead], ignore_conflicts=True)
+        except DatabaseError:
+            logger.exception("Lead en cola rechazado por la BD: %s", archivo.name)
+            os.replace(archivo, _directorio("errores") / archivo.name)
+            malos += 1
+            continue
+        archivo.unlink(missing_ok=True)
+        guardados += 1
+    return guardados, malos
@@ -0,0 +1,312 @@
+"""
+Tasación por comparables: el rango de precio sale de las k propiedades
+publicadas en venta más parecidas (mismo tipo), no de la fórmula.
+
+Cercanía en un espacio de 5 dimensiones con escalas fijas (1 unidad ≈ una
+diferencia "notoria"):
+  ubicación (2 ejes, en km; coordenadas propias o centroide de la comuna),
+  log(m² construidos), dormitorios y antigüedad.
+
+Por cada tipo de propiedad hay un árbol KD en memoria (NumPy). Consultar es
+bajar por el árbol y revisar unas pocas hojas: sin ORM por tasación.
+
+El índice vive en una CacheLocal de una entrada. Cuando cambia una
+propiedad, las señales piden reconstruirlo en un thread aparte (al
+confirmar la transacción); mientras tanto se sigue respondiendo con el
+anterior. Al vencer el TTL pasa lo mismo.
+"""
+import heapq
+import logging
+import math
+import threading
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import geo
+from .cache_local import CacheLocal
+from .models import Propiedad
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = (
+    "id", "slug", "titulo", "comuna", "tipo_propiedad", "latitud", "longitud",
+    "precio_uf", "sup_construida_m2", "dormitorios", "ano_construccion",
+)
+# Campos de Propiedad que cambian el índice
+CAMPOS_ESTADO = ("publicada", "tipo_operacion") + CAMPOS[1:]
+
+# Escala de cada eje: norte (km), este (km), log(m²), dormitorios, años
+ESCALAS = np.array([2.0, 2.0, 0.2, 1.0, 10.0])
+KM_POR_GRADO_LAT = 111.32
+HOJA = 32
+MIN_COMPARABLES = 3
+
+cache = CacheLocal(
+    "comparables",
+    max_entradas=1,
+    ttl=getattr(settings, "COMPARABLES_TTL", 10 * 60),
+)
+_lock_construccion = threading.Lock()
+_lock_hilo = threading.Lock()
+_hilo = None
+_pendiente = False
+_ultimo = None  # último índice construido, para responder durante una reconstrucción
+
+
+class ArbolKD:
+    """
+    Árbol KD balanceado sobre los puntos de X (n x d), guardado en arreglos:
+    los puntos se reordenan para que cada hoja sea un tramo contiguo.
+    """
+
+    def __init__(self, X):
+        n = len(X)
+        self.orden = np.arange(n)
+        self._X = np.asarray(X, dtype=np.float64)
+        # Nodo: (inicio, fin, eje, corte, izq, der); eje -1 = hoja
+        self.nodos = []
+        if n:
+            self._construir(0, n)
+        self.X = self._X[self.orden]
+
+    def _construir(self, inicio, fin):
+        nodo = len(self.nodos)
+        self.nodos.append(None)
+        if fin - inicio <= HOJA:
+            self.nodos[nodo] = (inicio, fin, -1, 0.0, -1, -1)
+            return nodo
+        tramo = self.orden[inicio:fin]
+        puntos = self._X[tramo]
+        eje = int(np.argmax(puntos.max(axis=0) - puntos.min(axis=0)))
+        medio = (fin - inicio) // 2
+        particion = np.argpartition(puntos[:, eje], medio)
+        self.orden[inicio:fin] = tramo[particion]
+        corte = float(self._X[self.orden[inicio + medio], eje])
+        izq = self._construir(inicio, inicio + medio)
+        der = self._construir(inicio + medio, fin)
+        self.nodos[nodo] = (inicio, fin, eje, corte, izq, der)
+        return nodo
+
+    def consultar(self, q, k):
+        """[(distancia², posición en X original)] de los k puntos más cercanos a q."""
+        if not self.nodos or k <= 0:
+            return []
+        mejores = []  # heap de (-distancia², -posición): la raíz es el peor
+        # (cota, nodo, desfases): la cota es la distancia² mínima posible a
+        # la celda del nodo, acumulada eje por eje (distancia incremental)
+        pendientes = [(0.0, 0, (0.0,) * len(q))]
+        while pendientes:
+            cota, nodo, desfases = pendientes.pop()
+            # Estricto: a igual distancia puede entrar una posición menor
+            if len(mejores) == k and cota > -mejores[0][0]:
+                continue
+            inicio, fin, eje, corte, izq, der = self.nodos[nodo]
+            if eje < 0:
+                d = ((self.X[inicio:fin] - q) ** 2).sum(axis=1)
+                posiciones = self.orden[inicio:fin]
+                if len(mejores) == k:
+                    # Solo los que pueden entrar al heap pasan a Python
+                    utiles = d <= -mejores[0][0]
+                    d, posiciones = d[utiles], posiciones[utiles]
+                for dist, pos in zip(d.tolist(), posiciones.tolist()):
+                    item = (-dist, -pos)
+                    if len(mejores) < k:
+                        heapq.heappush(mejores, item)
+                    elif item > mejores[0]:
+                        heapq.heapreplace(mejores, item)
+                continue
+            diff = q[eje] - corte
+            cerca, lejos = (izq, der) if diff < 0 else (der, izq)
+            lejos_desfases = desfases[:eje] + (diff,) + desfases[eje + 1:]
+            # LIFO: el lado cercano se visita primero
+            pendientes.append((cota - desfases[eje] ** 2 + diff * diff, lejos, lejos_desfases))
+            pendientes.append((cota, cerca, desfases))
+        return sorted((-d, -p) for d, p in mejores)
+
+
+def _vector(lat, lng, sup, dormitorios, antiguedad):
+    y = lat * KM_POR_GRADO_LAT
+    x = lng * KM_POR_GRADO_LAT * math.cos(math.radians(lat))
+    return np.array([y, x, math.log(sup), dormitorios, antiguedad]) / ESCALAS
+
+
+class IndiceComparables:
+    def __init__(self, filas, ano_actual=None):
+        ano_actual = ano_actual or datetime.now().year
+        filas = [f for f in filas if geo.ubicacion(f["latitud"], f["longitud"], f["comuna"])[0] is not None]
+        self.ano_actual = ano_actual
+        anos = [f["ano_construccion"] for f in filas if f["ano_construccion"]]
+        dorms = [f["dormitorios"] for f in filas if f["dormitorios"]]
+        # Faltantes (en el índice y en la consulta) -> mediana de la muestra
+        self.ano_tipico = int(np.median(anos)) if anos else ano_actual - 15
+        self.dormitorios_tipico = int(np.median(dorms)) if dorms else 2
+
+        por_tipo = {}
+        for f in filas:
+            por_tipo.setdefault(f["tipo_propiedad"], []).append(f)
+        self.filas = {}
+        self.arboles = {}
+        for tipo, grupo in por_tipo.items():
+            X = np.array([self.vector(f) for f in grupo])
+            self.filas[tipo] = grupo
+            self.arboles[tipo] = ArbolKD(X)
+
+    def vector(self, f):
+        lat, lng, _ = geo.ubicacion(f["latitud"], f["longitud"], f["comuna"])
+        ano = f["ano_construccion"] or self.ano_tipico
+        return _vector(
+            lat, lng, float(f["sup_construida_m2"]),
+            f["dormitorios"] or self.dormitorios_tipico,
+            max(0, self.ano_actual - int(ano)),
+        )
+
+    def vecinos(self, tipo, consulta, k):
+        """[(distancia, fila)] de los k comparables de `tipo` más cercanos."""
+        arbol = self.arboles.get(tipo)
+        if arbol is None:
+            return []
+        q = self.vector(consulta)
+        grupo = self.filas[tipo]
+        return [(math.sqrt(d), grupo[pos]) for d, pos in arbol.consultar(q, k)]
+
+
+def _filas():
+    return (
+        Propiedad.objects.filter(
+            publicada=True, tipo_operacion="venta", precio_uf__gt=0, sup_construida_m2__gt=0,
+        )
+        .order_by("id")
+        .values(*CAMPOS)
+        .iterator(chunk_size=5000)
+    )
+
+
+def reconstruir():
+    global _ultimo
+    with _lock_construccion:
+        indice = IndiceComparables(_filas())
+        _ultimo = indice
+        return cache.guardar("indice", indice)
+
+
+def _trabajar():
+    global _hilo, _pendiente
+    try:
+        while True:
+            with _lock_hilo:
+                if not _pendiente:
+                    _hilo = None
+                    return
+                _pendiente = False
+            reconstruir()
+    except Exception:
+        logger.exception("No se pudo reconstruir el índice de comparables")
+        with _lock_hilo:
+            _hilo = None
+    finally:
+        connections.close_all()
+
+
+def reconstruir_en_segundo_plano():
+    """Pide una reconstrucción; varias seguidas se juntan en una sola pasada."""
+    global _hilo, _pendiente
+    with _lock_hilo:
+        _pendiente = True
+        if _hilo is None:
+            _hilo = threading.Thread(target=_trabajar, name="comparables", daemon=True)
+            _hilo.start()
+
+
+def invalidar_por_cambio(anterior, nuevo):
+    """Programa la reconstrucción (al confirmar) si cambió algo indexado."""
+    if anterior is not None and nuevo is not None and all(
+        anterior.get(c) == nuevo.get(c) for c in CAMPOS_ESTADO
+    ):
+        return
+    if not any(e and e.get("publicada") and e.get("tipo_operacion") == "venta" for e in (anterior, nuevo)):
+        return
+    transaction.on_commit(reconstruir_en_segundo_plano)
+
+
+def indice():
+    """Índice vigente; si venció, se responde con el anterior mientras se rehace."""
+    actual = cache.obtener("indice")
+    if actual is not None:
+        return actual
+    if _ultimo is not None:
+        reconstruir_en_segundo_plano()
+        return _ultimo
+    return reconstruir()
+
+
+def _redondear(valor):
+    return int(round(valor / 10) * 10)
+
+
+def _coordenada(valor):
+    """float de una coordenada opcional; ValueError con inf/nan (log y árbol KD no los soportan)."""
+    if not valor:
+        return None
+    valor = float(valor)
+    if not math.isfinite(valor):
+        raise ValueError("Coordenadas inválidas")
+    return valor
+
+
+def estimar(datos, k=None):
+    """
+    Rango en UF según comparables para un dict como el de
+    estimar_precio_propiedad() (más `latitud`/`longitud` opcionales).
+    Cada comparable aporta su UF/m² por los m² pedidos; el rango va del
+    percentil 25 al 75 de esas estimaciones. ValueError si faltan datos o
+    no hay comparables suficientes.
+    """
+    k = k or getattr(settings, "COMPARABLES_K", 8)
+    comuna = datos.get("comuna", "")
+    tipo = (datos.get("tipo_propiedad") or "casa").lower()
+    sup = float(datos.get("sup_construida") or 0)
+    if not math.isfinite(sup):
+        raise ValueError("Superficie construida inválida")
+    if sup <= 0:
+        raise ValueError("Falta la superficie construida")
+    latitud = _coordenada(datos.get("latitud"))
+    longitud = _coordenada(datos.get("longitud"))
+    if geo.ubicacion(latitud, longitud, comuna)[0] is None:
+        raise ValueError("No se pudo ubicar la comuna")
+    consulta = {
+        "comuna": comuna,
+        "latitud": latitud,
+        "longitud": longitud,
+        "sup_construida_m2": sup,
+        "dormitorios": int(datos.get("dormitorios") or 0),
+        "ano_construccion": datos.get("ano_construccion") or None,
+    }
+
+    vecinos = indice().vecinos(tipo, consulta, k)
+    if len(vecinos) < MIN_COMPARABLES:
+        raise ValueError("No hay suficientes propiedades comparables publicadas")
+
+    estimaciones = np.array([float(f["precio_uf"]) / float(f["sup_construida_m2"]) * sup for _, f in vecinos])
+    p25, p50, p75 = np.percentile(estimaciones, [25, 50, 75])
+    return {
+        "precio_min_uf": _redondear(p25),
+        "precio_uf": _redondear(p50),
+        "precio_max_uf": _redondear(p75),
+        "comparables": [
+            {
+                "id": f["id"],
+                "slug": f["slug"],
+                "titulo": f["titulo"],
+                "comuna": f["comuna"],
+                "precio_uf": float(f["precio_uf"]),
+                "sup_construida_m2": float(f["sup_construida_m2"]),
+                "dormitorios": f["dormitorios"],
+                "ano_construccion": f["ano_construccion"],
+                "distancia": round(distancia, 3),
+            }
+            for distancia, f in vecinos
+        ],
+    }
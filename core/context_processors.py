@@ -0,0 +1,7 @@
+from . import servicios_uf
+
+
+def uf(request):
+    """`uf_hoy` (Decimal o None) y `uf_fecha` para convertir precios en las plantillas."""
+    valor, fecha = servicios_uf.uf_hoy()
+    return {"uf_hoy": valor, "uf_fecha": fecha}
@@ -0,0 +1,55 @@
+"""
+Generador de datos sintéticos para benchmarks y tests de rendimiento.
+
+No se usa en producción: arma instancias de Propiedad (sin guardar) con una
+distribución parecida a la del catálogo real, para poder medir consultas
+sobre decenas de miles de filas.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Propiedad, COMUNAS_RM, TIPO_OPERACION, TIPO_PROPIEDAD
+
+
+def generar_propiedades(n, seed=42, prefijo_slug="bench"):
+    """
+    Retorna una lista de `n` Propiedad sin guardar (lista para bulk_create).
+    El slug se arma a mano porque bulk_create no pasa por save().
+    """
+    rnd = random.Random(seed)
+    ahora = timezone.now()
+    operaciones = [op for op, _ in TIPO_OPERACION]
+    tipos = [t for t, _ in TIPO_PROPIEDAD]
+
+    props = []
+    for i in range(n):
+        op = rnd.choices(operaciones, weights=[7, 3])[0]
+        tipo = rnd.choices(tipos, weights=[4, 4, 1, 1, 1])[0]
+        comuna = rnd.choice(COMUNAS_RM)
+        sup = Decimal(rnd.randint(35, 400))
+        if op == "venta":
+            precio_uf = Decimal(rnd.randint(1500, 40000))
+        else:
+            precio_uf = Decimal(rnd.randint(10, 150))
+        props.append(Propiedad(
+            titulo=f"{tipo.capitalize()} en {comuna} #{i}",
+            slug=f"{prefijo_slug}-{seed}-{i}",
+            descripcion=f"Propiedad sintética {i} en {comuna}, {sup} m2.",
+            tipo_operacion=op,
+            tipo_propiedad=tipo,
+            comuna=comuna,
+            precio_uf=precio_uf,
+            precio_clp=int(precio_uf * 38000),
+            dormitorios=rnd.randint(0, 6),
+            banos=rnd.randint(1, 4),
+            estacionamientos=rnd.randint(0, 3),
+            sup_construida_m2=sup,
+            ano_construccion=rnd.randint(1960, ahora.year),
+            destacada=rnd.random() < 0.05,
+            publicada=rnd.random() < 0.9,
+            creado=ahora - timedelta(minutes=rnd.randint(0, 60 * 24 * 365 * 3)),
+        ))
+    return props
@@ -0,0 +1,102 @@
+"""
+Conteos por faceta para los filtros del listado ("Las Condes (42)").
+
+Los totales viven en ConteoFaceta y se ajustan de a +1/-1 cuando una
+Propiedad se crea, cambia, se (des)publica o se borra, comparando su estado
+anterior con el nuevo. El listado los lee de caché: en régimen no hay
+consultas agregadas por request.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import ConteoFaceta, Propiedad
+
+# Las mismas que BusquedaPropiedadForm.CAMPOS_CON_CONTEO (dormitorios es un
+# mínimo numérico en el form, no un select con opciones que contar)
+FACETAS = ("comuna", "tipo_operacion", "tipo_propiedad")
+
+CACHE_CLAVE = "facetas:conteos"
+# Red de seguridad si otro proceso cambió los conteos (caché por proceso)
+CACHE_TTL = 10 * 60
+
+
+def valores(prop):
+    """
+    {faceta: valor} con que `prop` aporta a los conteos, o {} si no está
+    publicada. Acepta instancias o dicts (estado previo de las señales).
+    """
+    leer = prop.get if isinstance(prop, dict) else lambda campo: getattr(prop, campo)
+    if not leer("publicada"):
+        return {}
+    return {faceta: str(leer(faceta)) for faceta in FACETAS}
+
+
+def _sumar(faceta, valor, delta):
+    if delta > 0:
+        actualizadas = ConteoFaceta.objects.filter(faceta=faceta, valor=valor).update(total=F("total") + delta)
+        if not actualizadas:
+            try:
+                with transaction.atomic():
+                    ConteoFaceta.objects.create(faceta=faceta, valor=valor, total=delta)
+            except IntegrityError:
+                # Otro proceso la creó entre medio
+                ConteoFaceta.objects.filter(faceta=faceta, valor=valor).update(total=F("total") + delta)
+    else:
+        ConteoFaceta.objects.filter(faceta=faceta, valor=valor, total__gte=-delta).update(
+            total=F("total") + delta
+        )
+
+
+def aplicar_cambio(anteriores, nuevos):
+    """
+    Ajusta los conteos según el paso de `anteriores` a `nuevos` (ambos
+    salidas de `valores`). Solo toca las facetas cuyo valor cambió.
+    """
+    cambio = False
+    for faceta in FACETAS:
+        antes = anteriores.get(faceta)
+        despues = nuevos.get(faceta)
+        if antes == despues:
+            continue
+        if antes is not None:
+            _sumar(faceta, antes, -1)
+        if despues is not None:
+            _sumar(faceta, despues, +1)
+        cambio = True
+    if cambio:
+        invalidar()
+
+
+def invalidar():
+    cache.delete(CACHE_CLAVE)
+    # Y de nuevo al confirmar, por si alguien recargó la caché antes del commit
+    transaction.on_commit(lambda: cache.delete(CACHE_CLAVE))
+
+
+def conteos():
+    """{faceta: {valor: total}} desde caché; en un miss, un SELECT simple."""
+    data = cache.get(CACHE_CLAVE)
+    if data is None:
+        data = {faceta: {} for faceta in FACETAS}
+        for faceta, valor, total in ConteoFaceta.objects.values_list("faceta", "valor", "total"):
+            data.setdefault(faceta, {})[valor] = total
+        cache.set(CACHE_CLAVE, data, CACHE_TTL)
+    return data
+
+
+def recalcular():
+    """
+    Reconstruye la tabla completa con GROUP BY (cargas masivas, reparación).
+    Retorna el número de filas de conteo escritas.
+    """
+    filas = []
+    publicadas = Propiedad.objects.filter(publicada=True).order_by()
+    for faceta in FACETAS:
+        for row in publicadas.values(faceta).annotate(n=Count("id")):
+            filas.append(ConteoFaceta(faceta=faceta, valor=str(row[faceta]), total=row["n"]))
+    with transaction.atomic():
+        ConteoFaceta.objects.all().delete()
+        ConteoFaceta.objects.bulk_create(filas)
+    invalidar()
+    return len(filas)
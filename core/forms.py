@@ -94,6 +94,7 @@ class BusquedaPropiedadForm(forms.Form):
     q = forms.CharField(
         label="",
         required=False,
+        max_length=200,
         widget=forms.TextInput(attrs={
             "placeholder": "Buscar por título o comuna",
             "class": "form-control",
@@ -132,6 +133,7 @@ class BusquedaPropiedadForm(forms.Form):
 
     dormitorios = forms.IntegerField(
         required=False,
+        min_value=0,
         widget=forms.NumberInput(attrs={
             "class": "form-control",
             "placeholder": "Dormitorios",
@@ -176,6 +178,22 @@ class BusquedaPropiedadForm(forms.Form):
         })
     )
 
+    # Selects que muestran cuántas publicadas hay por opción ("Las Condes (42)")
+    CAMPOS_CON_CONTEO = ("tipo_operacion", "tipo_propiedad", "comuna")
+
+    def aplicar_conteos(self, conteos):
+        """
+        Agrega el total a cada opción. `conteos` viene de facetas.conteos()
+        ({faceta: {valor: total}}); la opción vacía ("Comuna") queda igual.
+        """
+        for nombre in self.CAMPOS_CON_CONTEO:
+            por_valor = conteos.get(nombre, {})
+            field = self.fields[nombre]
+            field.choices = [
+                (valor, f"{label} ({por_valor.get(valor, 0)})" if valor else label)
+                for valor, label in field.choices
+            ]
+
     def clean(self):
         cleaned = super().clean()
         min_raw = cleaned.get("min_precio")
@@ -192,6 +210,24 @@ class BusquedaPropiedadForm(forms.Form):
         return cleaned
 
 
+# ===========================
+# GuardarBusquedaForm
+# Email para avisar de nuevas publicaciones que calcen con los filtros
+# ===========================
+class GuardarBusquedaForm(forms.Form):
+    email = forms.EmailField(
+        widget=forms.EmailInput(attrs={
+            "class": "form-control form-control-sm",
+            "placeholder": "tunombre@correo.cl",
+            "autocomplete": "email",
+            "aria-label": "Email para avisos",
+        })
+    )
+
+    def clean_email(self):
+        return (self.cleaned_data.get("email") or "").strip().lower()
+
+
 # ===========================
 # QuieroPublicarForm
 # Para el formulario de "Publica tu propiedad"
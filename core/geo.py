@@ -0,0 +1,203 @@
+"""
+Geolocalización de propiedades sin extensiones GIS.
+
+Cada Propiedad guarda `geocelda`: el geohash de su ubicación (coordenadas
+propias o, si no tiene, el centroide de su comuna). Un geohash es un prefijo
+de todos los geohash de puntos contenidos en su celda, así que "propiedades
+dentro de esta celda" es un rango de strings sobre un índice normal:
+
+    geocelda >= '66jc' AND geocelda < '66jc~'
+
+Una búsqueda por área (viewport del mapa o radio) se cubre con unas pocas
+celdas del tamaño adecuado -> unos pocos range scans indexados; el filtro
+exacto por coordenadas se hace después, sobre los candidatos.
+"""
+import math
+
+from django.db.models import Q
+
+PRECISION = 9  # ~5 m: de sobra para ubicar una propiedad
+MAX_CELDAS = 16  # celdas por consulta (una rama del OR cada una)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Mayor que cualquier carácter del alfabeto: cota superior de un prefijo
+FIN_PREFIJO = "~"
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Centroides aproximados (lat, lng) de COMUNAS_RM: ubicación de respaldo
+# para propiedades sin coordenadas (geocodificación offline).
+CENTROIDES_COMUNAS = {
+    "Cerrillos": (-33.4983, -70.7122),
+    "Cerro Navia": (-33.4256, -70.7453),
+    "Conchalí": (-33.3847, -70.6750),
+    "El Bosque": (-33.5658, -70.6767),
+    "Estación Central": (-33.4597, -70.6997),
+    "Huechuraba": (-33.3669, -70.6336),
+    "Independencia": (-33.4167, -70.6653),
+    "La Cisterna": (-33.5297, -70.6639),
+    "La Florida": (-33.5228, -70.5981),
+    "La Granja": (-33.5389, -70.6225),
+    "La Pintana": (-33.5833, -70.6336),
+    "La Reina": (-33.4453, -70.5508),
+    "Las Condes": (-33.4111, -70.5714),
+    "Lo Barnechea": (-33.3500, -70.5167),
+    "Lo Espejo": (-33.5244, -70.6914),
+    "Lo Prado": (-33.4444, -70.7256),
+    "Macul": (-33.4914, -70.5994),
+    "Maipú": (-33.5108, -70.7572),
+    "Ñuñoa": (-33.4569, -70.5978),
+    "Pedro Aguirre Cerda": (-33.4889, -70.6739),
+    "Peñalolén": (-33.4850, -70.5417),
+    "Providencia": (-33.4314, -70.6094),
+    "Pudahuel": (-33.4408, -70.7639),
+    "Puente Alto": (-33.6117, -70.5758),
+    "Quilicura": (-33.3606, -70.7297),
+    "Quinta Normal": (-33.4278, -70.6978),
+    "Recoleta": (-33.4069, -70.6394),
+    "Renca": (-33.4067, -70.7281),
+    "San Joaquín": (-33.4961, -70.6281),
+    "San Miguel": (-33.4969, -70.6511),
+    "San Ramón": (-33.5372, -70.6425),
+    "Santiago": (-33.4378, -70.6504),
+    "Vitacura": (-33.3903, -70.5717),
+    "San Bernardo": (-33.5922, -70.6997),
+    "El Monte": (-33.6797, -71.0167),
+    "Isla de Maipo": (-33.7500, -70.9000),
+    "Padre Hurtado": (-33.5667, -70.8000),
+    "Peñaflor": (-33.6061, -70.8764),
+    "Talagante": (-33.6636, -70.9272),
+}
+
+
+# ===========================
+# Geohash
+# ===========================
+def geohash(lat, lng, precision=PRECISION):
+    lat_rango = [-90.0, 90.0]
+    lng_rango = [-180.0, 180.0]
+    resultado = []
+    bits = 0
+    n_bits = 0
+    par = True  # los bits pares son de longitud
+    while len(resultado) < precision:
+        rango, valor = (lng_rango, lng) if par else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        if valor >= medio:
+            bits = (bits << 1) | 1
+            rango[0] = medio
+        else:
+            bits <<= 1
+            rango[1] = medio
+        par = not par
+        n_bits += 1
+        if n_bits == 5:
+            resultado.append(_BASE32[bits])
+            bits = 0
+            n_bits = 0
+    return "".join(resultado)
+
+
+def _tamano_celda(precision):
+    """(alto en grados de latitud, ancho en grados de longitud)."""
+    bits = 5 * precision
+    return 180.0 / (1 << (bits // 2)), 360.0 / (1 << ((bits + 1) // 2))
+
+
+def celdas_bbox(min_lat, min_lng, max_lat, max_lng, max_celdas=MAX_CELDAS):
+    """
+    Geohashes que cubren el rectángulo: los de mayor precisión posible sin
+    pasar de `max_celdas`. Siempre cubren todo el rectángulo (pueden sobrar
+    bordes; el filtro exacto va después).
+    """
+    min_lat, max_lat = max(-90.0, min_lat), min(90.0, max_lat)
+    min_lng, max_lng = max(-180.0, min_lng), min(180.0, max_lng)
+    for precision in range(PRECISION, 0, -1):
+        alto, ancho = _tamano_celda(precision)
+        fila0 = math.floor((min_lat + 90) / alto)
+        filas = min(math.floor((max_lat + 90) / alto), math.ceil(180 / alto) - 1) - fila0 + 1
+        col0 = math.floor((min_lng + 180) / ancho)
+        cols = min(math.floor((max_lng + 180) / ancho), math.ceil(360 / ancho) - 1) - col0 + 1
+        if filas * cols <= max_celdas or precision == 1:
+            break
+    return sorted({
+        geohash((fila0 + i + 0.5) * alto - 90, (col0 + j + 0.5) * ancho - 180, precision)
+        for i in range(filas)
+        for j in range(cols)
+    })
+
+
+# ===========================
+# Distancias y áreas
+# ===========================
+def distancia_km(lat1, lng1, lat2, lng2):
+    """Haversine."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def bbox_radio(lat, lng, radio_km):
+    """Rectángulo (min_lat, min_lng, max_lat, max_lng) que contiene el círculo."""
+    dlat = math.degrees(radio_km / RADIO_TIERRA_KM)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def ubicacion(latitud, longitud, comuna):
+    """
+    (lat, lng, aproximada) de una propiedad: sus coordenadas si las tiene,
+    si no el centroide de la comuna; (None, None, True) si tampoco hay.
+    """
+    if latitud is not None and longitud is not None:
+        return float(latitud), float(longitud), False
+    lat, lng = CENTROIDES_COMUNAS.get(comuna, (None, None))
+    return lat, lng, True
+
+
+def geocelda(latitud, longitud, comuna):
+    lat, lng, _ = ubicacion(latitud, longitud, comuna)
+    return geohash(lat, lng) if lat is not None else ""
+
+
+# ===========================
+# Consultas
+# ===========================
+def filtro_celdas(celdas):
+    """Q con un rango indexado sobre geocelda por cada celda."""
+    filtro = Q(pk__in=[])
+    for celda in celdas:
+        filtro |= Q(geocelda__gte=celda, geocelda__lt=celda + FIN_PREFIJO)
+    return filtro
+
+
+def en_area(qs, min_lat, min_lng, max_lat, max_lng, campos, centro=None, radio_km=None, limite=500):
+    """
+    Filas (dicts de `campos` + lat/lng/aproximada[/distancia_km]) de `qs`
+    dentro del rectángulo, o del círculo si se pasa centro y radio. Los
+    candidatos salen por rangos de geocelda; el corte exacto es en Python.
+    Con radio se ordenan por distancia; si no, en el orden de `qs`.
+    """
+    columnas = tuple(dict.fromkeys(tuple(campos) + ("latitud", "longitud", "comuna")))
+    candidatos = qs.filter(filtro_celdas(celdas_bbox(min_lat, min_lng, max_lat, max_lng))).values(*columnas)
+
+    filas = []
+    for fila in candidatos.iterator(chunk_size=500):
+        lat, lng, aproximada = ubicacion(fila["latitud"], fila["longitud"], fila["comuna"])
+        if lat is None or not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            continue
+        item = {c: fila[c] for c in campos}
+        item.update(lat=lat, lng=lng, aproximada=aproximada)
+        if radio_km is not None:
+            item["distancia_km"] = round(distancia_km(centro[0], centro[1], lat, lng), 3)
+            if item["distancia_km"] > radio_km:
+                continue
+        filas.append(item)
+        if radio_km is None and len(filas) >= limite:
+            break
+
+    if radio_km is not None:
+        filas.sort(key=lambda f: f["distancia_km"])
+    return filas[:limite]
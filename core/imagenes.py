@@ -0,0 +1,190 @@
+"""
+Derivadas responsivas de las imágenes subidas (portada, galería, banners).
+
+Al subir una imagen se generan con Pillow versiones WebP a varios anchos
+(IMAGENES_ANCHOS, sin agrandar nunca el original) y se registran en
+DerivadaImagen. Las plantillas las usan con `{% imagen_srcset %}`
+(core/templatetags/propiedades_tags.py): el navegador elige la más chica que
+cubre el tamaño en pantalla en vez de bajar el original completo.
+
+Todo pasa por el storage configurado (open/save/url/delete), así funciona
+igual con FileSystemStorage y con MediaCloudinaryStorage.
+
+El request no genera nada: `encolar()` deja una DerivadaPendiente en la
+misma transacción del save y el worker `procesar_fotos` las consume con
+`procesar_pendientes()`. El borrado de las derivadas de una imagen
+reemplazada espera al commit (`borrar_al_confirmar`).
+
+Las URLs se leen con `precargar()` (una consulta por página para todas las
+imágenes que faltan) y quedan en una CacheLocal por worker.
+"""
+import io
+import logging
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .cache_local import CacheLocal
+from .models import DerivadaImagen, DerivadaPendiente
+
+logger = logging.getLogger(__name__)
+
+ANCHOS = tuple(getattr(settings, "IMAGENES_ANCHOS", (320, 640, 960, 1280, 1920)))
+CALIDAD = getattr(settings, "IMAGENES_CALIDAD_WEBP", 78)
+CARPETA = "derivadas"
+
+# Campos de Propiedad que se guardan antes de cada save (ver core/signals.py)
+CAMPOS_ESTADO = ("portada",)
+
+cache = CacheLocal(
+    "derivadas",
+    max_entradas=getattr(settings, "DERIVADAS_CACHE_MAX_ENTRADAS", 4096),
+    ttl=getattr(settings, "DERIVADAS_CACHE_TTL", 60 * 60),
+)
+
+
+def anchos_para(ancho_original):
+    """Anchos a generar: los de ANCHOS menores al original, más el original (tope: el mayor)."""
+    anchos = [a for a in ANCHOS if a < ancho_original]
+    anchos.append(min(ancho_original, max(ANCHOS)))
+    return sorted(set(anchos))
+
+
+def _nombre_derivada(original, ancho):
+    base, _ = os.path.splitext(original)
+    return f"{CARPETA}/{base}-{ancho}w.webp"
+
+
+def _webp(img, ancho):
+    alto = max(1, round(img.height * ancho / img.width))
+    copia = img if ancho == img.width else img.resize((ancho, alto), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    copia.save(buf, "WEBP", quality=CALIDAD, method=4)
+    return alto, buf.getvalue()
+
+
+def generar(original, storage=None, forzar=False):
+    """
+    Genera y registra las derivadas de `original` (nombre en el storage).
+    Idempotente: si ya tiene derivadas no hace nada (salvo `forzar`).
+    Retorna cuántas generó; un archivo ilegible se registra en el log y da 0.
+    """
+    if not original:
+        return 0
+    storage = storage or default_storage
+    if DerivadaImagen.objects.filter(original=original).exists():
+        if not forzar:
+            return 0
+        borrar(original, storage)
+
+    try:
+        with storage.open(original, "rb") as f, Image.open(f) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if img.mode in ("LA", "P", "PA") else "RGB")
+            filas = []
+            for ancho in anchos_para(img.width):
+                alto, datos = _webp(img, ancho)
+                nombre = storage.save(_nombre_derivada(original, ancho), ContentFile(datos))
+                filas.append(DerivadaImagen(original=original, ancho=ancho, alto=alto, archivo=nombre))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception("No se pudieron generar las derivadas de %s", original)
+        return 0
+
+    DerivadaImagen.objects.bulk_create(filas, ignore_conflicts=True)
+    invalidar(original)
+    return len(filas)
+
+
+def borrar(original, storage=None):
+    """Elimina archivos y filas de las derivadas de `original`."""
+    if not original:
+        return
+    storage = storage or default_storage
+    derivadas = DerivadaImagen.objects.filter(original=original)
+    for nombre in derivadas.values_list("archivo", flat=True):
+        try:
+            storage.delete(nombre)
+        except Exception:
+            logger.warning("No se pudo borrar la derivada %s", nombre, exc_info=True)
+    derivadas.delete()
+    DerivadaPendiente.objects.filter(original=original).delete()
+    invalidar(original)
+
+
+def borrar_al_confirmar(original):
+    """borrar() después del commit: si el save se revierte, la imagen sigue en uso con sus derivadas."""
+    if original:
+        transaction.on_commit(lambda: borrar(original))
+
+
+# ===========================
+# Cola (worker)
+# ===========================
+def encolar(original):
+    """Deja `original` para el worker. Va dentro de la transacción del save."""
+    if original:
+        DerivadaPendiente.objects.bulk_create([DerivadaPendiente(original=original)], ignore_conflicts=True)
+
+
+def procesar_pendientes(lote=50):
+    """
+    Genera las derivadas de hasta `lote` imágenes en cola y renueva las
+    tarjetas de las propiedades que las usan de portada. Retorna cuántas
+    imágenes procesó. Cada fila se toma borrándola (dos workers no generan
+    la misma); si el worker cae a mitad, `generar_derivadas` la recupera.
+    """
+    from . import tarjetas
+    from .models import Propiedad
+
+    hechas = 0
+    for pk, original in DerivadaPendiente.objects.values_list("pk", "original")[:lote]:
+        if not DerivadaPendiente.objects.filter(pk=pk).delete()[0]:
+            continue
+        hechas += 1
+        if generar(original):
+            for prop in Propiedad.objects.filter(portada=original).values_list("pk", flat=True):
+                tarjetas.invalidar(prop)
+    return hechas
+
+
+# ===========================
+# Lectura (plantillas)
+# ===========================
+def precargar(originales):
+    """Deja en caché las derivadas de `originales` que falten, en una consulta. Retorna las leídas."""
+    faltan = {o for o in originales if o and cache.obtener(o) is None}
+    if not faltan:
+        return {}
+    por_original = defaultdict(list)
+    filas = (
+        DerivadaImagen.objects.filter(original__in=faltan)
+        .order_by("original", "ancho")
+        .values_list("original", "ancho", "alto", "archivo")
+    )
+    for original, ancho, alto, archivo in filas:
+        por_original[original].append((ancho, alto, default_storage.url(archivo)))
+    return {o: cache.guardar(o, tuple(por_original.get(o, ()))) for o in faltan}
+
+
+def derivadas(original):
+    """((ancho, alto, url), ...) de menor a mayor; vacío si aún no hay."""
+    if not original:
+        return ()
+    actual = cache.obtener(original)
+    if actual is None:
+        actual = precargar([original]).get(original, ())
+    return actual
+
+
+def invalidar(original):
+    def es_esta(clave, _valor):
+        return clave == original
+
+    cache.descartar_si(es_esta)
+    transaction.on_commit(lambda: cache.descartar_si(es_esta))
@@ -0,0 +1,71 @@
+"""
+Índice stem -> archivos de imagen bajo MEDIA_ROOT.
+
+rollback_first_migration buscaba cada registro con un `rglob("*")` de todo
+MEDIA_ROOT: O(registros x archivos), horas sobre el árbol real. Acá se
+recorre el árbol una vez (os.walk) y cada búsqueda es un acceso al dict.
+
+El índice se puede guardar en disco (JSON) y reutilizar entre corridas; si
+quedó viejo, quien lo usa lo reconstruye (ver `obtener`).
+"""
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+VERSION = 1
+
+
+def construir(media_root, exts=IMG_EXTS):
+    """{stem: [ruta relativa con "/", ...]} de las imágenes bajo `media_root`, rutas ordenadas."""
+    raiz = str(media_root)
+    indice = defaultdict(list)
+    for carpeta, subcarpetas, archivos in os.walk(raiz):
+        subcarpetas.sort()
+        rel = os.path.relpath(carpeta, raiz).replace(os.sep, "/")
+        prefijo = "" if rel == "." else f"{rel}/"
+        for nombre in archivos:
+            stem, ext = os.path.splitext(nombre)
+            if ext.lower() in exts:
+                indice[stem].append(prefijo + nombre)
+    for rutas in indice.values():
+        rutas.sort()
+    return dict(indice)
+
+
+def guardar(indice, ruta, media_root):
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, "media_root": str(media_root), "indice": indice}, f)
+    # Reemplazo atómico: una caída no deja un índice a medio escribir
+    os.replace(temporal, ruta)
+
+
+def cargar(ruta, media_root):
+    """El índice guardado en `ruta`, o None si no existe, está dañado o es de otro MEDIA_ROOT."""
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(datos, dict) or datos.get("version") != VERSION or datos.get("media_root") != str(media_root):
+        return None
+    return datos.get("indice")
+
+
+def obtener(media_root, ruta=None, reconstruir=False):
+    """
+    (índice, reutilizado). Con `ruta` lee el índice guardado (salvo
+    `reconstruir`) y, si lo tuvo que construir, lo deja guardado.
+    """
+    if ruta and not reconstruir:
+        indice = cargar(ruta, media_root)
+        if indice is not None:
+            return indice, True
+    indice = construir(media_root)
+    if ruta:
+        guardar(indice, ruta, media_root)
+    return indice, False
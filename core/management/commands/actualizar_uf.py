@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import servicios_uf
+
+
+class Command(BaseCommand):
+    """
+    Trae la UF desde la fuente configurada (UF_FUENTE), la guarda en ValorUF y
+    recalcula los precios efectivos de las propiedades.
+
+    Pensado para cron una vez al día, pasada la medianoche (la UF se publica
+    con anticipación, pero la vigente cambia con la fecha):
+      python manage.py actualizar_uf
+      python manage.py actualizar_uf --archivo uf.json   # sin salida a internet
+      python manage.py actualizar_uf --archivo historico.csv   # carga de la serie histórica (fecha,valor)
+    """
+
+    help = "Actualiza la tabla ValorUF desde la fuente configurada."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivo", help="JSON de mindicador.cl o CSV fecha,valor en vez de la fuente configurada.")
+
+    def handle(self, *args, **options):
+        fuente = servicios_uf.FuenteArchivo(options["archivo"]) if options["archivo"] else None
+        try:
+            n = servicios_uf.actualizar(fuente)
+        except Exception as exc:
+            raise CommandError(f"No se pudo actualizar la UF: {exc}")
+        valor, fecha = servicios_uf.uf_hoy()
+        self.stdout.write(self.style.SUCCESS(f"{n} valores guardados. UF vigente ({fecha}): ${valor}"))
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core import autocompletar
+from core.datos_sinteticos import generar_propiedades
+from core.texto import normalizar
+from core.views import api_autocompletar
+
+
+def _percentil(valores, p):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p))]
+
+
+class Command(BaseCommand):
+    """
+    Mide el autocompletado sobre títulos sintéticos: tiempo de construcción
+    del trie, nodos y latencia por tecla (búsqueda en el trie y la vista
+    completa con RequestFactory). No escribe en la base.
+
+    Uso:
+      python manage.py benchmark_autocompletar --titulos 20000 --consultas 5000
+    """
+
+    help = "Imprime tiempos de construcción y latencias p50/p95/p99 del autocompletado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--titulos", type=int, default=20000, help="Títulos sintéticos a indexar.")
+        parser.add_argument("--consultas", type=int, default=5000, help="Prefijos a consultar.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def _reportar(self, nombre, tiempos_ms):
+        self.stdout.write(
+            f"  {nombre:<22} p50 {_percentil(tiempos_ms, 0.50):7.3f} ms   "
+            f"p95 {_percentil(tiempos_ms, 0.95):7.3f} ms   "
+            f"p99 {_percentil(tiempos_ms, 0.99):7.3f} ms   "
+            f"media {statistics.mean(tiempos_ms):7.3f} ms"
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        props = generar_propiedades(options["titulos"], seed=options["seed"])
+        titulos = [(p.titulo, p.slug, p.destacada) for p in props]
+
+        t0 = time.perf_counter()
+        trie = autocompletar.construir(titulos)
+        construccion = (time.perf_counter() - t0) * 1000
+
+        nodos = 0
+        pendientes = [trie.raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            nodos += 1
+            pendientes.extend(nodo.hijos.values())
+        self.stdout.write(f"Trie: {len(titulos)} títulos, {nodos} nodos, construido en {construccion:.0f} ms")
+
+        # Prefijos de 1 a 12 caracteres de títulos y comunas reales
+        fuentes = [normalizar(t) for t, _, _ in titulos]
+        prefijos = []
+        for _ in range(options["consultas"]):
+            texto = rnd.choice(fuentes)
+            palabras = texto.split(" ")
+            inicio = rnd.randrange(len(palabras))
+            sufijo = " ".join(palabras[inicio:])
+            prefijos.append(sufijo[: rnd.randint(1, 12)])
+
+        tiempos = []
+        for prefijo in prefijos:
+            t0 = time.perf_counter()
+            trie.buscar(prefijo, 8)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        self._reportar("trie.buscar", tiempos)
+
+        # Vista completa (JSON incluido) con el índice ya cargado en la caché
+        autocompletar.cache.guardar("indice", trie)
+        factory = RequestFactory()
+        tiempos = []
+        for prefijo in prefijos:
+            request = factory.get("/api/autocompletar/", {"q": prefijo})
+            t0 = time.perf_counter()
+            api_autocompletar(request)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        self._reportar("api_autocompletar", tiempos)
+        autocompletar.invalidar()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.alertas import IndiceBusquedas
+from core.datos_sinteticos import generar_propiedades
+from core.models import COMUNAS_RM, TIPO_OPERACION, TIPO_PROPIEDAD
+from core.texto import normalizar
+
+
+def _busquedas(n, rnd):
+    """Búsquedas sintéticas: la mayoría fija operación y comuna; pocas usan texto."""
+    operaciones = [op for op, _ in TIPO_OPERACION]
+    tipos = [t for t, _ in TIPO_PROPIEDAD]
+    for i in range(n):
+        op = rnd.choice(operaciones) if rnd.random() < 0.9 else ""
+        minimo = maximo = None
+        if rnd.random() < 0.7:
+            base = rnd.randint(1500, 30000) if op != "arriendo" else rnd.randint(10, 120)
+            minimo = base if rnd.random() < 0.8 else None
+            maximo = int(base * rnd.uniform(1.2, 2.5)) if rnd.random() < 0.8 else None
+        yield {
+            "id": i + 1,
+            "q": rnd.choice(["", "", "", "", "", "", "", "", "piscina", "vista"]),
+            "region": "",
+            "tipo_operacion": op,
+            "tipo_propiedad": rnd.choice(tipos) if rnd.random() < 0.6 else "",
+            "comuna": rnd.choice(COMUNAS_RM) if rnd.random() < 0.8 else "",
+            "min_precio": minimo,
+            "max_precio": maximo,
+            "dormitorios": rnd.choice([None, None, 1, 2, 3]),
+        }
+
+
+def _fila(p):
+    return {
+        "id": 0, "titulo_norm": normalizar(p.titulo), "descripcion_norm": normalizar(p.descripcion),
+        "comuna_norm": normalizar(p.comuna), "region": p.region, "tipo_operacion": p.tipo_operacion,
+        "tipo_propiedad": p.tipo_propiedad, "comuna": p.comuna, "precio_uf": p.precio_uf,
+        "dormitorios": p.dormitorios,
+    }
+
+
+def _calza_lineal(b, prop):
+    """Referencia: recorre los filtros de una búsqueda uno por uno."""
+    precio = float(prop["precio_uf"]) if prop["precio_uf"] else None
+    if b["tipo_operacion"] and b["tipo_operacion"] != prop["tipo_operacion"]:
+        return False
+    if b["tipo_propiedad"] and b["tipo_propiedad"] != prop["tipo_propiedad"]:
+        return False
+    if b["comuna"] and b["comuna"] != prop["comuna"]:
+        return False
+    if b["min_precio"] is not None and (precio is None or precio < b["min_precio"]):
+        return False
+    if b["max_precio"] is not None and (precio is None or precio > b["max_precio"]):
+        return False
+    if (b["dormitorios"] or 0) > (prop["dormitorios"] or 0):
+        return False
+    if b["q"]:
+        termino = normalizar(b["q"])
+        return any(termino in prop[c] for c in ("titulo_norm", "descripcion_norm", "comuna_norm"))
+    return True
+
+
+class Command(BaseCommand):
+    """
+    Compara el índice invertido de core/alertas.py contra recorrer todas las
+    búsquedas guardadas, sobre datos sintéticos en memoria (no toca la base).
+
+    Uso:
+      python manage.py benchmark_busquedas_guardadas --busquedas 100000 --propiedades 500
+    """
+
+    help = "Mide el emparejamiento de publicaciones nuevas contra N búsquedas guardadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--busquedas", type=int, default=100000)
+        parser.add_argument("--propiedades", type=int, default=500)
+        parser.add_argument("--lineal", type=int, default=50, help="Propiedades a medir con el recorrido lineal.")
+        parser.add_argument("--seed", type=int, default=11)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        busquedas = list(_busquedas(options["busquedas"], rnd))
+        props = [_fila(p) for p in generar_propiedades(options["propiedades"], seed=options["seed"])]
+
+        t0 = time.perf_counter()
+        indice = IndiceBusquedas(busquedas)
+        self.stdout.write(f"Índice de {len(busquedas)} búsquedas armado en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        tiempos = []
+        calces = 0
+        for prop in props:
+            t0 = time.perf_counter()
+            calces += len(indice.calces(prop))
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        self.stdout.write(
+            f"  índice   {len(props)} propiedades: mediana {statistics.median(tiempos):.3f} ms, "
+            f"máx {max(tiempos):.3f} ms, {calces / len(props):.1f} calces promedio"
+        )
+
+        muestra = props[: options["lineal"]]
+        tiempos = []
+        for prop in muestra:
+            t0 = time.perf_counter()
+            esperado = [b["id"] for b in busquedas if _calza_lineal(b, prop)]
+            tiempos.append((time.perf_counter() - t0) * 1000)
+            if sorted(indice.calces(prop)) != esperado:
+                self.stderr.write(self.style.ERROR(f"Diferencia con el recorrido lineal en {prop}"))
+                return
+        self.stdout.write(
+            f"  lineal   {len(muestra)} propiedades: mediana {statistics.median(tiempos):.3f} ms "
+            f"(mismos resultados que el índice)"
+        )
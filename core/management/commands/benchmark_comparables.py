@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from core.comparables import IndiceComparables
+from core.datos_sinteticos import generar_propiedades
+
+
+def _percentil(valores, p):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(len(orden) * p))]
+
+
+class Command(BaseCommand):
+    """
+    Mide la tasación por comparables sobre propiedades sintéticas: tiempo de
+    construcción de los árboles KD y latencia por consulta, contra un
+    recorrido completo con NumPy (que además sirve de verificación).
+    No escribe en la base.
+
+    Uso:
+      python manage.py benchmark_comparables --propiedades 50000 --consultas 2000
+    """
+
+    help = "Imprime construcción y latencias p50/p95/p99 del índice de comparables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--propiedades", type=int, default=50000)
+        parser.add_argument("--consultas", type=int, default=2000)
+        parser.add_argument("-k", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        k = options["k"]
+        filas = [
+            {
+                "id": i + 1, "slug": p.slug, "titulo": p.titulo, "comuna": p.comuna,
+                "tipo_propiedad": p.tipo_propiedad, "latitud": None, "longitud": None,
+                "precio_uf": p.precio_uf, "sup_construida_m2": p.sup_construida_m2,
+                "dormitorios": p.dormitorios, "ano_construccion": p.ano_construccion,
+            }
+            for i, p in enumerate(generar_propiedades(options["propiedades"], seed=options["seed"]))
+        ]
+
+        t0 = time.perf_counter()
+        indice = IndiceComparables(filas)
+        construccion = (time.perf_counter() - t0) * 1000
+        self.stdout.write(
+            f"Índice: {len(filas)} propiedades en {len(indice.arboles)} árboles, construido en {construccion:.0f} ms"
+        )
+
+        consultas = []
+        for _ in range(options["consultas"]):
+            base = rnd.choice(filas)
+            consultas.append((base["tipo_propiedad"], {
+                **base,
+                "sup_construida_m2": float(base["sup_construida_m2"]) * rnd.uniform(0.8, 1.25),
+                "dormitorios": max(0, base["dormitorios"] + rnd.choice([-1, 0, 0, 1])),
+            }))
+
+        arbol, lineal = [], []
+        for tipo, consulta in consultas:
+            t0 = time.perf_counter()
+            vecinos = indice.vecinos(tipo, consulta, k)
+            arbol.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            X = indice.arboles[tipo]._X
+            d = ((X - indice.vector(consulta)) ** 2).sum(axis=1)
+            cerca = np.lexsort((np.arange(len(d)), d))[:k]  # empates: por posición, como el árbol
+            lineal.append((time.perf_counter() - t0) * 1000)
+
+            grupo = indice.filas[tipo]
+            if [f["id"] for _, f in vecinos] != [grupo[i]["id"] for i in cerca]:
+                raise CommandError(f"El árbol no coincide con el recorrido completo para {consulta['id']}")
+
+        for nombre, tiempos in (("árbol KD", arbol), ("recorrido NumPy", lineal)):
+            self.stdout.write(
+                f"  {nombre:<16} p50 {_percentil(tiempos, 0.50):7.3f} ms   "
+                f"p95 {_percentil(tiempos, 0.95):7.3f} ms   p99 {_percentil(tiempos, 0.99):7.3f} ms"
+            )
+        self.stdout.write("  resultados idénticos")
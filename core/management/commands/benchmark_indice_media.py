@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core import indice_media
+
+CARPETAS = ("propiedades/propiedades", "propiedades/galeria", "banners", "agentes", "otros")
+
+
+class Command(BaseCommand):
+    """
+    Compara la búsqueda de archivos de rollback_first_migration: un
+    `rglob("*")` de MEDIA_ROOT por registro (antes) contra el índice
+    stem -> archivos de core/indice_media.py (construido, guardado y leído
+    de disco). Arma un árbol sintético de archivos vacíos en un directorio
+    temporal; no toca MEDIA_ROOT ni la base.
+
+    Uso:
+      python manage.py benchmark_indice_media --archivos 100000 --registros 20000
+    """
+
+    help = "Mide índice stem -> archivos vs rglob por registro sobre un árbol sintético."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivos", type=int, default=100000, help="Archivos del árbol sintético.")
+        parser.add_argument("--registros", type=int, default=20000, help="Registros a resolver.")
+        parser.add_argument("--muestras-rglob", type=int, default=3, help="Registros medidos con rglob (se extrapola).")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def _arbol(self, raiz: Path, n: int, rnd: random.Random) -> list[str]:
+        exts = (".jpg", ".jpeg", ".png", ".webp", ".txt")
+        stems = []
+        for i in range(n):
+            carpeta = raiz / rnd.choice(CARPETAS) / f"{i // 1000:03d}"
+            carpeta.mkdir(parents=True, exist_ok=True)
+            stem = f"foto_{i:06d}_{rnd.getrandbits(32):08x}"
+            (carpeta / f"{stem}{rnd.choice(exts)}").touch()
+            stems.append(stem)
+        return stems
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        raiz = Path(tempfile.mkdtemp(prefix="bench_media_"))
+        try:
+            t0 = time.perf_counter()
+            stems = self._arbol(raiz, options["archivos"], rnd)
+            self.stdout.write(f"Árbol: {len(stems)} archivos en {time.perf_counter() - t0:.1f}s ({raiz})")
+            buscados = [rnd.choice(stems) for _ in range(options["registros"])]
+
+            # Antes: recorrer todo el árbol por cada registro
+            muestras = buscados[: options["muestras_rglob"]]
+            t0 = time.perf_counter()
+            for stem in muestras:
+                [p for p in raiz.rglob("*")
+                 if p.is_file() and p.suffix.lower() in indice_media.IMG_EXTS and p.stem == stem]
+            por_registro = (time.perf_counter() - t0) / max(1, len(muestras))
+            self.stdout.write(
+                f"  rglob por registro      {por_registro * 1000:9.1f} ms/registro   "
+                f"=> {por_registro * len(buscados) / 60:9.1f} min para {len(buscados)} registros (extrapolado)"
+            )
+
+            t0 = time.perf_counter()
+            indice = indice_media.construir(raiz)
+            construccion = time.perf_counter() - t0
+
+            ruta = raiz.with_name(raiz.name + "_indice.json")
+            t0 = time.perf_counter()
+            indice_media.guardar(indice, ruta, raiz)
+            guardado = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            indice = indice_media.cargar(ruta, raiz)
+            lectura = time.perf_counter() - t0
+            tamano = os.path.getsize(ruta)
+            ruta.unlink()
+
+            t0 = time.perf_counter()
+            encontrados = sum(1 for stem in buscados if indice.get(stem))
+            busqueda = time.perf_counter() - t0
+
+            self.stdout.write(f"  índice: construir        {construccion * 1000:9.1f} ms ({len(indice)} stems)")
+            self.stdout.write(f"  índice: guardar          {guardado * 1000:9.1f} ms ({tamano / 1e6:.1f} MB)")
+            self.stdout.write(f"  índice: leer de disco    {lectura * 1000:9.1f} ms")
+            self.stdout.write(
+                f"  índice: {len(buscados)} búsquedas {busqueda * 1000:9.1f} ms ({encontrados} con archivo)"
+            )
+            self.stdout.write(
+                f"Total con índice: {(construccion + busqueda) * 1000:.0f} ms construido, "
+                f"{(lectura + busqueda) * 1000:.0f} ms reutilizado"
+            )
+        finally:
+            shutil.rmtree(raiz, ignore_errors=True)
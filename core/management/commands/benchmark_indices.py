@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.datos_sinteticos import generar_propiedades
+from core.models import Propiedad
+
+
+class Command(BaseCommand):
+    """
+    Mide las consultas del listado público y del home con y sin los índices
+    compuestos de Propiedad.Meta.indexes.
+
+    Todo ocurre dentro de una transacción que se revierte al final: los datos
+    sintéticos y el DROP/CREATE de índices no quedan en la base.
+    Solo SQLite (en MySQL el DDL hace commit implícito).
+
+    Uso:
+      python manage.py benchmark_indices --filas 50000 --repeticiones 20
+    """
+
+    help = "Imprime planes de ejecución y tiempos del listado con y sin índices compuestos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=30000, help="Propiedades sintéticas a generar.")
+        parser.add_argument("--repeticiones", type=int, default=15, help="Ejecuciones por consulta.")
+        parser.add_argument("--sin-planes", action="store_true", help="No imprimir EXPLAIN.")
+
+    def _escenarios(self):
+        base = Propiedad.objects.filter(publicada=True)
+        orden = ("-destacada", "-creado")
+        return [
+            ("listado sin filtros", base.order_by(*orden)[:12]),
+            ("home destacadas", base.filter(destacada=True).order_by("-creado")[:6]),
+            ("home recientes", base.order_by("-creado")[:9]),
+            ("venta + casa", base.filter(tipo_operacion="venta", tipo_propiedad="casa").order_by(*orden)[:12]),
+            ("comuna", base.filter(comuna="Las Condes").order_by(*orden)[:12]),
+            (
+                "venta + rango UF",
+                base.filter(tipo_operacion="venta", precio_uf__gte=5000, precio_uf__lte=6000).order_by(*orden)[:12],
+            ),
+            (
+                "departamento + dormitorios>=3",
+                base.filter(tipo_propiedad="departamento", dormitorios__gte=3).order_by(*orden)[:12],
+            ),
+        ]
+
+    def _medir(self, repeticiones: int, planes: bool) -> dict[str, float]:
+        resultados = {}
+        for nombre, qs in self._escenarios():
+            if planes:
+                self.stdout.write(f"  · {nombre}")
+                for linea in qs.explain().splitlines():
+                    self.stdout.write(f"      {linea}")
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                list(qs.all())
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            resultados[nombre] = statistics.median(tiempos)
+        return resultados
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Este benchmark solo corre sobre SQLite (usa una base de desarrollo).")
+
+        filas = options["filas"]
+        repeticiones = options["repeticiones"]
+        planes = not options["sin_planes"]
+        indices = list(Propiedad._meta.indexes)
+
+        with transaction.atomic():
+            self.stdout.write(f"Generando {filas} propiedades sintéticas...")
+            Propiedad.objects.bulk_create(generar_propiedades(filas), batch_size=2000)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            self.stdout.write(self.style.WARNING("=== Con índices compuestos ==="))
+            con = self._medir(repeticiones, planes)
+
+            # DROP INDEX directo: SQLite revierte DDL junto con la transacción,
+            # así que no hace falta recrearlos a mano.
+            with connection.cursor() as cursor:
+                for index in indices:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+                cursor.execute("ANALYZE")
+
+            self.stdout.write(self.style.WARNING("=== Sin índices compuestos ==="))
+            sin = self._medir(repeticiones, planes)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("=== Resumen (mediana ms) ==="))
+        self.stdout.write(f"{'consulta':<32}{'sin índices':>14}{'con índices':>14}{'mejora':>10}")
+        for nombre, ms_con in con.items():
+            ms_sin = sin[nombre]
+            mejora = ms_sin / ms_con if ms_con else float("inf")
+            self.stdout.write(f"{nombre:<32}{ms_sin:>14.2f}{ms_con:>14.2f}{mejora:>9.1f}x")
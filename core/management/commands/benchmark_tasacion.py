@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.servicios_tasacion import (
+    COLUMNAS_TASACION, VALORES_COMUNA_UF_M2, estimar_precio_propiedad, estimar_precios_lote,
+)
+
+
+def _filas(n, rnd, como_texto):
+    """Cartera sintética; `como_texto` imita lo que llega de un CSV."""
+    comunas = list(VALORES_COMUNA_UF_M2) + ["Colina", "Lampa"]
+    for _ in range(n):
+        tipo = rnd.choice(["casa", "departamento"])
+        sup = rnd.randint(30, 350)
+        fila = {
+            "comuna": rnd.choice(comunas),
+            "tipo_propiedad": tipo,
+            "sup_construida": sup,
+            "sup_terreno": sup + rnd.randint(0, 800) if tipo == "casa" else 0,
+            "dormitorios": rnd.randint(1, 6),
+            "banos": rnd.randint(1, 4),
+            "estacionamientos": rnd.randint(0, 3),
+            "bodegas": rnd.randint(0, 2),
+            "ano_construccion": rnd.choice([None, rnd.randint(1950, 2026)]),
+        }
+        if como_texto:
+            fila = {c: "" if fila[c] is None else str(fila[c]) for c in COLUMNAS_TASACION}
+        yield fila
+
+
+class Command(BaseCommand):
+    """
+    Compara el throughput de estimar_precio_propiedad() fila por fila contra
+    estimar_precios_lote() y verifica que ambos den exactamente lo mismo.
+    No toca la base.
+
+    Uso:
+      python manage.py benchmark_tasacion --filas 100000
+      python manage.py benchmark_tasacion --filas 100000 --texto   # como desde un CSV
+    """
+
+    help = "Throughput de la tasación escalar vs por lote."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=100000)
+        parser.add_argument("--texto", action="store_true", help="Valores como strings (entrada CSV).")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        filas = list(_filas(options["filas"], random.Random(options["seed"]), options["texto"]))
+        n = len(filas)
+
+        t0 = time.perf_counter()
+        escalar = [estimar_precio_propiedad(f) for f in filas]
+        t_escalar = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        precios_min, precios_max, errores = estimar_precios_lote(filas)
+        t_lote = time.perf_counter() - t0
+
+        lote = list(zip(precios_min.tolist(), precios_max.tolist()))
+        if errores or lote != escalar:
+            distintas = sum(a != b for a, b in zip(lote, escalar))
+            raise CommandError(f"El lote no coincide con la versión escalar ({distintas} filas, {len(errores)} errores)")
+
+        self.stdout.write(f"{n} filas ({'texto' if options['texto'] else 'números'}), resultados idénticos")
+        self.stdout.write(f"  escalar  {t_escalar * 1000:8.0f} ms   {n / t_escalar:10,.0f} filas/s")
+        self.stdout.write(f"  lote     {t_lote * 1000:8.0f} ms   {n / t_lote:10,.0f} filas/s   (x{t_escalar / t_lote:.1f})")
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from core import alertas
+from core.models import PublicacionPendiente
+
+
+class Command(BaseCommand):
+    """
+    Empareja las propiedades recién publicadas con las búsquedas guardadas y
+    despacha los avisos por correo (uno por email, con todas sus propiedades).
+
+    Pensado para cron cada pocos minutos:
+      python manage.py enviar_avisos_busquedas
+    El índice de búsquedas se arma una vez por ejecución y sirve a todo el lote.
+    """
+
+    help = "Empareja publicaciones nuevas con búsquedas guardadas y envía los avisos pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500, help="Publicaciones pendientes por pasada.")
+        parser.add_argument("--sin-envio", action="store_true", help="Solo emparejar (deja los avisos en la bandeja).")
+
+    def handle(self, *args, **options):
+        indice = None
+        total_props = total_avisos = 0
+        while PublicacionPendiente.objects.exists():
+            if indice is None:
+                indice = alertas.IndiceBusquedas.desde_bd()
+            props, avisos = alertas.emparejar_pendientes(options["lote"], indice=indice)
+            if not props:
+                break
+            total_props += props
+            total_avisos += avisos
+        self.stdout.write(f"Emparejadas {total_props} publicaciones: {total_avisos} avisos nuevos.")
+
+        if options["sin_envio"]:
+            return
+        correos = 0
+        while True:
+            enviados = alertas.enviar()
+            if not enviados:
+                break
+            correos += enviados
+        self.stdout.write(self.style.SUCCESS(f"Correos enviados: {correos}."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from core import imagenes, tarjetas
+from core.models import CarouselSlide, DerivadaImagen, ImagenPropiedad, Propiedad
+
+
+class Command(BaseCommand):
+    """
+    Genera las derivadas WebP (core/imagenes.py) de las imágenes que aún no
+    las tienen: portadas, galerías y banners subidos antes de existir el
+    pipeline, o cuyo procesamiento falló.
+
+    Uso:
+      python manage.py generar_derivadas
+      python manage.py generar_derivadas --forzar   # regenerar todo (p.ej. tras cambiar IMAGENES_ANCHOS)
+    """
+
+    help = "Genera las derivadas WebP faltantes de portadas, galerías y banners."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--forzar", action="store_true", help="Regenera también las que ya tienen derivadas.")
+
+    def handle(self, *args, **options):
+        forzar = options["forzar"]
+        hechas = set() if forzar else set(DerivadaImagen.objects.values_list("original", flat=True).distinct())
+        # (nombre, id de la propiedad cuya tarjeta hay que renovar o None)
+        pendientes = [
+            (nombre, pk) for pk, nombre in Propiedad.objects.exclude(portada="").exclude(portada=None)
+            .values_list("pk", "portada")
+        ]
+        pendientes += [(n, None) for n in ImagenPropiedad.objects.values_list("imagen", flat=True)]
+        pendientes += [(n, None) for n in CarouselSlide.objects.values_list("imagen", flat=True)]
+
+        imagenes_ok = derivadas = 0
+        for nombre, pk in pendientes:
+            if not nombre or nombre in hechas:
+                continue
+            hechas.add(nombre)
+            n = imagenes.generar(nombre, forzar=forzar)
+            if n:
+                imagenes_ok += 1
+                derivadas += n
+                if pk is not None:
+                    tarjetas.invalidar(pk)
+        self.stdout.write(self.style.SUCCESS(f"{imagenes_ok} imágenes procesadas, {derivadas} derivadas generadas."))
@@ -1,13 +1,82 @@
 # core/management/commands/migrate_media_to_cloudinary.py
 from __future__ import annotations
 
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
 
+from core import imagenes, tarjetas
 from core.models import Propiedad, ImagenPropiedad, CarouselSlide, Agente
 
+# --only -> (modelo, campo, carpeta en Cloudinary)
+TAREAS = {
+    "propiedades": (Propiedad, "portada", "propiedades"),
+    "galeria": (ImagenPropiedad, "imagen", "galeria"),
+    "slides": (CarouselSlide, "imagen", "banners"),
+    "agentes": (Agente, "foto", "agentes"),
+}
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """
+    Registro JSON lines (una línea por asset subido) para retomar una
+    migración cortada. Se agrega y se hace flush línea a línea: si el proceso
+    muere, lo ya subido queda anotado.
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.hechos = {}    # "propiedades:12" -> nombre guardado en BD
+        self.por_hash = {}  # sha256 -> public_id ya subido
+        self._lock = threading.Lock()
+        self._archivo = None
+        if path is None:
+            return
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        r = json.loads(linea)
+                        self.hechos[r["clave"]] = r["nombre"]
+                        self.por_hash[r["sha256"]] = r["public_id"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # línea cortada por una caída a mitad de escritura
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._archivo = open(path, "a", encoding="utf-8")
+
+    def public_id_de(self, sha):
+        with self._lock:
+            return self.por_hash.get(sha)
+
+    def registrar(self, clave, nombre, sha, public_id):
+        with self._lock:
+            self.hechos[clave] = nombre
+            self.por_hash.setdefault(sha, public_id)
+            if self._archivo:
+                self._archivo.write(json.dumps(
+                    {"clave": clave, "nombre": nombre, "sha256": sha, "public_id": public_id}
+                ) + "\n")
+                self._archivo.flush()
+
+    def cerrar(self):
+        if self._archivo:
+            self._archivo.close()
+
 
 class Command(BaseCommand):
     """
@@ -25,6 +94,16 @@ class Command(BaseCommand):
 
     Este comando sube usando public_id con "media/" delante (upload_public_id),
     pero guarda en BD SIN el "media/" (stored_name), para evitar doble "media/media".
+
+    Las subidas van en paralelo (--hilos) y cada una queda en el checkpoint
+    (--checkpoint): al repetir el comando se saltan los assets ya migrados y
+    un archivo con el mismo contenido (sha256) que otro ya subido no se vuelve
+    a subir, reutiliza ese public_id.
+
+    Uso:
+      python manage.py migrate_media_to_cloudinary --dry-run
+      python manage.py migrate_media_to_cloudinary --hilos 8
+      python manage.py migrate_media_to_cloudinary --uploader mi.modulo.subir_falso   # pruebas
     """
 
     help = "Sube imágenes desde MEDIA_ROOT a Cloudinary con prefijo media/ y mantiene el name limpio en BD."
@@ -35,11 +114,24 @@ class Command(BaseCommand):
         parser.add_argument("--dry-run", action="store_true", help="Simula sin subir ni guardar.")
         parser.add_argument(
             "--only",
-            choices=["all", "propiedades", "galeria", "slides", "agentes"],
+            choices=["all", *TAREAS],
             default="all",
             help="Migrar solo un subconjunto (por defecto: all).",
         )
         parser.add_argument("--debug", action="store_true", help="Logs detallados.")
+        parser.add_argument("--hilos", type=int, default=4, help="Subidas simultáneas (1 = secuencial).")
+        parser.add_argument("--lote", type=int, default=500, help="Filas leídas por consulta y guardadas por UPDATE.")
+        parser.add_argument(
+            "--checkpoint",
+            default=str(Path(settings.BASE_DIR) / "var" / "migrate_media_cloudinary.jsonl"),
+            help="Archivo de avance para retomar (por defecto var/migrate_media_cloudinary.jsonl).",
+        )
+        parser.add_argument("--progreso", type=float, default=5.0, help="Segundos entre reportes de avance.")
+        parser.add_argument(
+            "--uploader",
+            default="cloudinary.uploader.upload",
+            help="Función de subida (ruta con puntos), con la firma de cloudinary.uploader.upload.",
+        )
 
     def _norm_rel(self, rel: str) -> str:
         return (rel or "").strip().replace("\\", "/")
@@ -69,116 +161,196 @@ class Command(BaseCommand):
         dry = bool(options["dry_run"])
         only = options["only"]
         debug = bool(options["debug"])
+        hilos = max(1, options["hilos"])
+        lote = max(1, options["lote"])
 
-        try:
-            import cloudinary.uploader
-        except Exception as e:
-            self.stdout.write(self.style.ERROR("No se pudo importar cloudinary.uploader."))
-            self.stdout.write(self.style.ERROR(f"Detalle: {e}"))
-            return
+        uploader = options["uploader"]
+        if isinstance(uploader, str):
+            try:
+                uploader = import_string(uploader)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"No se pudo importar el uploader {options['uploader']!r}."))
+                self.stdout.write(self.style.ERROR(f"Detalle: {e}"))
+                return
 
         media_root = Path(str(settings.MEDIA_ROOT))
+        checkpoint = Checkpoint(None if dry else Path(options["checkpoint"]))
 
         total = 0
         migrated = 0
+        reused = 0
         skipped = 0
         missing = 0
         errors = 0
+        bytes_up = 0
 
         self.stdout.write(self.style.WARNING("=== Migración de imágenes a Cloudinary (FIX media/) ==="))
         self.stdout.write(f"MEDIA_ROOT: {media_root}")
         self.stdout.write(f"Dry-run: {dry}")
         self.stdout.write(f"Only: {only}")
         self.stdout.write(f"Debug: {debug}")
-
-        def migrate_field(obj, field_name: str, folder: str):
-            nonlocal total, migrated, skipped, missing, errors
-            total += 1
-
-            f = getattr(obj, field_name, None)
-            if not f:
-                skipped += 1
-                if debug:
-                    self.stdout.write(f"[SKIP-empty-field] obj={obj} field={field_name}")
-                return
-
-            rel_name = self._norm_rel(getattr(f, "name", "") or "")
-            if not rel_name:
-                skipped += 1
-                if debug:
-                    self.stdout.write(f"[SKIP-no-name] obj={obj} field={field_name}")
+        self.stdout.write(f"Hilos: {hilos}")
+        if not dry:
+            self.stdout.write(f"Checkpoint: {checkpoint.path} ({len(checkpoint.hechos)} ya migrados)")
+
+        def upload(local_path: Path, upload_public_id: str):
+            """En el pool: (sha256, public_id final, bytes subidos; 0 si el contenido ya estaba)."""
+            sha = _sha256(local_path)
+            existente = checkpoint.public_id_de(sha)
+            if existente:
+                return sha, existente, 0
+            uploader(str(local_path), public_id=upload_public_id, overwrite=True, resource_type="image")
+            return sha, upload_public_id, local_path.stat().st_size
+
+        tareas = [t for clave, t in TAREAS.items() if only in ("all", clave)]
+        previstos = sum(modelo.objects.count() for modelo, _, _ in tareas)
+        inicio = ultimo_reporte = time.monotonic()
+        propiedades_migradas = []
+
+        def report(final=False):
+            nonlocal ultimo_reporte
+            ahora = time.monotonic()
+            if not final and ahora - ultimo_reporte < options["progreso"]:
                 return
-
-            # Si no parece ruta (sin carpeta), saltamos
-            if "/" not in rel_name:
-                skipped += 1
-                if debug:
-                    self.stdout.write(f"[SKIP-not-path] obj={obj} field={field_name} name={repr(rel_name)}")
-                return
-
-            local_path = self._resolve_local_file(media_root, rel_name)
-            if not local_path:
-                missing += 1
-                if debug:
-                    self.stdout.write(f"[MISSING] obj={obj} field={field_name} name={repr(rel_name)}")
-                return
-
-            # Nombre que quieres guardar en la BD (sin media/)
-            stem = local_path.stem
-            stored_name = f"kcm/{folder}/{stem}_{getattr(obj, 'pk', 'na')}"
-
-            # Nombre real con el que DEBE existir en Cloudinary, porque tu .url agrega "media/"
-            upload_public_id = f"media/{stored_name}"
-
-            if debug:
-                self.stdout.write(
-                    f"[DEBUG] obj={obj} field={field_name} "
-                    f"stored_name={stored_name} upload_public_id={upload_public_id} local={local_path}"
-                )
-
-            self.stdout.write(f"[UPLOAD] {obj} -> {field_name}: {local_path} -> {upload_public_id}")
-
-            if dry:
-                migrated += 1
-                return
-
-            try:
-                cloudinary.uploader.upload(
-                    str(local_path),
-                    public_id=upload_public_id,
-                    overwrite=True,
-                    resource_type="image",
-                )
-
+            ultimo_reporte = ahora
+            seg = max(ahora - inicio, 1e-6)
+            pct = 100 * total / previstos if previstos else 100
+            self.stdout.write(
+                f"[PROGRESO] {total}/{previstos} ({pct:.0f}%) - subidos {migrated - reused}, "
+                f"repetidos {reused}, errores {errors} - {(migrated - reused) / seg:.1f} archivos/s, "
+                f"{bytes_up / seg / 1e6:.2f} MB/s"
+            )
+
+        for modelo, field_name, folder in tareas:
+            # (pk, stored_name) confirmados y aún sin escribir en BD
+            por_guardar = []
+
+            def save_pending(force=False):
+                nonlocal migrated, errors
+                if not por_guardar or not (force or len(por_guardar) >= lote):
+                    return
+                try:
+                    # UPDATE directo (bulk_update): sin cargar cada fila ni disparar sus señales.
+                    # Las cachés que muestran la imagen se limpian al final.
+                    modelo.objects.bulk_update(
+                        [modelo(pk=pk, **{field_name: nombre}) for pk, nombre in por_guardar],
+                        [field_name], batch_size=lote,
+                    )
+                    if modelo is Propiedad:
+                        propiedades_migradas.extend(pk for pk, _ in por_guardar)
+                except Exception as e:
+                    # Ya están subidos y en el checkpoint: al repetir, el hash evita subirlos de nuevo
+                    migrated -= len(por_guardar)
+                    errors += len(por_guardar)
+                    self.stdout.write(self.style.ERROR(f"[ERROR-save] {modelo.__name__} {field_name}: {e}"))
+                por_guardar.clear()
+
+            def collect(futuro, pk, clave, local_path):
+                nonlocal migrated, reused, errors, bytes_up
+                try:
+                    sha, public_id, subidos = futuro.result()
+                except Exception as e:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f"[ERROR] {clave} field={field_name} file={local_path} err={e}"))
+                    return
                 # Guardamos SIN "media/" para que el storage no lo duplique
-                setattr(obj, field_name, stored_name)
-                obj.save(update_fields=[field_name])
-
+                stored_name = public_id.removeprefix("media/")
+                checkpoint.registrar(clave, stored_name, sha, public_id)
+                por_guardar.append((pk, stored_name))
                 migrated += 1
-
-            except Exception as e:
-                errors += 1
-                self.stdout.write(self.style.ERROR(f"[ERROR] obj={obj} field={field_name} err={e}"))
-
-        if only in ("all", "propiedades"):
-            for p in Propiedad.objects.all():
-                migrate_field(p, "portada", "propiedades")
-
-        if only in ("all", "galeria"):
-            for ip in ImagenPropiedad.objects.all():
-                migrate_field(ip, "imagen", "galeria")
-
-        if only in ("all", "slides"):
-            for s in CarouselSlide.objects.all():
-                migrate_field(s, "imagen", "banners")
-
-        if only in ("all", "agentes"):
-            for a in Agente.objects.all():
-                migrate_field(a, "foto", "agentes")
+                bytes_up += subidos
+                if not subidos:
+                    reused += 1
+                    if debug:
+                        self.stdout.write(f"[REUSE] {clave} mismo contenido que {public_id}")
+                save_pending()
+
+            pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="cloudinary") if hilos > 1 else None
+            en_vuelo = {}
+            try:
+                filas = modelo.objects.order_by("pk").values_list("pk", field_name)
+                for pk, name in filas.iterator(chunk_size=lote):
+                    total += 1
+                    clave = f"{folder}:{pk}"
+                    rel_name = self._norm_rel(name or "")
+                    if not rel_name:
+                        skipped += 1
+                        if debug:
+                            self.stdout.write(f"[SKIP-no-name] {clave} field={field_name}")
+                        continue
+
+                    if checkpoint.hechos.get(clave) == rel_name:
+                        skipped += 1
+                        if debug:
+                            self.stdout.write(f"[SKIP-checkpoint] {clave} name={rel_name!r}")
+                        continue
+
+                    # Si no parece ruta (sin carpeta), saltamos
+                    if "/" not in rel_name:
+                        skipped += 1
+                        if debug:
+                            self.stdout.write(f"[SKIP-not-path] {clave} field={field_name} name={rel_name!r}")
+                        continue
+
+                    local_path = self._resolve_local_file(media_root, rel_name)
+                    if not local_path:
+                        missing += 1
+                        if debug:
+                            self.stdout.write(f"[MISSING] {clave} field={field_name} name={rel_name!r}")
+                        continue
+
+                    # Nombre que quieres guardar en la BD (sin media/)
+                    stored_name = f"kcm/{folder}/{local_path.stem}_{pk}"
+                    # Nombre real con el que DEBE existir en Cloudinary, porque tu .url agrega "media/"
+                    upload_public_id = f"media/{stored_name}"
+
+                    if debug:
+                        self.stdout.write(
+                            f"[DEBUG] {clave} field={field_name} "
+                            f"stored_name={stored_name} upload_public_id={upload_public_id} local={local_path}"
+                        )
+                    self.stdout.write(f"[UPLOAD] {clave} -> {field_name}: {local_path} -> {upload_public_id}")
+
+                    if dry:
+                        migrated += 1
+                        continue
+
+                    if pool:
+                        futuro = pool.submit(upload, local_path, upload_public_id)
+                    else:
+                        futuro = Future()
+                        try:
+                            futuro.set_result(upload(local_path, upload_public_id))
+                        except Exception as e:
+                            futuro.set_exception(e)
+                    en_vuelo[futuro] = (pk, clave, local_path)
+                    # Pool acotado: no se leen más filas mientras haya 2 por hilo esperando
+                    while len(en_vuelo) >= hilos * 2:
+                        listos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                        for f in listos:
+                            collect(f, *en_vuelo.pop(f))
+                    report()
+
+                for f in list(en_vuelo):
+                    collect(f, *en_vuelo.pop(f))
+            finally:
+                # Ante una caída se guarda lo ya subido; el checkpoint cubre el resto
+                if pool:
+                    pool.shutdown(cancel_futures=True)
+                save_pending(force=True)
+
+        checkpoint.cerrar()
+        for pk in propiedades_migradas:
+            tarjetas.invalidar(pk)
+        imagenes.cache.limpiar()
+        report(final=True)
 
         self.stdout.write(self.style.SUCCESS("=== Resumen ==="))
         self.stdout.write(f"Total revisados: {total}")
-        self.stdout.write(f"Migrados: {migrated}")
+        self.stdout.write(f"Migrados: {migrated} (reutilizados por contenido igual: {reused})")
         self.stdout.write(f"Saltados: {skipped}")
         self.stdout.write(f"Missing local files: {missing}")
         self.stdout.write(f"Errores: {errors}")
+        self.stdout.write(f"Tiempo: {time.monotonic() - inicio:.1f}s, {bytes_up / 1e6:.1f} MB subidos")
+        if migrated and not dry:
+            self.stdout.write("Las derivadas WebP se crean aparte: python manage.py generar_derivadas")
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Propiedad
+
+
+class Command(BaseCommand):
+    """
+    Recalcula las columnas *_norm de Propiedad (titulo, descripcion, comuna).
+
+    save() ya las mantiene; esto es para filas cargadas con bulk_create /
+    queryset.update() o si cambia la regla de normalización.
+
+    Uso:
+      python manage.py normalizar_textos --lote 2000
+    """
+
+    help = "Backfill de las columnas normalizadas (sin tildes, minúsculas) de Propiedad."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Filas por bulk_update.")
+        parser.add_argument("--dry-run", action="store_true", help="Cuenta cambios sin guardar.")
+
+    def handle(self, *args, **options):
+        tamano = options["lote"]
+        dry = options["dry_run"]
+        campos = list(Propiedad.CAMPOS_NORMALIZADOS.items())
+        destinos = [d for _, d in campos]
+
+        revisadas = 0
+        cambiadas = 0
+        lote = []
+
+        qs = Propiedad.objects.only("id", *[o for o, _ in campos], *destinos).order_by("pk")
+        for prop in qs.iterator(chunk_size=tamano):
+            revisadas += 1
+            cambio = False
+            for destino, valor in prop.textos_normalizados().items():
+                if getattr(prop, destino) != valor:
+                    setattr(prop, destino, valor)
+                    cambio = True
+            if not cambio:
+                continue
+            cambiadas += 1
+            lote.append(prop)
+            if len(lote) >= tamano and not dry:
+                Propiedad.objects.bulk_update(lote, destinos)
+                lote = []
+
+        if lote and not dry:
+            Propiedad.objects.bulk_update(lote, destinos)
+
+        self.stdout.write(self.style.SUCCESS(f"Revisadas: {revisadas} · Actualizadas: {cambiadas}"))
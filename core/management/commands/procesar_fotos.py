@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import cola_fotos, imagenes
+
+
+class Command(BaseCommand):
+    """
+    Procesa las fotos que el admin dejó en cola (core/cola_fotos.py):
+    redimensiona, re-codifica y sube cada una como ImagenPropiedad, con un
+    pool de hilos. También genera las derivadas WebP en cola de portadas,
+    galerías y banners (core/imagenes.py), fuera de los requests del admin.
+
+    Pensado para cron cada minuto, o como proceso permanente:
+      python manage.py procesar_fotos
+      python manage.py procesar_fotos --continuo --hilos 8
+    Se puede cortar en cualquier momento: lo que quedó a medias vuelve a la
+    cola pasado FOTOS_PROCESANDO_TIMEOUT.
+    """
+
+    help = "Procesa y publica las fotos subidas en lote desde el admin y genera las derivadas en cola."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=50, help="Fotos por pasada.")
+        parser.add_argument("--hilos", type=int, help="Hilos de procesamiento (por defecto FOTOS_HILOS).")
+        parser.add_argument("--continuo", action="store_true", help="No terminar; revisar la cola cada --intervalo s.")
+        parser.add_argument("--intervalo", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        total = errores = derivadas = 0
+        while True:
+            listas, con_error = cola_fotos.procesar(options["lote"], options["hilos"])
+            hechas = imagenes.procesar_pendientes(options["lote"])
+            total += listas
+            errores += con_error
+            derivadas += hechas
+            if listas or con_error or hechas:
+                continue
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+        self.stdout.write(self.style.SUCCESS(f"Fotos publicadas: {total}. Con error: {errores}. Imágenes con derivadas: {derivadas}."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import cola_leads
+
+
+class Command(BaseCommand):
+    """
+    Pasa a la BD los leads que el tasador virtual dejó en la cola en disco
+    (core/cola_leads.py), en lotes con bulk_create.
+
+    Pensado para cron cada minuto, o como proceso permanente:
+      python manage.py procesar_leads
+      python manage.py procesar_leads --continuo --intervalo 2
+    Se puede cortar en cualquier momento: lo no confirmado sigue en la cola.
+    """
+
+    help = "Vacía la cola de leads del tasador en la base de datos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500, help="Leads por INSERT.")
+        parser.add_argument("--continuo", action="store_true", help="No terminar; revisar la cola cada --intervalo s.")
+        parser.add_argument("--intervalo", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        total = malos = 0
+        while True:
+            guardados, con_error = cola_leads.procesar(options["lote"])
+            total += guardados
+            malos += con_error
+            if guardados or con_error:
+                continue
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+        self.stdout.write(self.style.SUCCESS(f"Leads guardados: {total}. Ilegibles apartados: {malos}."))
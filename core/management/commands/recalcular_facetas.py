@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import facetas
+
+
+class Command(BaseCommand):
+    """
+    Recalcula desde cero los conteos por faceta (GROUP BY sobre publicadas).
+
+    Las señales los mantienen al día; esto es para después de cargas masivas
+    o queryset.update() que no pasan por save().
+    """
+
+    help = "Reconstruye la tabla ConteoFaceta con los totales actuales."
+
+    def handle(self, *args, **options):
+        filas = facetas.recalcular()
+        self.stdout.write(self.style.SUCCESS(f"Conteos recalculados: {filas} valores de faceta."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core import valores_mercado
+
+
+class Command(BaseCommand):
+    """
+    Recalcula desde cero la tabla de UF/m² por comuna y tipo (medianas de las
+    publicaciones en venta).
+
+    Las señales la mantienen al día; esto es para después de cargas masivas
+    o queryset.update() que no pasan por save().
+    """
+
+    help = "Reconstruye la tabla ValorMercadoComuna con las medianas actuales."
+
+    def handle(self, *args, **options):
+        filas = valores_mercado.recalcular()
+        self.stdout.write(self.style.SUCCESS(f"Valores de mercado recalculados: {filas} grupos."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core import busqueda
+
+
+class Command(BaseCommand):
+    """
+    Reconstruye el índice FTS5 de búsqueda desde core_propiedad.
+
+    Necesario después de cargas masivas (bulk_create, queryset.update) que no
+    disparan las señales de Propiedad. En MySQL no hace nada: el índice
+    FULLTEXT lo mantiene la propia base.
+    """
+
+    help = "Reconstruye el índice de búsqueda de texto de propiedades."
+
+    def handle(self, *args, **options):
+        motor = busqueda.motor()
+        if motor != "fts5":
+            self.stdout.write(self.style.WARNING(f"Motor actual: {motor or 'ninguno'}; nada que reconstruir."))
+            return
+        filas = busqueda.reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Índice FTS5 reconstruido: {filas} propiedades."))
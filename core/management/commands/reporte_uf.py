@@ -0,0 +1,80 @@
+import csv
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import servicios_uf
+from core.models import Lead, Propiedad
+
+# Por reporte: (queryset, campos, encabezado). Los campos van siempre como
+# id, creado, <columnas que se copian>, precio_uf, precio_clp.
+REPORTES = {
+    "leads": (
+        Lead.objects.all(),
+        ("id", "creado", "origen", "propiedad_id", "propiedad__titulo", "propiedad__precio_uf", "propiedad__precio_clp"),
+        ("lead", "fecha", "origen", "propiedad", "titulo"),
+    ),
+    "propiedades": (
+        Propiedad.objects.all(),
+        ("id", "creado", "tipo_operacion", "publicada", "titulo", "precio_uf", "precio_clp"),
+        ("propiedad", "fecha", "tipo_operacion", "publicada", "titulo"),
+    ),
+}
+
+
+def _celda(valor, decimales):
+    if np.isnan(valor):
+        return ""
+    return f"{valor:.{decimales}f}"
+
+
+class Command(BaseCommand):
+    """
+    CSV de leads o propiedades con el precio en UF y en pesos a la UF de su
+    fecha (serie histórica de ValorUF; cargarla con `actualizar_uf --archivo`).
+    Una consulta para las filas, otra para la serie y la conversión en bloque.
+
+    Uso:
+      python manage.py reporte_uf leads --desde 2024-01-01 --salida leads.csv
+      python manage.py reporte_uf propiedades
+    """
+
+    help = "Reporte de precios convertidos CLP<->UF a la UF histórica."
+
+    def add_arguments(self, parser):
+        parser.add_argument("reporte", choices=sorted(REPORTES))
+        parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha final, inclusive.")
+        parser.add_argument("--salida", help="CSV de salida (por defecto, stdout).")
+
+    def handle(self, *args, **options):
+        qs, campos, encabezado = REPORTES[options["reporte"]]
+        if options["desde"]:
+            qs = qs.filter(creado__date__gte=options["desde"])
+        if options["hasta"]:
+            qs = qs.filter(creado__date__lte=options["hasta"])
+        filas = list(qs.order_by("creado", "id").values_list(*campos))
+
+        serie = servicios_uf.serie()
+        if not len(serie):
+            raise CommandError("No hay valores de UF cargados (ver `actualizar_uf --archivo`).")
+        fechas = [timezone.localtime(f[1]).date() for f in filas]
+        uf_dia, uf, clp = serie.convertir(fechas, [f[-2] for f in filas], [f[-1] for f in filas])
+
+        def escribir(salida):
+            w = csv.writer(salida)
+            w.writerow(encabezado + ("uf_del_dia", "precio_uf", "precio_clp"))
+            for i, fila in enumerate(filas):
+                w.writerow(
+                    (fila[0], fechas[i].isoformat()) + tuple(fila[2:-2])
+                    + (_celda(uf_dia[i], 2), _celda(uf[i], 2), _celda(clp[i], 0))
+                )
+
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8", newline="") as f:
+                escribir(f)
+        else:
+            escribir(self.stdout)
+        self.stderr.write(f"{len(filas)} filas.")
@@ -1,13 +1,27 @@
 # core/management/commands/rollback_first_migration.py
 from __future__ import annotations
 
+import time
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from core import imagenes, indice_media, tarjetas
 from core.models import Propiedad, ImagenPropiedad, CarouselSlide, Agente
 
+# --only -> (modelo, campo, carpetas preferidas si hay varios archivos con el mismo stem)
+TAREAS = {
+    # Portadas suelen estar en media/propiedades/propiedades/...
+    "propiedades": (Propiedad, "portada", ["propiedades/propiedades", "propiedades"]),
+    # Galería en media/propiedades/galeria/...
+    "galeria": (ImagenPropiedad, "imagen", ["propiedades/galeria", "galeria", "propiedades"]),
+    # Slides en media/banners/...
+    "slides": (CarouselSlide, "imagen", ["banners", "banner", "slides"]),
+    # Agentes en media/agentes/...
+    "agentes": (Agente, "foto", ["agentes", "equipo"]),
+}
+
 
 class Command(BaseCommand):
     """
@@ -17,24 +31,30 @@ class Command(BaseCommand):
     y los vuelve a rutas reales locales dentro de MEDIA_ROOT, buscando el archivo
     por el <stem> en disco.
 
+    MEDIA_ROOT se recorre una sola vez para armar un índice stem -> archivos
+    (core/indice_media.py); con --indice queda guardado y las siguientes
+    corridas lo reutilizan (--reindexar para rehacerlo). Los cambios se
+    escriben con bulk_update en lotes de --lote filas.
+
     Uso:
       python manage.py rollback_first_migration --dry-run --debug
-      python manage.py rollback_first_migration
+      python manage.py rollback_first_migration --indice var/indice_media.json
     """
 
     help = "Revierte ImageFields 'kcm/...' a rutas locales existentes en MEDIA_ROOT."
 
-    IMG_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
-
     def add_arguments(self, parser):
         parser.add_argument("--dry-run", action="store_true", help="Simula sin guardar cambios.")
         parser.add_argument("--debug", action="store_true", help="Logs detallados.")
         parser.add_argument(
             "--only",
-            choices=["all", "propiedades", "galeria", "slides", "agentes"],
+            choices=["all", *TAREAS],
             default="all",
             help="Revertir solo un subconjunto (por defecto: all).",
         )
+        parser.add_argument("--indice", help="Archivo JSON donde guardar/reutilizar el índice de MEDIA_ROOT.")
+        parser.add_argument("--reindexar", action="store_true", help="Rehace el índice aunque exista --indice.")
+        parser.add_argument("--lote", type=int, default=500, help="Filas leídas por consulta y guardadas por UPDATE.")
 
     def _norm(self, s: str) -> str:
         return (s or "").strip().replace("\\", "/")
@@ -60,21 +80,12 @@ class Command(BaseCommand):
         stem = last.rsplit("_", 1)[0].strip()
         return stem or None
 
-    def _find_candidate_files(self, media_root: Path, stem: str) -> list[Path]:
+    def _find_candidate_files(self, media_root: Path, indice: dict, stem: str) -> list[Path]:
         """
-        Busca en MEDIA_ROOT cualquier archivo cuya 'stem' sea EXACTAMENTE stem,
-        con extensión de imagen permitida.
+        Archivos en MEDIA_ROOT cuya 'stem' es EXACTAMENTE stem, con extensión
+        de imagen permitida (según el índice).
         """
-        matches: list[Path] = []
-        # glob recursivo
-        for p in media_root.rglob("*"):
-            if not p.is_file():
-                continue
-            if p.suffix.lower() not in self.IMG_EXTS:
-                continue
-            if p.stem == stem:
-                matches.append(p)
-        return matches
+        return [media_root / rel for rel in indice.get(stem, ())]
 
     def _pick_best_match(self, matches: list[Path], prefer_folders: list[str]) -> Path | None:
         """
@@ -107,6 +118,7 @@ class Command(BaseCommand):
         dry = bool(options["dry_run"])
         debug = bool(options["debug"])
         only = options["only"]
+        lote = max(1, options["lote"])
 
         media_root = Path(str(settings.MEDIA_ROOT))
 
@@ -116,6 +128,14 @@ class Command(BaseCommand):
         self.stdout.write(f"Debug: {debug}")
         self.stdout.write(f"Only: {only}")
 
+        t0 = time.perf_counter()
+        indice, reutilizado = indice_media.obtener(media_root, options["indice"], options["reindexar"])
+        self.stdout.write(
+            f"Índice: {sum(map(len, indice.values()))} archivos, {len(indice)} stems "
+            f"({'reutilizado de ' + options['indice'] if reutilizado else 'construido'} "
+            f"en {time.perf_counter() - t0:.2f}s)"
+        )
+
         total = 0
         changed = 0
         missing = 0
@@ -123,93 +143,93 @@ class Command(BaseCommand):
         ambiguous = 0
         errors = 0
 
-        def rollback_field(obj, field_name: str, prefer_folders: list[str]):
-            nonlocal total, changed, missing, skipped, ambiguous, errors
+        def resolve(stem: str, prefer_folders: list[str]) -> tuple[Path | None, int]:
+            nonlocal indice, reutilizado
+            matches = self._find_candidate_files(media_root, indice, stem)
+            best = self._pick_best_match(matches, prefer_folders)
+            if reutilizado and (best is None or not best.exists()):
+                # El índice guardado puede estar viejo: se rehace (una sola vez) y se vuelve a buscar
+                self.stdout.write(self.style.NOTICE(f"[REINDEX] stem={stem} no calza con el índice guardado"))
+                indice, reutilizado = indice_media.obtener(media_root, options["indice"], reconstruir=True)
+                matches = self._find_candidate_files(media_root, indice, stem)
+                best = self._pick_best_match(matches, prefer_folders)
+            return best, len(matches)
+
+        for modelo, field_name, prefer_folders in [t for clave, t in TAREAS.items() if only in ("all", clave)]:
+            por_guardar = []  # (pk, nueva ruta)
+
+            def save_pending(force=False):
+                nonlocal changed, errors
+                if not por_guardar or not (force or len(por_guardar) >= lote):
+                    return
+                try:
+                    # bulk_update: un UPDATE por lote, sin cargar cada fila ni disparar sus señales
+                    modelo.objects.bulk_update(
+                        [modelo(pk=pk, **{field_name: rel}) for pk, rel in por_guardar], [field_name]
+                    )
+                    changed += len(por_guardar)
+                    if modelo is Propiedad:
+                        for pk, _ in por_guardar:
+                            tarjetas.invalidar(pk)
+                except Exception as e:
+                    errors += len(por_guardar)
+                    self.stdout.write(self.style.ERROR(f"[ERROR-save] {modelo.__name__} {field_name}: {e}"))
+                por_guardar.clear()
+
+            filas = modelo.objects.order_by("pk").values_list("pk", field_name)
+            for pk, name in filas.iterator(chunk_size=lote):
+                total += 1
+                obj = f"{modelo.__name__}#{pk}"
+
+                current_name = self._norm(name or "")
+                if not current_name:
+                    skipped += 1
+                    continue
+
+                # Solo revertimos si parece public_id "kcm/..."
+                if not self._is_kcm_public_id(current_name):
+                    skipped += 1
+                    if debug:
+                        self.stdout.write(f"[SKIP-not-kcm] {obj} {field_name} name={current_name}")
+                    continue
+
+                stem = self._extract_stem_from_public_id(current_name)
+                if not stem:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f"[ERROR-no-stem] {obj} {field_name} name={current_name}"))
+                    continue
+
+                best, n_matches = resolve(stem, prefer_folders)
+                if not best:
+                    missing += 1
+                    self.stdout.write(self.style.NOTICE(f"[MISSING] {obj} {field_name} stem={stem} from={current_name}"))
+                    continue
+
+                if n_matches > 1:
+                    ambiguous += 1
+                    if debug:
+                        self.stdout.write(f"[AMBIGUOUS] {obj} {field_name} stem={stem} matches={n_matches}")
+
+                new_rel = self._to_rel_media(media_root, best)
 
-            total += 1
+                if debug:
+                    self.stdout.write(
+                        f"[SET] {obj} {field_name}\n"
+                        f"  old: {current_name}\n"
+                        f"  new: {new_rel}"
+                    )
 
-            f = getattr(obj, field_name, None)
-            if not f:
-                skipped += 1
-                return
+                if dry:
+                    changed += 1
+                    continue
 
-            current_name = self._norm(getattr(f, "name", "") or "")
-            if not current_name:
-                skipped += 1
-                return
+                por_guardar.append((pk, new_rel))
+                save_pending()
 
-            # Solo revertimos si parece public_id "kcm/..."
-            if not self._is_kcm_public_id(current_name):
-                skipped += 1
-                if debug:
-                    self.stdout.write(f"[SKIP-not-kcm] {obj} {field_name} name={current_name}")
-                return
-
-            stem = self._extract_stem_from_public_id(current_name)
-            if not stem:
-                errors += 1
-                self.stdout.write(self.style.ERROR(f"[ERROR-no-stem] {obj} {field_name} name={current_name}"))
-                return
-
-            matches = self._find_candidate_files(media_root, stem)
-            if not matches:
-                missing += 1
-                self.stdout.write(self.style.NOTICE(f"[MISSING] {obj} {field_name} stem={stem} from={current_name}"))
-                return
-
-            if len(matches) > 1:
-                ambiguous += 1
-                if debug:
-                    self.stdout.write(f"[AMBIGUOUS] {obj} {field_name} stem={stem} matches={len(matches)}")
+            save_pending(force=True)
 
-            best = self._pick_best_match(matches, prefer_folders)
-            if not best:
-                missing += 1
-                self.stdout.write(self.style.NOTICE(f"[MISSING-best] {obj} {field_name} stem={stem}"))
-                return
-
-            new_rel = self._to_rel_media(media_root, best)
-
-            if debug:
-                self.stdout.write(
-                    f"[SET] {obj} {field_name}\n"
-                    f"  old: {current_name}\n"
-                    f"  new: {new_rel}"
-                )
-
-            if dry:
-                changed += 1
-                return
-
-            try:
-                setattr(obj, field_name, new_rel)
-                obj.save(update_fields=[field_name])
-                changed += 1
-            except Exception as e:
-                errors += 1
-                self.stdout.write(self.style.ERROR(f"[ERROR-save] {obj} {field_name}: {e}"))
-
-        # ---- Ejecutamos según --only ----
-
-        if only in ("all", "propiedades"):
-            # Portadas suelen estar en media/propiedades/propiedades/...
-            for p in Propiedad.objects.all():
-                rollback_field(p, "portada", prefer_folders=["propiedades/propiedades", "propiedades"])
-
-        if only in ("all", "galeria"):
-            # Galería en media/propiedades/galeria/...
-            for ip in ImagenPropiedad.objects.all():
-                rollback_field(ip, "imagen", prefer_folders=["propiedades/galeria", "galeria", "propiedades"])
-
-        if only in ("all", "slides"):
-            # Slides en media/banners/...
-            for s in CarouselSlide.objects.all():
-                rollback_field(s, "imagen", prefer_folders=["banners", "banner", "slides"])
-
-        if only in ("all", "agentes"):
-            # Agentes en media/agentes/...
-            for a in Agente.objects.all():
-                rollback_field(a, "foto", prefer_folders=["agentes", "equipo"])
+        if changed and not dry:
+            imagenes.cache.limpiar()
 
         # ---- Resumen ----
         self.stdout.write(self.style.SUCCESS("=== Resumen ==="))
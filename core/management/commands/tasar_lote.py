@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.servicios_tasacion import escribir_csv, estimar_precios_lote, leer_csv
+
+
+class Command(BaseCommand):
+    """
+    Tasa una cartera desde un CSV (columnas como las de api_tasacion:
+    comuna, tipo_propiedad, sup_construida, sup_terreno, banos,
+    estacionamientos, bodegas, ano_construccion) y escribe el mismo CSV con
+    precio_min_uf, precio_max_uf y error.
+
+    Uso:
+      python manage.py tasar_lote cartera.csv --salida tasacion.csv
+    """
+
+    help = "Tasación por lote de un CSV de propiedades."
+
+    def add_arguments(self, parser):
+        parser.add_argument("entrada", help="CSV de entrada (',', ';' o tabulador).")
+        parser.add_argument("--salida", help="CSV de salida (por defecto, stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["entrada"], encoding="utf-8-sig", newline="") as f:
+                filas = leer_csv(f.read())
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(f"No se pudo leer {options['entrada']}: {exc}")
+
+        precios_min, precios_max, errores = estimar_precios_lote(filas)
+
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8", newline="") as f:
+                escribir_csv(f, filas, precios_min, precios_max, errores)
+        else:
+            escribir_csv(self.stdout, filas, precios_min, precios_max, errores)
+        self.stderr.write(f"{len(filas)} filas tasadas, {len(errores)} con error.")
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_agente_options_alter_carouselslide_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['-destacada', '-creado'], name='prop_pub_dest_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['-creado'], name='prop_pub_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['tipo_operacion', 'tipo_propiedad', '-destacada', '-creado'], name='prop_pub_op_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['comuna', '-destacada', '-creado'], name='prop_pub_comuna_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['tipo_operacion', 'precio_uf'], name='prop_pub_op_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['tipo_propiedad', '-destacada', '-creado'], name='prop_pub_tipo_idx'),
+        ),
+    ]
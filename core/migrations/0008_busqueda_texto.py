@@ -0,0 +1,45 @@
+from django.db import migrations, OperationalError
+
+
+FTS_TABLA = "core_propiedad_fts"
+FULLTEXT_INDICE = "prop_fulltext_idx"
+
+
+def crear_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLA} "
+                f"USING fts5(titulo, descripcion, comuna, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite compilado sin FTS5: la búsqueda cae a icontains
+            return
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLA} (rowid, titulo, descripcion, comuna) "
+            f"SELECT id, titulo, descripcion, comuna FROM core_propiedad"
+        )
+    elif vendor == "mysql":
+        schema_editor.execute(
+            f"ALTER TABLE core_propiedad ADD FULLTEXT INDEX {FULLTEXT_INDICE} (titulo, descripcion, comuna)"
+        )
+
+
+def borrar_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLA}")
+    elif vendor == "mysql":
+        schema_editor.execute(f"ALTER TABLE core_propiedad DROP INDEX {FULLTEXT_INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_propiedad_indices_listado'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_texto, borrar_indice_texto),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:15
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalizar(texto):
+    # Copia congelada de core.texto.normalizar
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto))
+    sin_tildes = "".join(ch for ch in descompuesto if not unicodedata.combining(ch))
+    return " ".join(sin_tildes.lower().split())
+
+
+def poblar_normalizados(apps, schema_editor):
+    Propiedad = apps.get_model('core', 'Propiedad')
+    lote = []
+    for prop in Propiedad.objects.only('id', 'titulo', 'descripcion', 'comuna').iterator(chunk_size=1000):
+        prop.titulo_norm = _normalizar(prop.titulo)
+        prop.descripcion_norm = _normalizar(prop.descripcion)
+        prop.comuna_norm = _normalizar(prop.comuna)
+        lote.append(prop)
+        if len(lote) >= 1000:
+            Propiedad.objects.bulk_update(lote, ['titulo_norm', 'descripcion_norm', 'comuna_norm'])
+            lote = []
+    if lote:
+        Propiedad.objects.bulk_update(lote, ['titulo_norm', 'descripcion_norm', 'comuna_norm'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propiedad',
+            name='comuna_norm',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='descripcion_norm',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='titulo_norm',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=180),
+        ),
+        migrations.RunPython(poblar_normalizados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+FACETAS = ("comuna", "tipo_operacion", "tipo_propiedad", "dormitorios")
+
+
+def poblar_conteos(apps, schema_editor):
+    Propiedad = apps.get_model('core', 'Propiedad')
+    ConteoFaceta = apps.get_model('core', 'ConteoFaceta')
+    publicadas = Propiedad.objects.filter(publicada=True).order_by()
+    filas = []
+    for faceta in FACETAS:
+        for row in publicadas.values(faceta).annotate(n=Count('id')):
+            filas.append(ConteoFaceta(faceta=faceta, valor=str(row[faceta]), total=row['n']))
+    ConteoFaceta.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_propiedad_textos_normalizados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faceta', models.CharField(max_length=30)),
+                ('valor', models.CharField(max_length=60)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Conteo de filtro',
+                'verbose_name_plural': 'Conteos de filtros',
+                'constraints': [models.UniqueConstraint(fields=('faceta', 'valor'), name='conteo_faceta_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_conteos, migrations.RunPython.noop),
+    ]
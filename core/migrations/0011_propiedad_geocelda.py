@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+# core.geo es puro (sin modelos ni settings): se puede usar desde la migración
+from core import geo
+
+
+def poblar_geoceldas(apps, schema_editor):
+    Propiedad = apps.get_model('core', 'Propiedad')
+    lote = []
+    for prop in Propiedad.objects.only('id', 'latitud', 'longitud', 'comuna').iterator(chunk_size=1000):
+        prop.geocelda = geo.geocelda(prop.latitud, prop.longitud, prop.comuna)
+        lote.append(prop)
+        if len(lote) >= 1000:
+            Propiedad.objects.bulk_update(lote, ['geocelda'])
+            lote = []
+    if lote:
+        Propiedad.objects.bulk_update(lote, ['geocelda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_conteofaceta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propiedad',
+            name='geocelda',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(poblar_geoceldas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:33
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_propiedad_geocelda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusquedaGuardada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('q', models.CharField(blank=True, max_length=200, verbose_name='Texto')),
+                ('region', models.CharField(blank=True, max_length=40)),
+                ('tipo_operacion', models.CharField(blank=True, choices=[('venta', 'Venta'), ('arriendo', 'Arriendo')], max_length=20)),
+                ('tipo_propiedad', models.CharField(blank=True, choices=[('casa', 'Casa'), ('departamento', 'Departamento'), ('parcela', 'Parcela/Terreno'), ('oficina', 'Oficina'), ('comercial', 'Local/Bodega')], max_length=30)),
+                ('comuna', models.CharField(blank=True, max_length=60)),
+                ('min_precio', models.PositiveIntegerField(blank=True, null=True, verbose_name='UF desde')),
+                ('max_precio', models.PositiveIntegerField(blank=True, null=True, verbose_name='UF hasta')),
+                ('dormitorios', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Dormitorios mínimos')),
+                ('activa', models.BooleanField(default=True)),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Búsqueda guardada',
+                'verbose_name_plural': 'Búsquedas guardadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='PublicacionPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('propiedad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.propiedad')),
+            ],
+            options={
+                'verbose_name': 'Publicación por avisar',
+                'verbose_name_plural': 'Publicaciones por avisar',
+            },
+        ),
+        migrations.CreateModel(
+            name='AvisoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('enviado', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('propiedad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.propiedad')),
+                ('busqueda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='avisos', to='core.busquedaguardada')),
+            ],
+            options={
+                'verbose_name': 'Aviso de búsqueda',
+                'verbose_name_plural': 'Avisos de búsquedas',
+                'constraints': [models.UniqueConstraint(fields=('busqueda', 'propiedad'), name='aviso_busqueda_unico')],
+            },
+        ),
+    ]
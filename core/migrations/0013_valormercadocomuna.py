@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:40
+
+import statistics
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_valores(apps, schema_editor):
+    Propiedad = apps.get_model('core', 'Propiedad')
+    ValorMercadoComuna = apps.get_model('core', 'ValorMercadoComuna')
+    muestra = Propiedad.objects.filter(
+        publicada=True, tipo_operacion='venta', precio_uf__gt=0, sup_construida_m2__gt=0,
+    ).values_list('comuna', 'tipo_propiedad', 'precio_uf', 'sup_construida_m2')
+    por_grupo = defaultdict(list)
+    for comuna, tipo, precio, sup in muestra.iterator():
+        por_grupo[(comuna, tipo)].append(precio / sup)
+        por_grupo[(comuna, '')].append(precio / sup)
+    ValorMercadoComuna.objects.bulk_create([
+        ValorMercadoComuna(
+            comuna=comuna, tipo_propiedad=tipo, muestras=len(valores),
+            uf_m2=statistics.median(valores).quantize(Decimal('0.01')),
+        )
+        for (comuna, tipo), valores in por_grupo.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_busquedas_guardadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorMercadoComuna',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comuna', models.CharField(max_length=60)),
+                ('tipo_propiedad', models.CharField(blank=True, max_length=30)),
+                ('uf_m2', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='UF/m²')),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Valor de mercado por comuna',
+                'verbose_name_plural': 'Valores de mercado por comuna',
+                'constraints': [models.UniqueConstraint(fields=('comuna', 'tipo_propiedad'), name='valor_mercado_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_valores, migrations.RunPython.noop),
+    ]
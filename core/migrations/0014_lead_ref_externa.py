@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_valormercadocomuna'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='ref_externa',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
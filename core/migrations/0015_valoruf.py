@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_lead_ref_externa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorUF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fuente', models.CharField(blank=True, max_length=40)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Valor UF',
+                'verbose_name_plural': 'Valores UF',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# core.precios no importa modelos: actualizar_columnas() recibe el histórico
+from core.precios import actualizar_columnas
+
+
+def poblar_precios_efectivos(apps, schema_editor):
+    Propiedad = apps.get_model('core', 'Propiedad')
+    ValorUF = apps.get_model('core', 'ValorUF')
+    uf = (
+        ValorUF.objects.filter(fecha__lte=timezone.localdate())
+        .order_by('-fecha').values_list('valor', flat=True).first()
+    ) or getattr(settings, 'UF_RESPALDO', None)
+    actualizar_columnas(Propiedad, uf, copiar=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_valoruf'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='propiedad',
+            name='prop_pub_op_precio_idx',
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='precio_clp_efectivo',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='precio_uf_efectivo',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        # Antes de los índices: el backfill no los mantiene fila a fila
+        migrations.RunPython(poblar_precios_efectivos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['tipo_operacion', 'precio_uf_efectivo'], name='prop_pub_op_precio_uf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('publicada', True)), fields=['tipo_operacion', 'precio_clp_efectivo'], name='prop_pub_op_precio_clp_idx'),
+        ),
+    ]
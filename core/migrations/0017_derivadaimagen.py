@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_precios_efectivos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DerivadaImagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original', models.CharField(db_index=True, max_length=255)),
+                ('ancho', models.PositiveSmallIntegerField()),
+                ('alto', models.PositiveSmallIntegerField()),
+                ('archivo', models.FileField(max_length=255, upload_to='derivadas/')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Derivada de imagen',
+                'verbose_name_plural': 'Derivadas de imágenes',
+                'ordering': ['original', 'ancho'],
+                'constraints': [models.UniqueConstraint(fields=('original', 'ancho'), name='derivada_imagen_unica')],
+            },
+        ),
+    ]
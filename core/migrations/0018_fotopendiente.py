@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_derivadaimagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FotoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo', models.CharField(max_length=100, verbose_name='Archivo en staging')),
+                ('nombre', models.CharField(max_length=255, verbose_name='Nombre original')),
+                ('orden', models.PositiveSmallIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('lista', 'Lista'), ('error', 'Error')], db_index=True, default='pendiente', max_length=12)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('imagen', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.imagenpropiedad')),
+                ('propiedad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fotos_pendientes', to='core.propiedad')),
+            ],
+            options={
+                'verbose_name': 'Foto en proceso',
+                'verbose_name_plural': 'Fotos en proceso',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
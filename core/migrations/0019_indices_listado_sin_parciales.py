@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+# Equivalentes de los índices parciales (condition=Q(publicada=True)) de
+# Propiedad para motores sin índices parciales (MySQL: Django los omite sin
+# avisar). Van con publicada adelante: en MySQL el filtro se escribe
+# "publicada = 1", así que el índice se recorre igual que el parcial.
+# En SQLite/PostgreSQL no se crean (el parcial ya cubre esas consultas).
+INDICES = [
+    ('prop_pubm_dest_creado_idx', ['publicada', '-destacada', '-creado']),
+    ('prop_pubm_creado_idx', ['publicada', '-creado']),
+    ('prop_pubm_op_tipo_idx', ['publicada', 'tipo_operacion', 'tipo_propiedad', '-destacada', '-creado']),
+    ('prop_pubm_comuna_idx', ['publicada', 'comuna', '-destacada', '-creado']),
+    ('prop_pubm_op_precio_uf_idx', ['publicada', 'tipo_operacion', 'precio_uf_efectivo']),
+    ('prop_pubm_op_precio_clp_idx', ['publicada', 'tipo_operacion', 'precio_clp_efectivo']),
+    ('prop_pubm_tipo_idx', ['publicada', 'tipo_propiedad', '-destacada', '-creado']),
+]
+
+
+def _indices():
+    return [models.Index(fields=campos, name=nombre) for nombre, campos in INDICES]
+
+
+def crear_sin_parciales(apps, schema_editor):
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    Propiedad = apps.get_model('core', 'Propiedad')
+    for indice in _indices():
+        schema_editor.add_index(Propiedad, indice)
+
+
+def borrar_sin_parciales(apps, schema_editor):
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    Propiedad = apps.get_model('core', 'Propiedad')
+    for indice in _indices():
+        schema_editor.remove_index(Propiedad, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_fotopendiente'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_sin_parciales, borrar_sin_parciales),
+    ]
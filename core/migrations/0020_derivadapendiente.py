@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_indices_listado_sin_parciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DerivadaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original', models.CharField(max_length=255, unique=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Derivada pendiente',
+                'verbose_name_plural': 'Derivadas pendientes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:27
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def confirmar_existentes(apps, schema_editor):
+    # Las guardadas antes del doble opt-in siguen recibiendo avisos (tienen link de baja)
+    BusquedaGuardada = apps.get_model('core', 'BusquedaGuardada')
+    BusquedaGuardada.objects.update(confirmada=F('creado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_derivadapendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busquedaguardada',
+            name='confirmada',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(confirmar_existentes, migrations.RunPython.noop),
+    ]
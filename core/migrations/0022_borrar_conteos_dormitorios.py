@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def borrar_conteos_dormitorios(apps, schema_editor):
+    # dormitorios dejó de ser faceta: sus conteos ya no se mantienen ni se muestran
+    ConteoFaceta = apps.get_model('core', 'ConteoFaceta')
+    ConteoFaceta.objects.filter(faceta='dormitorios').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_busquedaguardada_confirmada'),
+    ]
+
+    operations = [
+        migrations.RunPython(borrar_conteos_dormitorios, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
 # core/models.py
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import uuid
+
+from . import geo
+from .texto import normalizar
 
 # Solo Región Metropolitana
 REGIONES_CHOICES = [
@@ -68,11 +73,20 @@ class Propiedad(models.Model):
         choices=[(c, c) for c in COMUNAS_RM]
     )
     direccion = models.CharField(max_length=200, blank=True)
+    # Coordenadas exactas (opcionales). Sin ellas el mapa usa el centroide de la comuna.
+    latitud = models.FloatField(blank=True, null=True)
+    longitud = models.FloatField(blank=True, null=True)
+    # Geohash de la ubicación efectiva (ver core/geo.py); se calcula en save()
+    geocelda = models.CharField(max_length=12, blank=True, default="", editable=False, db_index=True)
 
     # Moneda principal: UF
     precio_uf = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     # Campo legado (CLP) mantenido solo para compatibilidad con datos antiguos
     precio_clp = models.PositiveBigIntegerField(validators=[MinValueValidator(1)])
+    # Precio en ambas monedas aunque se haya cargado solo una (ver core/precios.py).
+    # Se calculan en save(); con cada UF nueva, servicios_uf.actualizar() los recalcula.
+    precio_uf_efectivo = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, editable=False)
+    precio_clp_efectivo = models.PositiveBigIntegerField(blank=True, null=True, editable=False)
     dormitorios = models.PositiveSmallIntegerField(default=0)
     banos = models.PositiveSmallIntegerField(default=0)
     estacionamientos = models.PositiveSmallIntegerField(default=0)
@@ -90,14 +104,84 @@ class Propiedad(models.Model):
     creado = models.DateTimeField(default=timezone.now)
     actualizado = models.DateTimeField(auto_now=True)
 
+    # Columnas sombra normalizadas (sin tildes, minúsculas) para búsquedas.
+    # Se calculan en save(); backfill con `manage.py normalizar_textos`.
+    titulo_norm = models.CharField(max_length=180, blank=True, default="", editable=False, db_index=True)
+    descripcion_norm = models.TextField(blank=True, default="", editable=False)
+    comuna_norm = models.CharField(max_length=60, blank=True, default="", editable=False, db_index=True)
+
+    # Campo original -> columna normalizada
+    CAMPOS_NORMALIZADOS = {
+        "titulo": "titulo_norm",
+        "descripcion": "descripcion_norm",
+        "comuna": "comuna_norm",
+    }
+
     class Meta:
         ordering = ['-destacada', '-creado']
         verbose_name = "Propiedad"
         verbose_name_plural = "Propiedades"
+        # Índices compuestos pensados para las combinaciones reales de
+        # BusquedaPropiedadForm. Son parciales (solo publicadas) porque Django
+        # traduce publicada=True a un WHERE "publicada" sin "= 1", que SQLite
+        # no puede usar como igualdad en un índice normal. MySQL no tiene
+        # índices parciales (Django los omite): la migración 0019 le crea
+        # equivalentes con publicada adelante; mantenerla al cambiar estos.
+        indexes = [
+            # Listado sin filtros y destacadas del home
+            models.Index(
+                fields=['-destacada', '-creado'], condition=Q(publicada=True),
+                name='prop_pub_dest_creado_idx',
+            ),
+            # Recientes del home (solo orden por fecha)
+            models.Index(fields=['-creado'], condition=Q(publicada=True), name='prop_pub_creado_idx'),
+            # Links del navbar: ?tipo_operacion=venta&tipo_propiedad=casa
+            models.Index(
+                fields=['tipo_operacion', 'tipo_propiedad', '-destacada', '-creado'], condition=Q(publicada=True),
+                name='prop_pub_op_tipo_idx',
+            ),
+            # Filtro por comuna
+            models.Index(
+                fields=['comuna', '-destacada', '-creado'], condition=Q(publicada=True),
+                name='prop_pub_comuna_idx',
+            ),
+            # Rango de precio en UF o en pesos (venta y arriendo tienen escalas distintas)
+            models.Index(
+                fields=['tipo_operacion', 'precio_uf_efectivo'], condition=Q(publicada=True),
+                name='prop_pub_op_precio_uf_idx',
+            ),
+            models.Index(
+                fields=['tipo_operacion', 'precio_clp_efectivo'], condition=Q(publicada=True),
+                name='prop_pub_op_precio_clp_idx',
+            ),
+            # Solo tipo de propiedad (dormitorios >= N se filtra recorriendo el
+            # índice ya ordenado; por sí solo es muy poco selectivo)
+            models.Index(
+                fields=['tipo_propiedad', '-destacada', '-creado'], condition=Q(publicada=True),
+                name='prop_pub_tipo_idx',
+            ),
+        ]
+
+    # Campos de los que depende geocelda
+    CAMPOS_UBICACION = ("latitud", "longitud", "comuna")
+    # Campos de los que dependen los precios efectivos
+    CAMPOS_PRECIO = ("precio_uf", "precio_clp")
 
     def __str__(self):
         return self.titulo
 
+    @property
+    def ubicacion(self):
+        """(lat, lng, aproximada): coordenadas propias o centroide de la comuna."""
+        return geo.ubicacion(self.latitud, self.longitud, self.comuna)
+
+    def textos_normalizados(self):
+        """{columna *_norm: valor}. NFKD puede alargar el texto ("½" -> "1⁄2"): se corta al largo de la columna."""
+        return {
+            destino: normalizar(getattr(self, origen))[:self._meta.get_field(destino).max_length]
+            for origen, destino in self.CAMPOS_NORMALIZADOS.items()
+        }
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base = slugify(self.titulo)[:180] or f"propiedad-{int(timezone.now().timestamp())}"
@@ -108,6 +192,22 @@ class Propiedad(models.Model):
                 slug = f"{base}-{i}"
                 i += 1
             self.slug = slug
+
+        for destino, valor in self.textos_normalizados().items():
+            setattr(self, destino, valor)
+        self.geocelda = geo.geocelda(self.latitud, self.longitud, self.comuna)
+        from . import precios, servicios_uf
+        self.precio_uf_efectivo, self.precio_clp_efectivo = precios.efectivos(
+            self.precio_uf, self.precio_clp, servicios_uf.uf_hoy()[0]
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = {d for o, d in self.CAMPOS_NORMALIZADOS.items() if o in update_fields}
+            if any(c in update_fields for c in self.CAMPOS_UBICACION):
+                extra.add("geocelda")
+            if any(c in update_fields for c in self.CAMPOS_PRECIO):
+                extra.update(("precio_uf_efectivo", "precio_clp_efectivo"))
+            kwargs["update_fields"] = set(update_fields) | extra
         super().save(*args, **kwargs)
 
 
@@ -136,6 +236,8 @@ class Lead(models.Model):
     creado = models.DateTimeField(default=timezone.now)
     comuna = models.CharField(max_length=60, blank=True)
     origen = models.CharField(max_length=50, default='web')
+    # Id asignado al encolar (core/cola_leads.py): hace idempotente la carga
+    ref_externa = models.UUIDField(unique=True, null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Mensaje de Cliente"
@@ -158,3 +260,230 @@ class CarouselSlide(models.Model):
 
     def __str__(self):
         return self.titulo or f"Slide #{self.pk}"
+
+
+class FotoPendiente(models.Model):
+    """
+    Foto subida en el admin que espera ser procesada (ver core/cola_fotos.py).
+    El request solo la copia al staging local (FOTOS_STAGING_DIR); el comando
+    `procesar_fotos` la redimensiona, la sube al storage como ImagenPropiedad
+    y deja aquí el estado, que el admin muestra por foto.
+    """
+    PENDIENTE = "pendiente"
+    PROCESANDO = "procesando"
+    LISTA = "lista"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESANDO, "Procesando"),
+        (LISTA, "Lista"),
+        (ERROR, "Error"),
+    ]
+
+    propiedad = models.ForeignKey(Propiedad, on_delete=models.CASCADE, related_name="fotos_pendientes")
+    archivo = models.CharField("Archivo en staging", max_length=100)
+    nombre = models.CharField("Nombre original", max_length=255)
+    orden = models.PositiveSmallIntegerField(default=0)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE, db_index=True)
+    error = models.TextField(blank=True)
+    imagen = models.OneToOneField(
+        ImagenPropiedad, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    creado = models.DateTimeField(default=timezone.now)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name = "Foto en proceso"
+        verbose_name_plural = "Fotos en proceso"
+
+    def __str__(self):
+        return f"{self.nombre} ({self.get_estado_display()})"
+
+
+class DerivadaImagen(models.Model):
+    """
+    Versión WebP de una imagen subida (portada, galería o banner) a un ancho
+    dado, para `srcset`. `original` es el nombre del archivo en el storage,
+    así sirve para los tres modelos sin FK genérica. Ver core/imagenes.py.
+    """
+    original = models.CharField(max_length=255, db_index=True)
+    ancho = models.PositiveSmallIntegerField()
+    alto = models.PositiveSmallIntegerField()
+    archivo = models.FileField(max_length=255, upload_to="derivadas/")
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["original", "ancho"]
+        verbose_name = "Derivada de imagen"
+        verbose_name_plural = "Derivadas de imágenes"
+        constraints = [
+            models.UniqueConstraint(fields=["original", "ancho"], name="derivada_imagen_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.original} @{self.ancho}w"
+
+
+class DerivadaPendiente(models.Model):
+    """
+    Imagen recién subida cuyas derivadas aún no se generan. La fila se crea
+    en la misma transacción que el save (si este se revierte, no queda) y la
+    consume el worker `procesar_fotos`, fuera del request.
+    """
+    original = models.CharField(max_length=255, unique=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Derivada pendiente"
+        verbose_name_plural = "Derivadas pendientes"
+
+    def __str__(self):
+        return self.original
+
+
+class ConteoFaceta(models.Model):
+    """
+    Conteo denormalizado de propiedades publicadas por valor de filtro
+    (p.ej. faceta="comuna", valor="Las Condes" -> 42). Lo mantienen las
+    señales de Propiedad de forma incremental; ver core/facetas.py.
+    """
+    faceta = models.CharField(max_length=30)
+    valor = models.CharField(max_length=60)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Conteo de filtro"
+        verbose_name_plural = "Conteos de filtros"
+        constraints = [
+            models.UniqueConstraint(fields=["faceta", "valor"], name="conteo_faceta_unico"),
+        ]
+
+    def __str__(self):
+        return f"{self.faceta}={self.valor}: {self.total}"
+
+
+
+class ValorMercadoComuna(models.Model):
+    """
+    Mediana de UF/m² construido de las publicaciones en venta, por comuna y
+    tipo (tipo vacío = todos los tipos de la comuna). La mantienen las
+    señales de Propiedad; la lee la tasación. Ver core/valores_mercado.py.
+    """
+    comuna = models.CharField(max_length=60)
+    tipo_propiedad = models.CharField(max_length=30, blank=True)
+    uf_m2 = models.DecimalField("UF/m²", max_digits=10, decimal_places=2)
+    muestras = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Valor de mercado por comuna"
+        verbose_name_plural = "Valores de mercado por comuna"
+        constraints = [
+            models.UniqueConstraint(fields=["comuna", "tipo_propiedad"], name="valor_mercado_unico"),
+        ]
+
+    def __str__(self):
+        return f"{self.comuna} {self.tipo_propiedad or '(todos)'}: {self.uf_m2} UF/m²"
+
+
+class ValorUF(models.Model):
+    """
+    Valor diario de la UF en pesos. Lo carga `python manage.py actualizar_uf`
+    (una vez al día) desde la fuente configurada; ver core/servicios_uf.py.
+    """
+    fecha = models.DateField(unique=True)
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    fuente = models.CharField(max_length=40, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Valor UF"
+        verbose_name_plural = "Valores UF"
+        ordering = ["-fecha"]
+
+    def __str__(self):
+        return f"UF {self.fecha}: ${self.valor}"
+
+class BusquedaGuardada(models.Model):
+    """
+    Filtros de BusquedaPropiedadForm guardados con un email para avisar
+    cuando se publique algo que calce (ver core/alertas.py).
+    Campo vacío / nulo = sin restricción en ese filtro. Solo recibe avisos
+    una vez confirmada desde el link que llega al email (doble opt-in).
+    """
+    email = models.EmailField(db_index=True)
+    q = models.CharField("Texto", max_length=200, blank=True)
+    region = models.CharField(max_length=40, blank=True)
+    tipo_operacion = models.CharField(max_length=20, choices=TIPO_OPERACION, blank=True)
+    tipo_propiedad = models.CharField(max_length=30, choices=TIPO_PROPIEDAD, blank=True)
+    comuna = models.CharField(max_length=60, blank=True)
+    min_precio = models.PositiveIntegerField("UF desde", blank=True, null=True)
+    max_precio = models.PositiveIntegerField("UF hasta", blank=True, null=True)
+    dormitorios = models.PositiveSmallIntegerField("Dormitorios mínimos", blank=True, null=True)
+    activa = models.BooleanField(default=True)
+    confirmada = models.DateTimeField(blank=True, null=True)
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    creado = models.DateTimeField(default=timezone.now)
+
+    # Filtros del formulario que se guardan (mismos nombres que en el form)
+    FILTROS = ("q", "region", "tipo_operacion", "tipo_propiedad", "comuna", "min_precio", "max_precio", "dormitorios")
+
+    class Meta:
+        verbose_name = "Búsqueda guardada"
+        verbose_name_plural = "Búsquedas guardadas"
+
+    def __str__(self):
+        return f"{self.email}: {self.querystring() or 'todas'}"
+
+    @classmethod
+    def desde_form(cls, form, email):
+        """Instancia (sin guardar) con los filtros ya limpios de un BusquedaPropiedadForm válido."""
+        datos = {campo: form.cleaned_data.get(campo) for campo in cls.FILTROS}
+        datos = {k: v for k, v in datos.items() if v not in (None, "")}
+        if form.cleaned_data.get("moneda") == "CLP":
+            # Los avisos comparan en UF: el rango en pesos se pasa a UF del día
+            from .servicios_uf import uf_hoy
+            uf = uf_hoy()[0]
+            for campo in ("min_precio", "max_precio"):
+                if campo in datos and uf:
+                    datos[campo] = int(round(datos[campo] / uf))
+        return cls(email=email, **datos)
+
+    def querystring(self):
+        """Los filtros como querystring del listado (para el link del aviso)."""
+        from urllib.parse import urlencode
+        valores = {campo: getattr(self, campo) for campo in self.FILTROS}
+        return urlencode({k: v for k, v in valores.items() if v not in (None, "")})
+
+
+class PublicacionPendiente(models.Model):
+    """
+    Propiedades recién publicadas que aún no se comparan contra las búsquedas
+    guardadas. Las crea la señal de Propiedad; las consume `enviar_avisos_busquedas`.
+    """
+    propiedad = models.OneToOneField(Propiedad, on_delete=models.CASCADE, related_name="+")
+    creado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Publicación por avisar"
+        verbose_name_plural = "Publicaciones por avisar"
+
+
+class AvisoBusqueda(models.Model):
+    """Bandeja de salida: una propiedad que calzó con una búsqueda guardada."""
+    busqueda = models.ForeignKey(BusquedaGuardada, on_delete=models.CASCADE, related_name="avisos")
+    propiedad = models.ForeignKey(Propiedad, on_delete=models.CASCADE, related_name="+")
+    creado = models.DateTimeField(default=timezone.now)
+    enviado = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Aviso de búsqueda"
+        verbose_name_plural = "Avisos de búsquedas"
+        constraints = [
+            models.UniqueConstraint(fields=["busqueda", "propiedad"], name="aviso_busqueda_unico"),
+        ]
+
+    def __str__(self):
+        return f"{self.busqueda.email} <- {self.propiedad_id}"
@@ -0,0 +1,239 @@
+"""
+Paginación por cursor (keyset) para el listado de propiedades.
+
+En vez de COUNT(*) + OFFSET, cada página se pide "desde la última clave vista"
+sobre el orden (-destacada, -creado, id), que es exactamente el de los
+índices parciales de Propiedad (SQLite guarda el rowid ascendente al final
+de cada entrada): cualquier página cuesta lo mismo que la primera.
+
+El cursor viaja firmado (opaco) en ?cursor=...; si llega adulterado o
+vencido se sirve la primera página.
+"""
+import hashlib
+from datetime import datetime
+from functools import cached_property
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models.query import QuerySet
+
+CURSOR_SALT = "core.paginacion.cursor"
+
+
+# ===========================
+# Conteo total cacheado
+# ===========================
+def conteo_cacheado(qs):
+    """
+    COUNT(*) del queryset cacheado por LISTADO_CONTEO_TTL segundos (clave =
+    hash del SQL). Con TTL 0 retorna None y el template no muestra el total.
+    """
+    ttl = getattr(settings, "LISTADO_CONTEO_TTL", 300)
+    if not ttl:
+        return None
+    clave = "listado:conteo:" + hashlib.md5(str(qs.query).encode("utf-8")).hexdigest()
+    total = cache.get(clave)
+    if total is None:
+        total = qs.count()
+        cache.set(clave, total, ttl)
+    return total
+
+
+class PaginatorConteoCacheado(Paginator):
+    """Paginator clásico (?page=N) que no repite el COUNT(*) en cada request."""
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            total = conteo_cacheado(self.object_list)
+            if total is not None:
+                return total
+        return super().count
+
+
+# ===========================
+# Cursores
+# ===========================
+def _codificar(obj, numero, direccion):
+    return signing.dumps(
+        {"d": int(obj.destacada), "c": obj.creado.isoformat(), "i": obj.pk, "n": numero, "s": direccion},
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def _decodificar(token):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        return (
+            bool(data["d"]),
+            datetime.fromisoformat(data["c"]),
+            int(data["i"]),
+            max(1, int(data["n"])),
+            data["s"] if data["s"] in ("sig", "ant") else "sig",
+        )
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+class PaginaKeyset:
+    """
+    Página con la misma interfaz que usa el template de Page (iterable,
+    number, has_next/has_previous, paginator.per_page/count) más los cursores.
+    """
+
+    def __init__(self, object_list, number, paginator, hay_siguiente, hay_anterior):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._hay_siguiente = hay_siguiente
+        self._hay_anterior = hay_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._hay_siguiente
+
+    def has_previous(self):
+        return self._hay_anterior
+
+    def has_other_pages(self):
+        return self._hay_siguiente or self._hay_anterior
+
+    @cached_property
+    def cursor_siguiente(self):
+        if not self._hay_siguiente:
+            return ""
+        return _codificar(self.object_list[-1], self.number + 1, "sig")
+
+    @cached_property
+    def cursor_anterior(self):
+        if not self._hay_anterior:
+            return ""
+        return _codificar(self.object_list[0], self.number - 1, "ant")
+
+
+def pagina_de_ids(ids, numero, queryset, per_page):
+    """
+    Page clásico (?page=N) sobre una lista de ids ya ordenada; solo se leen
+    de la BD las filas de la página.
+    """
+    page = Paginator(list(ids), per_page).get_page(numero)
+    por_id = queryset.in_bulk(page.object_list)
+    page.object_list = [por_id[pk] for pk in page.object_list if pk in por_id]
+    return page
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset de Propiedad por (-destacada, -creado, id).
+
+    Cada página son a lo más dos rangos indexados: los que comparten el valor
+    de `destacada` de la clave y, si faltan filas, el tramo siguiente del
+    otro valor. Sin OFFSET y sin COUNT(*) (el total es opcional y cacheado).
+
+    Con `lista` (ListaIds de cache_resultados) la página sale de la lista
+    cacheada con un in_bulk; si el cursor cae fuera de ella o la lista quedó
+    desactualizada, se vuelve a la consulta por clave.
+    """
+
+    def __init__(self, queryset, per_page, lista=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.lista = lista
+
+    @cached_property
+    def count(self):
+        if self.lista is not None and self.lista.completa:
+            return len(self.lista.ids)
+        return conteo_cacheado(self.queryset)
+
+    def _filas_de_lista(self, inicio, fin):
+        ids = self.lista.ids
+        if fin > len(ids) and not self.lista.completa:
+            return None
+        tramo = ids[inicio:fin]
+        por_id = self.queryset.in_bulk(tramo)
+        if len(por_id) != len(tramo):
+            return None  # alguna ya no calza: lista desactualizada
+        return [por_id[pk] for pk in tramo]
+
+    def _pagina_de_lista(self, decodificado):
+        if decodificado is None:
+            filas = self._filas_de_lista(0, self.per_page + 1)
+            if filas is None:
+                return None
+            return PaginaKeyset(filas[: self.per_page], 1, self, len(filas) > self.per_page, False)
+
+        _, _, pk, numero, direccion = decodificado
+        pos = self.lista.posiciones.get(pk)
+        if pos is None:
+            return None
+        if direccion == "ant":
+            inicio = max(0, pos - self.per_page)
+            filas = self._filas_de_lista(inicio, pos)
+            if filas is None:
+                return None
+            return PaginaKeyset(filas, numero, self, True, inicio > 0 and numero > 1)
+
+        filas = self._filas_de_lista(pos + 1, pos + 2 + self.per_page)
+        if filas is None:
+            return None
+        return PaginaKeyset(filas[: self.per_page], numero, self, len(filas) > self.per_page, numero > 1)
+
+    def _tramo(self, destacada, clave, limite, hacia_atras):
+        # destacada__in=[x] y no destacada=x: Django traduce el booleano a
+        # WHERE "destacada" / NOT "destacada" y SQLite no lo usa como igualdad
+        # del índice (terminaría ordenando en un B-tree temporal).
+        qs = self.queryset.filter(destacada__in=[destacada])
+        if clave is not None:
+            creado, pk = clave
+            if hacia_atras:
+                qs = qs.filter(creado__gte=creado).exclude(creado=creado, id__gte=pk)
+            else:
+                qs = qs.filter(creado__lte=creado).exclude(creado=creado, id__lte=pk)
+        orden = ("creado", "-id") if hacia_atras else ("-creado", "id")
+        return list(qs.order_by(*orden)[:limite])
+
+    def _leer(self, destacada, clave, hacia_atras):
+        """Lee per_page + 1 filas desde la clave, cruzando de tramo si hace falta."""
+        limite = self.per_page + 1
+        filas = self._tramo(destacada, clave, limite, hacia_atras)
+        # Orden: destacadas (True) y luego el resto (False). Hacia adelante solo
+        # se cruza de True a False; hacia atrás, de False a True.
+        if len(filas) < limite and destacada != hacia_atras:
+            filas += self._tramo(not destacada, None, limite - len(filas), hacia_atras)
+        return filas
+
+    def pagina(self, token=None):
+        decodificado = _decodificar(token) if token else None
+
+        if self.lista is not None:
+            pagina = self._pagina_de_lista(decodificado)
+            if pagina is not None:
+                return pagina
+
+        if decodificado is None:
+            filas = self._leer(True, None, hacia_atras=False)
+            hay_siguiente = len(filas) > self.per_page
+            return PaginaKeyset(filas[: self.per_page], 1, self, hay_siguiente, False)
+
+        destacada, creado, pk, numero, direccion = decodificado
+        if direccion == "ant":
+            filas = self._leer(destacada, (creado, pk), hacia_atras=True)
+            hay_anterior = len(filas) > self.per_page
+            filas = list(reversed(filas[: self.per_page]))
+            return PaginaKeyset(filas, numero, self, True, hay_anterior and numero > 1)
+
+        filas = self._leer(destacada, (creado, pk), hacia_atras=False)
+        hay_siguiente = len(filas) > self.per_page
+        return PaginaKeyset(filas[: self.per_page], numero, self, hay_siguiente, numero > 1)
@@ -0,0 +1,93 @@
+"""
+Precios efectivos de Propiedad: el precio en UF y en pesos con que se
+muestra y se filtra, aunque la propiedad tenga cargado solo uno de los dos.
+
+  precio_uf_efectivo  = precio_uf,  o precio_clp / UF del día
+  precio_clp_efectivo = precio_clp, o precio_uf × UF del día
+
+Propiedad.save() los calcula para su fila. Cuando cambia la UF,
+`recalcular()` pone al día solo las columnas derivadas con UPDATEs por
+rangos de id (nada se carga en Python). Ambas columnas tienen índice parcial
+junto a tipo_operacion: filtrar por precio en cualquier moneda es un rango
+sobre índice.
+
+actualizar_columnas() recibe el modelo: la migración 0016 la usa con el
+modelo histórico.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Min, Q, Value
+from django.db.models.functions import Round
+
+# Moneda del form (BusquedaPropiedadForm.moneda) -> columna por la que se filtra
+CAMPO_POR_MONEDA = {"UF": "precio_uf_efectivo", "CLP": "precio_clp_efectivo"}
+MONEDA_DEFECTO = "UF"
+
+CENTAVOS = Decimal("0.01")
+
+# Filas cuyo precio efectivo depende de la UF (precio_clp es obligatorio pero 0 = sin dato)
+SOLO_CLP = (Q(precio_uf__isnull=True) | Q(precio_uf=0)) & Q(precio_clp__gt=0)
+SOLO_UF = Q(precio_clp=0) & Q(precio_uf__gt=0)
+
+
+def campo(moneda):
+    return CAMPO_POR_MONEDA.get(moneda or MONEDA_DEFECTO, CAMPO_POR_MONEDA[MONEDA_DEFECTO])
+
+
+def efectivos(precio_uf, precio_clp, uf):
+    """(uf, clp) efectivos de una fila. Sin UF no se convierte: queda None el que falte."""
+    uf_ef = precio_uf or None
+    clp_ef = precio_clp or None
+    if uf:
+        uf = Decimal(uf)
+        if uf_ef is None and clp_ef is not None:
+            uf_ef = (Decimal(clp_ef) / uf).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        elif clp_ef is None and uf_ef is not None:
+            clp_ef = int((Decimal(uf_ef) * uf).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    return uf_ef, clp_ef
+
+
+def actualizar_columnas(modelo, uf, lote=None, copiar=False):
+    """
+    UPDATEs por lotes de ids (una transacción corta por lote, para no tomar
+    el lock de escritura de SQLite por toda la tabla). Con `copiar` también
+    copia los precios propios (backfill). Retorna las filas actualizadas.
+    """
+    lote = lote or getattr(settings, "PRECIOS_EFECTIVOS_LOTE", 5000)
+    rango = modelo.objects.aggregate(desde=Min("id"), hasta=Max("id"))
+    if rango["desde"] is None:
+        return 0
+    uf = Decimal(uf) if uf else None
+    total = 0
+    for inicio in range(rango["desde"], rango["hasta"] + 1, lote):
+        filas = modelo.objects.filter(id__gte=inicio, id__lt=inicio + lote)
+        with transaction.atomic():
+            if copiar:
+                filas.update(precio_uf_efectivo=None, precio_clp_efectivo=None)
+                total += filas.filter(precio_uf__gt=0).update(precio_uf_efectivo=F("precio_uf"))
+                filas.filter(precio_clp__gt=0).update(precio_clp_efectivo=F("precio_clp"))
+            if uf is None:
+                continue
+            total += filas.filter(SOLO_CLP).update(
+                precio_uf_efectivo=Round(
+                    ExpressionWrapper(F("precio_clp") / Value(uf), output_field=DecimalField()), 2
+                )
+            )
+            total += filas.filter(SOLO_UF).update(
+                precio_clp_efectivo=Round(
+                    ExpressionWrapper(F("precio_uf") * Value(uf), output_field=DecimalField())
+                )
+            )
+    return total
+
+
+def recalcular(uf):
+    """Recalcula los precios derivados con la UF `uf` (la llama servicios_uf.actualizar)."""
+    from . import cache_resultados
+    from .models import Propiedad
+
+    total = actualizar_columnas(Propiedad, uf)
+    cache_resultados.invalidar_precios()
+    return total
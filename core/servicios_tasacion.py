@@ -1,8 +1,17 @@
 # core/servicios_tasacion.py
+import csv
+import io
 from datetime import datetime
 from decimal import Decimal
 
-# Valores referenciales estimados (UF por m2 construido) para comunas de la RM
+import numpy as np
+from django.conf import settings
+
+from . import valores_mercado
+from .cache_local import CacheLocal
+
+# Valores referenciales estimados (UF por m2 construido) para comunas de la RM.
+# Se usan cuando la tabla de mercado (core/valores_mercado.py) no tiene muestra suficiente.
 VALORES_COMUNA_UF_M2 = {
     # Sector Oriente
     "Vitacura": 110,
@@ -50,6 +59,33 @@ VALORES_COMUNA_UF_M2 = {
 # Promedio si la comuna no está en la lista principal
 PROMEDIO_DEFAULT = 45
 
+
+def valor_m2(comuna, tipo, mercado=None):
+    """UF/m² base: mercado por comuna y tipo, mercado de la comuna, referencial."""
+    if mercado is None:
+        mercado = valores_mercado.tabla()
+    return (
+        mercado.get((comuna, tipo))
+        or mercado.get((comuna, ''))
+        or VALORES_COMUNA_UF_M2.get(comuna, PROMEDIO_DEFAULT)
+    )
+
+def _leer(datos):
+    """Normaliza un dict de entrada (común a la tasación individual y por lote)."""
+    comuna = datos.get('comuna', '')
+    tipo = datos.get('tipo_propiedad', 'casa').lower()
+    sup_construida = float(datos.get('sup_construida', 0) or 0)
+    sup_terreno = float(datos.get('sup_terreno', 0) or 0)
+    
+    dormitorios = int(datos.get('dormitorios', 0) or 0)
+    banos = int(datos.get('banos', 0) or 0)
+    estacionamientos = int(datos.get('estacionamientos', 0) or 0)
+    bodegas = int(datos.get('bodegas', 0) or 0)
+    ano_construccion = datos.get('ano_construccion')
+    return (comuna, tipo, sup_construida, sup_terreno, dormitorios, banos,
+            estacionamientos, bodegas, ano_construccion)
+
+
 def estimar_precio_propiedad(datos):
     """
     Calcula un rango de precio estimado en UF basado en los datos de la propiedad.
@@ -66,19 +102,11 @@ def estimar_precio_propiedad(datos):
     
     Retorna un tuple: (precio_minimo_uf, precio_maximo_uf)
     """
-    comuna = datos.get('comuna', '')
-    tipo = datos.get('tipo_propiedad', 'casa').lower()
-    sup_construida = float(datos.get('sup_construida', 0) or 0)
-    sup_terreno = float(datos.get('sup_terreno', 0) or 0)
-    
-    dormitorios = int(datos.get('dormitorios', 0) or 0)
-    banos = int(datos.get('banos', 0) or 0)
-    estacionamientos = int(datos.get('estacionamientos', 0) or 0)
-    bodegas = int(datos.get('bodegas', 0) or 0)
-    ano_construccion = datos.get('ano_construccion')
+    (comuna, tipo, sup_construida, sup_terreno, dormitorios, banos,
+     estacionamientos, bodegas, ano_construccion) = _leer(datos)
     
     # Obtener valor base de la comuna
-    valor_base_m2 = VALORES_COMUNA_UF_M2.get(comuna, PROMEDIO_DEFAULT)
+    valor_base_m2 = valor_m2(comuna, tipo)
     
     # Calcular valor base por m2 construido
     precio_estimado = sup_construida * valor_base_m2
@@ -118,3 +146,196 @@ def estimar_precio_propiedad(datos):
     precio_max = round((precio_base * 1.08) / 10) * 10
     
     return int(precio_min), int(precio_max)
+
+
+# ===========================
+# Memo de tasaciones
+# ===========================
+# Entradas normalizadas -> (precio_min, precio_max). Aciertos y fallos se
+# ven en /api/metricas/ ("tasacion").
+memo = CacheLocal(
+    "tasacion",
+    max_entradas=getattr(settings, "TASACION_MEMO_MAX_ENTRADAS", 4096),
+    ttl=getattr(settings, "TASACION_MEMO_TTL", 60 * 60),
+)
+
+
+def clave_tasacion(datos):
+    """
+    Solo lo que mueve el resultado: "70" y 70.0 dan la misma clave, y
+    dormitorios o el terreno de un depto no cuentan. Incluye el UF/m² ya
+    resuelto y el año en curso, así que un cambio en la tabla de mercado
+    (o en el año) lleva a otra clave: nunca se sirve una tasación vieja.
+    """
+    (comuna, tipo, sup_construida, sup_terreno, _, banos,
+     estacionamientos, bodegas, ano_construccion) = _leer(datos)
+    return (
+        valor_m2(comuna, tipo),
+        tipo if tipo in ('casa', 'departamento') else '',
+        sup_construida,
+        sup_terreno if tipo == 'casa' and sup_terreno > sup_construida else 0.0,
+        banos,
+        estacionamientos,
+        bodegas,
+        int(ano_construccion) if ano_construccion else None,
+        datetime.now().year,
+    )
+
+
+def estimar_precio_memo(datos):
+    """estimar_precio_propiedad() con memo LRU acotado."""
+    clave = clave_tasacion(datos)
+    resultado = memo.obtener(clave)
+    if resultado is None:
+        resultado = memo.guardar(clave, estimar_precio_propiedad(datos))
+    return resultado
+
+# ===========================
+# Tasación por lote
+# ===========================
+# Columnas de entrada reconocidas (mismas claves que estimar_precio_propiedad)
+COLUMNAS_TASACION = (
+    "comuna", "tipo_propiedad", "sup_construida", "sup_terreno", "dormitorios",
+    "banos", "estacionamientos", "bodegas", "ano_construccion",
+)
+
+
+_FILA_VACIA = (0, 0, 0, 0, 0, 0, False, False, -1)
+# dtype de cada columna de _columnas()
+_TIPOS = (np.float64,) * 3 + (np.int64,) * 3 + (bool,) * 2 + (np.int64,)
+# Mayor precio representable en los arreglos int64 de salida
+_PRECIO_MAX = float(np.iinfo(np.int64).max)
+FUERA_DE_RANGO = "Valores fuera de rango"
+
+
+def _columnas(filas, ano_actual, mercado):
+    """
+    Columnas de entrada, convertidas de a una columna entera. NumPy convierte
+    cada celda con las mismas reglas que float()/int() en _leer(); ante
+    cualquier fila rara (o sin comuna) se rinde y decide _columnas_por_fila().
+    """
+    comunas = [d.get('comuna', '') for d in filas]
+    if not all(comunas):
+        raise ValueError("Faltan datos de la comuna")
+    tipos = [d.get('tipo_propiedad', 'casa').lower() for d in filas]
+    anos = [d.get('ano_construccion') for d in filas]
+    con_ano = np.array([bool(a) for a in anos], dtype=bool)
+    ano = np.array([a if a else 0 for a in anos], dtype=np.int64)
+    return (
+        np.array([valor_m2(c, t, mercado) for c, t in zip(comunas, tipos)], dtype=np.float64),
+        *(np.array([d.get(k, 0) or 0 for d in filas], dtype=np.float64) for k in ('sup_construida', 'sup_terreno')),
+        *(np.array([d.get(k, 0) or 0 for d in filas], dtype=np.int64) for k in ('banos', 'estacionamientos', 'bodegas')),
+        np.array([t == 'casa' for t in tipos], dtype=bool),
+        np.array([t == 'departamento' for t in tipos], dtype=bool),
+        np.where(con_ano, np.maximum(0, ano_actual - ano), -1),  # -1: sin año
+    ), {}
+
+
+def _columnas_por_fila(filas, ano_actual, mercado):
+    """Igual que _columnas(), pero fila a fila para aislar las que fallan."""
+    leidas = []
+    errores = {}
+    for i, datos in enumerate(filas):
+        try:
+            comuna, tipo, sc, st, _, b, e, bo, ano = _leer(datos)
+            if not comuna:
+                raise ValueError("Faltan datos de la comuna")
+            antig = max(0, ano_actual - int(ano)) if ano else -1
+            fila = (
+                valor_m2(comuna, tipo, mercado), sc, st, b, e, bo,
+                tipo == 'casa', tipo == 'departamento', antig,
+            )
+            # Un entero que no cabe en int64 (p.ej. 2**70 baños) haría fallar todo el lote
+            for valor, tipo_columna in zip(fila, _TIPOS):
+                np.array(valor, dtype=tipo_columna)
+        except OverflowError:
+            errores[i] = FUERA_DE_RANGO
+            leidas.append(_FILA_VACIA)
+            continue
+        except (AttributeError, TypeError, ValueError) as exc:
+            errores[i] = str(exc)
+            leidas.append(_FILA_VACIA)
+            continue
+        leidas.append(fila)
+    columnas = list(zip(*leidas)) or [()] * len(_FILA_VACIA)
+    return tuple(np.array(c, dtype=t) for c, t in zip(columnas, _TIPOS)), errores
+
+
+def estimar_precios_lote(filas, ano_actual=None):
+    """
+    Tasación de muchas propiedades de una vez, con aritmética de arreglos
+    NumPy. Da exactamente lo mismo que llamar estimar_precio_propiedad()
+    fila por fila: mismas operaciones en el mismo orden sobre float64, y
+    np.round redondea al par igual que round().
+
+    Retorna (precios_min, precios_max, errores): dos arreglos int64
+    alineados con `filas` y un dict {índice: mensaje} con las filas que no
+    se pudieron leer, no traen comuna o traen valores fuera de rango (en
+    esas el rango queda en 0).
+    """
+    ano_actual = ano_actual or datetime.now().year
+    filas = list(filas)
+    mercado = valores_mercado.tabla()
+    try:
+        columnas, errores = _columnas(filas, ano_actual, mercado)
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        columnas, errores = _columnas_por_fila(filas, ano_actual, mercado)
+    (valor_m2, sup_construida, sup_terreno, banos, estacionamientos, bodegas,
+     es_casa, es_depto, antiguedad) = columnas
+
+    precio = sup_construida * valor_m2
+    terreno_libre = sup_terreno - sup_construida
+    con_terreno = es_casa & (sup_terreno > sup_construida)
+    precio = np.where(con_terreno, precio + (terreno_libre * valor_m2 * 0.35), precio)
+
+    precio = precio + (banos * 150)
+    precio = precio + (bodegas * 100)
+    precio = precio + np.where(es_depto, estacionamientos * 350, estacionamientos * 200)
+
+    nueva = (antiguedad >= 0) & (antiguedad <= 2)
+    depreciacion = np.minimum(0.35, antiguedad * 0.008)
+    precio = np.where(nueva, precio * 1.05, precio)
+    precio = np.where(antiguedad > 2, precio * (1 - depreciacion), precio)
+
+    precio_base = np.round(precio / 10) * 10
+    # Superficies enormes dan precios que no caben en int64: esas filas van como error
+    cabe = np.abs(precio_base * 1.08) < _PRECIO_MAX
+    for i in np.flatnonzero(~cabe).tolist():
+        errores.setdefault(i, FUERA_DE_RANGO)
+    precio_base = np.where(cabe, precio_base, 0)
+    precios_min = (np.round((precio_base * 0.92) / 10) * 10).astype(np.int64)
+    precios_max = (np.round((precio_base * 1.08) / 10) * 10).astype(np.int64)
+    if errores:
+        malas = list(errores)
+        precios_min[malas] = 0
+        precios_max[malas] = 0
+    return precios_min, precios_max, errores
+
+
+def leer_csv(texto):
+    """
+    Filas (dicts) de un CSV con encabezado. Acepta `,`, `;` o tabulador
+    como separador (Excel en español exporta con `;`).
+    """
+    muestra = texto[:4096]
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+    return [{(k or "").strip(): (v or "").strip() for k, v in fila.items()} for fila in lector]
+
+
+def escribir_csv(salida, filas, precios_min, precios_max, errores):
+    """Escribe las filas de entrada más precio_min_uf, precio_max_uf y error."""
+    columnas = list(COLUMNAS_TASACION)
+    for fila in filas:
+        columnas += [c for c in fila if c and c not in columnas]
+    escritor = csv.writer(salida)
+    escritor.writerow(columnas + ["precio_min_uf", "precio_max_uf", "error"])
+    for i, fila in enumerate(filas):
+        error = errores.get(i)
+        escritor.writerow(
+            [fila.get(c, "") for c in columnas]
+            + (["", "", error] if error else [int(precios_min[i]), int(precios_max[i]), ""])
+        )
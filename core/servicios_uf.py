@@ -0,0 +1,260 @@
+"""
+Valor de la UF del día, resuelto en el servidor.
+
+Una vez al día `python manage.py actualizar_uf` consulta la fuente
+configurada (UF_FUENTE) y guarda los valores en ValorUF. Las páginas leen
+uf_hoy() (CacheLocal; una consulta por worker y TTL) a través del context
+processor `core.context_processors.uf`: los precios salen ya en pesos y UF
+en el HTML, sin llamadas del navegador a APIs externas. Cada actualización
+recalcula también los precios efectivos (core/precios.py).
+
+Fuentes: cualquier callable que retorne [(fecha, valor)] sirve. Vienen
+FuenteMindicador (API pública de mindicador.cl) y FuenteArchivo (el JSON de
+mindicador o un CSV fecha,valor desde un archivo local: carga de la serie
+histórica, tests y ambientes sin salida a internet).
+
+Historia: SerieUF tiene todos los valores en memoria (arreglos ordenados por
+fecha) para convertir CLP<->UF a la UF de cualquier día: bisect para una
+fecha suelta, np.interp para columnas enteras (reportes). Los días sin
+valor se interpolan entre los vecinos.
+"""
+import csv
+import json
+import logging
+import urllib.request
+from bisect import bisect_left
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import precios
+from .cache_local import CacheLocal
+from .models import ValorUF
+
+logger = logging.getLogger(__name__)
+
+cache = CacheLocal(
+    "uf",
+    max_entradas=1,
+    ttl=getattr(settings, "UF_CACHE_TTL", 60 * 60),
+)
+cache_serie = CacheLocal(
+    "serie_uf",
+    max_entradas=1,
+    ttl=getattr(settings, "UF_CACHE_TTL", 60 * 60),
+)
+
+
+def _serie(data):
+    """[(fecha, valor)] desde el JSON de mindicador ({"serie": [{"fecha", "valor"}]})."""
+    valores = []
+    for punto in data.get("serie", []):
+        fecha = datetime.fromisoformat(punto["fecha"].replace("Z", "+00:00"))
+        # mindicador publica medianoche de Chile expresada en UTC
+        if fecha.tzinfo is not None:
+            fecha = timezone.localtime(fecha)
+        valores.append((fecha.date(), Decimal(str(punto["valor"])).quantize(Decimal("0.01"))))
+    return valores
+
+
+class FuenteMindicador:
+    nombre = "mindicador"
+    URL = "https://mindicador.cl/api/uf"
+
+    def __init__(self, url=None, timeout=10):
+        self.url = url or self.URL
+        self.timeout = timeout
+
+    def __call__(self):
+        req = urllib.request.Request(self.url, headers={"User-Agent": "kcm-corredora"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return _serie(json.load(resp))
+
+
+def _fecha_csv(texto):
+    texto = texto.strip()
+    if "-" in texto[:4] or "/" in texto:
+        # 31-12-2024 o 31/12/2024 (formato de las planillas del Banco Central)
+        return datetime.strptime(texto.replace("/", "-"), "%d-%m-%Y").date()
+    return date.fromisoformat(texto)
+
+
+def _valor_csv(texto):
+    texto = texto.strip().replace("$", "").replace(" ", "")
+    if "," in texto:
+        # 37.891,23 -> 37891.23
+        texto = texto.replace(".", "").replace(",", ".")
+    return Decimal(texto).quantize(Decimal("0.01"))
+
+
+def _serie_csv(f):
+    """[(fecha, valor)] desde un CSV con columnas fecha y valor (con o sin encabezado; , o ;)."""
+    muestra = f.read(4096)
+    f.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    valores = []
+    for fila in csv.reader(f, dialecto):
+        if len(fila) < 2 or not fila[0].strip():
+            continue
+        try:
+            valores.append((_fecha_csv(fila[0]), _valor_csv(fila[1])))
+        except (ValueError, ArithmeticError):
+            if valores:
+                raise ValueError(f"Fila inválida en el CSV de UF: {fila}")
+            # Encabezado
+    return valores
+
+
+class FuenteArchivo:
+    nombre = "archivo"
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or getattr(settings, "UF_FUENTE_ARCHIVO", "")
+
+    def __call__(self):
+        with open(self.ruta, encoding="utf-8-sig", newline="") as f:
+            if self.ruta.lower().endswith(".csv"):
+                return _serie_csv(f)
+            return _serie(json.load(f))
+
+
+def fuente_configurada():
+    return import_string(getattr(settings, "UF_FUENTE", "core.servicios_uf.FuenteMindicador"))()
+
+
+def actualizar(fuente=None):
+    """
+    Trae los valores de la fuente y los guarda (upsert por fecha). Después
+    recalcula los precios efectivos con la UF vigente: siempre, porque la UF
+    del día pudo cambiar solo por el paso de la fecha. Retorna cuántos valores.
+    """
+    fuente = fuente or fuente_configurada()
+    serie = fuente()
+    guardar(serie, getattr(fuente, "nombre", ""))
+    precios.recalcular(uf_hoy()[0])
+    return len(serie)
+
+
+def guardar(serie, fuente="", lote=1000):
+    """
+    Upsert por fecha en lotes (INSERT ... ON CONFLICT DO UPDATE): cargar
+    décadas de historia son unas pocas sentencias, no una por día.
+    MySQL (ON DUPLICATE KEY UPDATE) no acepta indicar la columna única:
+    actúa sobre cualquier clave única, y en ValorUF la única es fecha.
+    """
+    filas = [ValorUF(fecha=fecha, valor=valor, fuente=fuente) for fecha, valor in serie]
+    conflicto = {"update_conflicts": True, "update_fields": ["valor", "fuente"]}
+    if connection.features.supports_update_conflicts_with_target:
+        conflicto["unique_fields"] = ["fecha"]
+    with transaction.atomic():
+        ValorUF.objects.bulk_create(filas, batch_size=lote, **conflicto)
+    invalidar()
+
+
+def _leer(hoy):
+    fila = ValorUF.objects.filter(fecha__lte=hoy).values_list("valor", "fecha").first()
+    if fila is None:
+        respaldo = getattr(settings, "UF_RESPALDO", None)
+        return (Decimal(str(respaldo)), None) if respaldo else (None, None)
+    return fila
+
+
+def uf_hoy():
+    """
+    (valor, fecha) de la UF vigente: el último valor publicado hasta hoy.
+    Sin datos cargados, (UF_RESPALDO, None).
+    """
+    hoy = timezone.localdate()
+    actual = cache.obtener(hoy)
+    if actual is None:
+        actual = cache.guardar(hoy, _leer(hoy))
+    return actual
+
+
+def invalidar():
+    for c in (cache, cache_serie):
+        c.limpiar()
+        transaction.on_commit(c.limpiar)
+
+
+# ===========================
+# Serie histórica
+# ===========================
+def _ordinal(fecha):
+    if isinstance(fecha, datetime):
+        fecha = timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date()
+    return fecha.toordinal()
+
+
+class SerieUF:
+    """
+    Valores de la UF ordenados por fecha. Antes del primer día no hay valor
+    (None / NaN); después del último se mantiene el último publicado.
+    """
+
+    def __init__(self, serie):
+        serie = sorted(serie)
+        self.dias = [fecha.toordinal() for fecha, _ in serie]
+        self.valores = [Decimal(valor) for _, valor in serie]
+        self._dias = np.array(self.dias, dtype=np.float64)
+        self._valores = np.array(self.valores, dtype=np.float64)
+
+    @classmethod
+    def desde_bd(cls):
+        return cls(ValorUF.objects.order_by("fecha").values_list("fecha", "valor"))
+
+    def __len__(self):
+        return len(self.dias)
+
+    def valor(self, fecha):
+        """UF de `fecha` (date o datetime) como Decimal, interpolada si ese día falta."""
+        if not self.dias:
+            return None
+        dia = _ordinal(fecha)
+        i = bisect_left(self.dias, dia)
+        if i < len(self.dias) and self.dias[i] == dia:
+            return self.valores[i]
+        if i == 0:
+            return None
+        if i == len(self.dias):
+            return self.valores[-1]
+        d0, d1 = self.dias[i - 1], self.dias[i]
+        v0, v1 = self.valores[i - 1], self.valores[i]
+        return (v0 + (v1 - v0) * (dia - d0) / (d1 - d0)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    def valores_en(self, fechas):
+        """Arreglo float64 con la UF de cada fecha (NaN antes del inicio de la serie)."""
+        x = np.fromiter((_ordinal(f) for f in fechas), dtype=np.float64)
+        if not self.dias:
+            return np.full(len(x), np.nan)
+        return np.interp(x, self._dias, self._valores, left=np.nan, right=self._valores[-1])
+
+    def convertir(self, fechas, precios_uf, precios_clp):
+        """
+        Completa precios en ambas monedas a la UF de su fecha, en bloque.
+        `precios_*` son secuencias con None/0 donde falta el dato; retorna
+        arreglos (uf_del_dia, uf, clp) con NaN donde no se pudo calcular.
+        """
+        uf_dia = self.valores_en(fechas)
+        uf = np.array([float(p) if p else np.nan for p in precios_uf], dtype=np.float64)
+        clp = np.array([float(p) if p else np.nan for p in precios_clp], dtype=np.float64)
+        uf = np.where(np.isnan(uf), np.round(clp / uf_dia, 2), uf)
+        clp = np.where(np.isnan(clp), np.rint(uf * uf_dia), clp)
+        return uf_dia, uf, clp
+
+
+def serie():
+    """SerieUF completa, cacheada por worker (se recarga tras cada actualización)."""
+    actual = cache_serie.obtener("serie")
+    if actual is None:
+        actual = cache_serie.guardar("serie", SerieUF.desde_bd())
+    return actual
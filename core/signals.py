@@ -0,0 +1,190 @@
+"""
+Receptores de señales de core. Se conectan en CoreConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    alertas, autocompletar, busqueda, cache_resultados, comparables, facetas, imagenes, similares, tarjetas,
+    valores_mercado,
+)
+from .models import CarouselSlide, ImagenPropiedad, Propiedad
+
+# Campos de la fila en BD que se guardan antes de cada save para calcular
+# qué cambió (conteos de facetas, invalidaciones).
+CAMPOS_ESTADO_PREVIO = tuple(dict.fromkeys(
+    ("publicada",) + facetas.FACETAS + cache_resultados.CAMPOS_ESTADO + autocompletar.CAMPOS_ESTADO
+    + similares.CAMPOS_ESTADO + valores_mercado.CAMPOS_ESTADO + comparables.CAMPOS_ESTADO
+    + imagenes.CAMPOS_ESTADO
+))
+
+
+@receiver(pre_save, sender=Propiedad, dispatch_uid="core_propiedad_estado_previo")
+def propiedad_estado_previo(sender, instance, raw=False, **kwargs):
+    instance._estado_previo = None
+    if raw or instance.pk is None:
+        return
+    instance._estado_previo = (
+        Propiedad.objects.filter(pk=instance.pk).values(*CAMPOS_ESTADO_PREVIO).first()
+    )
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_indexar_texto")
+def propiedad_indexar_texto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    busqueda.indexar(instance)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_desindexar_texto")
+def propiedad_desindexar_texto(sender, instance, **kwargs):
+    busqueda.desindexar(instance.pk)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_facetas")
+def propiedad_facetas_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anteriores = facetas.valores(getattr(instance, "_estado_previo", None) or {})
+    facetas.aplicar_cambio(anteriores, facetas.valores(instance))
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_facetas_borrada")
+def propiedad_facetas_borrada(sender, instance, **kwargs):
+    facetas.aplicar_cambio(facetas.valores(instance), {})
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_cache_resultados")
+def propiedad_cache_resultados_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache_resultados.invalidar_por_cambio(
+        getattr(instance, "_estado_previo", None), cache_resultados.estado(instance)
+    )
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_cache_resultados_borrada")
+def propiedad_cache_resultados_borrada(sender, instance, **kwargs):
+    cache_resultados.invalidar_por_cambio(cache_resultados.estado(instance), None)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_tarjeta")
+def propiedad_tarjeta_guardada(sender, instance, **kwargs):
+    tarjetas.invalidar(instance.pk)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_tarjeta_borrada")
+def propiedad_tarjeta_borrada(sender, instance, **kwargs):
+    tarjetas.invalidar(instance.pk)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_autocompletar")
+def propiedad_autocompletar_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nuevo = {c: getattr(instance, c) for c in autocompletar.CAMPOS_ESTADO}
+    autocompletar.invalidar_por_cambio(getattr(instance, "_estado_previo", None), nuevo)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_autocompletar_borrada")
+def propiedad_autocompletar_borrada(sender, instance, **kwargs):
+    autocompletar.invalidar_por_cambio({"publicada": instance.publicada}, None)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_similares")
+def propiedad_similares_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_estado_previo", None)
+    if anterior is not None and all(anterior.get(c) == getattr(instance, c) for c in similares.CAMPOS_ESTADO):
+        return
+    similares.aplicar_cambio(instance, instance.publicada)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_similares_borrada")
+def propiedad_similares_borrada(sender, instance, **kwargs):
+    similares.aplicar_cambio(instance, False)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_avisos_busquedas")
+def propiedad_avisos_busquedas(sender, instance, raw=False, **kwargs):
+    if raw or not instance.publicada:
+        return
+    anterior = getattr(instance, "_estado_previo", None)
+    if anterior is None or not anterior.get("publicada"):
+        alertas.marcar_publicada(instance)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_valores_mercado")
+def propiedad_valores_mercado_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nuevo = {c: getattr(instance, c) for c in valores_mercado.CAMPOS_ESTADO}
+    comunas = valores_mercado.comunas_afectadas(getattr(instance, "_estado_previo", None), nuevo)
+    if comunas:
+        valores_mercado.recalcular_comunas(comunas)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_valores_mercado_borrada")
+def propiedad_valores_mercado_borrada(sender, instance, **kwargs):
+    anterior = {c: getattr(instance, c) for c in valores_mercado.CAMPOS_ESTADO}
+    comunas = valores_mercado.comunas_afectadas(anterior, None)
+    if comunas:
+        valores_mercado.recalcular_comunas(comunas)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_comparables")
+def propiedad_comparables_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nuevo = {c: getattr(instance, c) for c in comparables.CAMPOS_ESTADO}
+    comparables.invalidar_por_cambio(getattr(instance, "_estado_previo", None), nuevo)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_comparables_borrada")
+def propiedad_comparables_borrada(sender, instance, **kwargs):
+    anterior = {c: getattr(instance, c) for c in comparables.CAMPOS_ESTADO}
+    comparables.invalidar_por_cambio(anterior, None)
+
+
+@receiver(post_save, sender=Propiedad, dispatch_uid="core_propiedad_derivadas")
+def propiedad_derivadas_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = (getattr(instance, "_estado_previo", None) or {}).get("portada") or ""
+    if anterior == instance.portada.name:
+        return
+    imagenes.borrar_al_confirmar(anterior)
+    imagenes.encolar(instance.portada.name)
+
+
+@receiver(post_delete, sender=Propiedad, dispatch_uid="core_propiedad_derivadas_borrada")
+def propiedad_derivadas_borrada(sender, instance, **kwargs):
+    imagenes.borrar_al_confirmar(instance.portada.name)
+
+
+@receiver(pre_save, sender=ImagenPropiedad, dispatch_uid="core_imagen_propiedad_imagen_previa")
+@receiver(pre_save, sender=CarouselSlide, dispatch_uid="core_carousel_slide_imagen_previa")
+def imagen_previa(sender, instance, raw=False, **kwargs):
+    instance._imagen_previa = None
+    if raw or instance.pk is None:
+        return
+    instance._imagen_previa = sender.objects.filter(pk=instance.pk).values_list("imagen", flat=True).first()
+
+
+@receiver(post_save, sender=ImagenPropiedad, dispatch_uid="core_imagen_propiedad_derivadas")
+@receiver(post_save, sender=CarouselSlide, dispatch_uid="core_carousel_slide_derivadas")
+def imagen_derivadas_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_imagen_previa", None) or ""
+    if anterior == instance.imagen.name:
+        return
+    imagenes.borrar_al_confirmar(anterior)
+    imagenes.encolar(instance.imagen.name)
+
+
+@receiver(post_delete, sender=ImagenPropiedad, dispatch_uid="core_imagen_propiedad_derivadas_borrada")
+@receiver(post_delete, sender=CarouselSlide, dispatch_uid="core_carousel_slide_derivadas_borrada")
+def imagen_derivadas_borrada(sender, instance, **kwargs):
+    imagenes.borrar_al_confirmar(instance.imagen.name)
@@ -0,0 +1,226 @@
+"""
+"Propiedades similares" para la ficha: k vecinos más cercanos sobre una
+matriz NumPy de características de las propiedades publicadas.
+
+Características (estandarizadas con la media/desviación de la última
+construcción completa):
+  log(precio_uf_efectivo), log(m² construidos), dormitorios, baños y la
+  ubicación del centroide de la comuna (km), de modo que comunas vecinas se
+  parecen. El precio efectivo cubre las publicadas solo en CLP.
+Solo se comparan propiedades de la misma operación (venta/arriendo tienen
+escalas de precio distintas) y un tipo distinto suma una penalización fija.
+
+La matriz vive en una CacheLocal de una entrada: en el worker que escribe,
+las señales de Propiedad actualizan su fila en el lugar (sin reconstruir);
+en los demás se reconstruye al vencer el TTL. Está acotada a
+SIMILARES_MAX_FILAS filas: si se llena, sale la publicación más antigua.
+El resultado por propiedad (lista de ids) se cachea aparte.
+"""
+import math
+import threading
+import warnings
+
+import numpy as np
+from django.conf import settings
+
+from . import geo
+from .cache_local import CacheLocal
+from .models import Propiedad, TIPO_OPERACION, TIPO_PROPIEDAD
+
+CAMPOS = (
+    "id", "tipo_operacion", "tipo_propiedad", "comuna", "precio_uf_efectivo",
+    "sup_construida_m2", "dormitorios", "banos", "creado",
+)
+# Campos de Propiedad que mueven una fila de la matriz
+CAMPOS_ESTADO = ("publicada",) + CAMPOS[1:]
+
+# Peso de cada columna en la distancia: precio, m², dormitorios, baños, lat, lng
+PESOS = np.array([3.0, 2.0, 1.0, 0.7, 1.2, 1.2], dtype=np.float32)
+# Distancia extra (al cuadrado) si el tipo de propiedad no coincide
+PENALIZACION_TIPO = 25.0
+KM_POR_GRADO_LAT = 111.32
+
+_OPERACIONES = {op: i for i, (op, _) in enumerate(TIPO_OPERACION)}
+_TIPOS = {t: i for i, (t, _) in enumerate(TIPO_PROPIEDAD)}
+
+cache_matriz = CacheLocal(
+    "similares_matriz",
+    max_entradas=1,
+    ttl=getattr(settings, "SIMILARES_MATRIZ_TTL", 10 * 60),
+)
+cache = CacheLocal(
+    "similares",
+    max_entradas=getattr(settings, "SIMILARES_CACHE_MAX_ENTRADAS", 2048),
+    ttl=getattr(settings, "SIMILARES_CACHE_TTL", 10 * 60),
+)
+_lock_construccion = threading.Lock()
+
+
+def _crudo(fila):
+    """Vector sin escalar (NaN donde falta el dato) de un dict de CAMPOS."""
+    precio = fila["precio_uf_efectivo"]
+    sup = fila["sup_construida_m2"]
+    centroide = geo.CENTROIDES_COMUNAS.get(fila["comuna"])
+    if centroide:
+        lat, lng = centroide
+        y, x = lat * KM_POR_GRADO_LAT, lng * KM_POR_GRADO_LAT * math.cos(math.radians(lat))
+    else:
+        y = x = math.nan
+    return (
+        math.log1p(float(precio)) if precio else math.nan,
+        math.log1p(float(sup)) if sup else math.nan,
+        float(fila["dormitorios"] or 0),
+        float(fila["banos"] or 0),
+        y,
+        x,
+    )
+
+
+class MatrizSimilares:
+    def __init__(self, filas, max_filas):
+        filas = list(filas)[:max_filas]
+        self.max_filas = max_filas
+        self._lock = threading.Lock()
+
+        crudo = np.array([_crudo(f) for f in filas], dtype=np.float64).reshape(len(filas), len(PESOS))
+        # Estadísticas de escala fijas hasta la próxima construcción completa
+        with warnings.catch_warnings():
+            # Columnas sin ningún dato (p.ej. nadie cargó m²): media/desv. NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            self.media = np.nan_to_num(np.nanmean(crudo, axis=0)) if len(filas) else np.zeros(len(PESOS))
+            desv = np.nanstd(crudo, axis=0) if len(filas) else np.ones(len(PESOS))
+        self.escala = np.where(np.nan_to_num(desv) > 1e-6, np.nan_to_num(desv), 1.0)
+
+        capacidad = max(16, len(filas))
+        self.n = len(filas)
+        self.X = np.zeros((capacidad, len(PESOS)), dtype=np.float32)
+        self.ids = np.zeros(capacidad, dtype=np.int64)
+        self.operacion = np.zeros(capacidad, dtype=np.int8)
+        self.tipo = np.zeros(capacidad, dtype=np.int8)
+        self.creado = np.zeros(capacidad, dtype=np.float64)
+        if self.n:
+            self.X[: self.n] = self._escalar(crudo)
+            self.ids[: self.n] = [f["id"] for f in filas]
+            self.operacion[: self.n] = [_OPERACIONES.get(f["tipo_operacion"], -1) for f in filas]
+            self.tipo[: self.n] = [_TIPOS.get(f["tipo_propiedad"], -1) for f in filas]
+            self.creado[: self.n] = [f["creado"].timestamp() for f in filas]
+        self.posiciones = {int(pk): i for i, pk in enumerate(self.ids[: self.n])}
+
+    def _escalar(self, crudo):
+        # Faltantes -> media de la columna (0 una vez estandarizado)
+        crudo = np.where(np.isnan(crudo), self.media, crudo)
+        return ((crudo - self.media) / self.escala).astype(np.float32)
+
+    def vector(self, fila):
+        return self._escalar(np.array([_crudo(fila)], dtype=np.float64))[0]
+
+    # ----- cambios incrementales -----
+    def _crecer(self):
+        capacidad = min(self.max_filas, len(self.ids) * 2)
+        for nombre in ("X", "ids", "operacion", "tipo", "creado"):
+            actual = getattr(self, nombre)
+            nuevo = np.zeros((capacidad,) + actual.shape[1:], dtype=actual.dtype)
+            nuevo[: self.n] = actual[: self.n]
+            setattr(self, nombre, nuevo)
+
+    def _quitar_posicion(self, i):
+        ultimo = self.n - 1
+        pk = int(self.ids[i])
+        if i != ultimo:
+            for arr in (self.X, self.ids, self.operacion, self.tipo, self.creado):
+                arr[i] = arr[ultimo]
+            self.posiciones[int(self.ids[i])] = i
+        del self.posiciones[pk]
+        self.n -= 1
+
+    def quitar(self, pk):
+        with self._lock:
+            i = self.posiciones.get(pk)
+            if i is not None:
+                self._quitar_posicion(i)
+
+    def actualizar(self, fila):
+        """Inserta o reemplaza la fila de una propiedad publicada (dict de CAMPOS)."""
+        with self._lock:
+            i = self.posiciones.get(fila["id"])
+            if i is None:
+                if self.n >= self.max_filas:
+                    self._quitar_posicion(int(np.argmin(self.creado[: self.n])))
+                if self.n >= len(self.ids):
+                    self._crecer()
+                i = self.n
+                self.n += 1
+                self.posiciones[fila["id"]] = i
+            self.X[i] = self.vector(fila)
+            self.ids[i] = fila["id"]
+            self.operacion[i] = _OPERACIONES.get(fila["tipo_operacion"], -1)
+            self.tipo[i] = _TIPOS.get(fila["tipo_propiedad"], -1)
+            self.creado[i] = fila["creado"].timestamp()
+
+    # ----- consulta -----
+    def vecinos(self, fila, k):
+        """Ids de las k filas más cercanas a `fila` (misma operación, sin ella misma)."""
+        q = self.vector(fila)
+        operacion = _OPERACIONES.get(fila["tipo_operacion"], -1)
+        tipo = _TIPOS.get(fila["tipo_propiedad"], -1)
+        with self._lock:
+            n = self.n
+            X = self.X[:n]
+            d = ((X - q) ** 2) @ PESOS
+            d += (self.tipo[:n] != tipo) * np.float32(PENALIZACION_TIPO)
+            d[(self.operacion[:n] != operacion) | (self.ids[:n] == fila["id"])] = np.inf
+            ids = self.ids[:n].copy()
+        validos = int(np.isfinite(d).sum())
+        k = min(k, validos)
+        if k <= 0:
+            return []
+        cerca = np.argpartition(d, k - 1)[:k]
+        cerca = cerca[np.lexsort((ids[cerca], d[cerca]))]
+        return [int(pk) for pk in ids[cerca]]
+
+
+def _filas_publicadas(limite):
+    return (
+        Propiedad.objects.filter(publicada=True)
+        .order_by("-creado")
+        .values(*CAMPOS)[:limite]
+    )
+
+
+def matriz():
+    m = cache_matriz.obtener("matriz")
+    if m is None:
+        with _lock_construccion:
+            m = cache_matriz.obtener("matriz")
+            if m is None:
+                max_filas = getattr(settings, "SIMILARES_MAX_FILAS", 50000)
+                m = cache_matriz.guardar("matriz", MatrizSimilares(_filas_publicadas(max_filas), max_filas))
+    return m
+
+
+def fila(prop):
+    return {campo: getattr(prop, campo) for campo in CAMPOS}
+
+
+def para(prop, k=4):
+    """Ids de las k propiedades publicadas más parecidas a `prop` (cacheado)."""
+    clave = (prop.pk, k)
+    ids = cache.obtener(clave)
+    if ids is None:
+        ids = cache.guardar(clave, matriz().vecinos(fila(prop), k))
+    return ids
+
+
+def aplicar_cambio(prop, publicada):
+    """
+    Refleja en la matriz (si está cargada en este worker) el guardado o
+    borrado de `prop` y descarta los resultados cacheados: cualquiera
+    puede haber ganado o perdido un vecino.
+    """
+    m = cache_matriz.obtener("matriz")
+    if m is not None:
+        if publicada:
+            m.actualizar(fila(prop))
+        else:
+            m.quitar(prop.pk)
+    cache.descartar_si(lambda clave, valor: True)
@@ -0,0 +1,68 @@
+"""
+Caché de fragmentos para `_card_propiedad.html`.
+
+Cada tarjeta renderizada se guarda en la caché de Django bajo
+"tarjeta:<id>" junto con la versión con que se generó (`actualizado` y la
+UF del día, que convierte los precios en UF a pesos); una
+página completa de tarjetas se trae con un solo get_many y solo se
+renderizan las que faltan o quedaron viejas. Las señales de Propiedad
+borran la entrada al guardar o eliminar, y el worker cuando terminan de
+generarse las derivadas de la portada (core/imagenes.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import imagenes, servicios_uf
+
+PLANTILLA = "core/_card_propiedad.html"
+
+
+def _clave(pk):
+    return f"tarjeta:{pk}"
+
+
+def _version(prop, uf):
+    return f"{prop.actualizado.isoformat() if prop.actualizado else ''}|{uf or ''}"
+
+
+def renderizar(*listas):
+    """
+    {id: html} de las tarjetas de todas las `listas` (se deduplican, p.ej.
+    destacadas y recientes del home). Un get_many + un set_many como máximo.
+    """
+    props = {}
+    for lista in listas:
+        for p in lista:
+            props.setdefault(p.pk, p)
+    if not props:
+        return {}
+
+    uf, _ = servicios_uf.uf_hoy()
+    claves = {_clave(pk): pk for pk in props}
+    en_cache = cache.get_many(list(claves))
+
+    html = {}
+    nuevas = {}
+    for clave, pk in claves.items():
+        prop = props[pk]
+        version = _version(prop, uf)
+        item = en_cache.get(clave)
+        if item and item.get("v") == version:
+            html[pk] = item["html"]
+        else:
+            nuevas[clave] = {"v": version}
+
+    # Derivadas de las portadas por renderizar, en una consulta
+    imagenes.precargar([props[claves[c]].portada.name for c in nuevas if props[claves[c]].portada])
+    for clave, item in nuevas.items():
+        pk = claves[clave]
+        html[pk] = item["html"] = render_to_string(PLANTILLA, {"p": props[pk], "uf_hoy": uf})
+
+    if nuevas:
+        cache.set_many(nuevas, getattr(settings, "TARJETAS_CACHE_TTL", 24 * 60 * 60))
+    return html
+
+
+def invalidar(pk):
+    cache.delete(_clave(pk))
@@ -0,0 +1,61 @@
+from decimal import Decimal, InvalidOperation
+
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from core import imagenes, tarjetas
+
+register = template.Library()
+
+
+@register.simple_tag
+def tarjetas_html(*listas):
+    """
+    Uso: {% tarjetas_html destacadas recientes as tarjetas %}
+    Trae de caché (o renderiza) las tarjetas de todas las listas de una vez.
+    """
+    return tarjetas.renderizar(*listas)
+
+
+@register.filter
+def tarjeta(tarjetas_por_id, prop):
+    """Uso: {{ tarjetas|tarjeta:p }}"""
+    return mark_safe(tarjetas_por_id.get(prop.pk, ""))
+
+
+@register.filter
+def clp_desde_uf(valor_uf, uf):
+    """Uso: {{ p.precio_uf|clp_desde_uf:uf_hoy|intcomma }} (pesos enteros; "" sin UF)."""
+    try:
+        return int((Decimal(valor_uf) * Decimal(uf)).quantize(Decimal("1")))
+    except (TypeError, ValueError, InvalidOperation):
+        return ""
+
+
+@register.filter
+def uf_desde_clp(valor_clp, uf):
+    """Uso: {{ p.precio_clp|uf_desde_clp:uf_hoy|floatformat:2 }} ("" sin UF)."""
+    try:
+        return (Decimal(valor_clp) / Decimal(uf)).quantize(Decimal("0.01"))
+    except (TypeError, ValueError, InvalidOperation, ZeroDivisionError):
+        return ""
+
+
+@register.simple_tag
+def imagen_srcset(imagen, sizes="100vw"):
+    """
+    Uso: <img {% imagen_srcset p.portada "(min-width: 992px) 33vw, 100vw" %} alt="...">
+    Atributos src/srcset/sizes/width/height con las derivadas WebP
+    (core/imagenes.py); mientras no existan, solo el src del original.
+    """
+    if not imagen:
+        return ""
+    derivadas = imagenes.derivadas(imagen.name)
+    if not derivadas:
+        return format_html('src="{}"', imagen.url)
+    ancho, alto, url = derivadas[-1]
+    srcset = ", ".join(f"{u} {a}w" for a, _, u in derivadas)
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}" width="{}" height="{}"', url, srcset, sizes, ancho, alto
+    )
@@ -1,16 +1,32 @@
 # core/tests.py
 import io
 import tempfile
+import os
 import shutil
+import threading
 from datetime import timedelta
 
-from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.test import TestCase as DjangoTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 
 from .models import Propiedad, ImagenPropiedad, Agente, Lead, CarouselSlide
+from . import cache_local
+
+
+class TestCase(DjangoTestCase):
+    """
+    TestCase que parte cada test con las cachés vacías: el rollback entre
+    tests no dispara las señales que las invalidan.
+    """
+
+    def run(self, result=None):
+        cache.clear()
+        cache_local.limpiar_todas()
+        return super().run(result)
 
 # =============== Helpers de test ===============
 
@@ -193,6 +209,1628 @@ class ListFiltersPaginationTests(TestCase):
         self.assertTrue(all(p.dormitorios >= 3 for p in page.object_list))
 
 
+class BusquedaTextoTests(TestCase):
+    def setUp(self):
+        self.en_titulo = make_prop(titulo="Casa con piscina en Ñuñoa", comuna="Ñuñoa")
+        self.en_desc = make_prop(titulo="Departamento luminoso", comuna="Santiago")
+        self.en_desc.descripcion = "Edificio con piscina temperada"
+        self.en_desc.save()
+        make_prop(titulo="Oficina centro", comuna="Santiago")
+
+    def _ids(self, q):
+        resp = self.client.get(reverse("core:propiedad_list"), {"q": q})
+        return [p.id for p in resp.context["propiedades"].object_list]
+
+    def test_ranking_por_relevancia(self):
+        self.assertEqual(self._ids("piscina"), [self.en_titulo.id, self.en_desc.id])
+
+    def test_sin_tildes_y_prefijo(self):
+        self.assertEqual(self._ids("nunoa"), [self.en_titulo.id])
+        self.assertEqual(self._ids("pisc"), [self.en_titulo.id, self.en_desc.id])
+
+    def test_indice_sincronizado_en_save_y_delete(self):
+        self.en_titulo.titulo = "Casa con quincho"
+        self.en_titulo.save()
+        self.assertEqual(self._ids("piscina"), [self.en_desc.id])
+        self.en_desc.delete()
+        self.assertEqual(self._ids("piscina"), [])
+
+    def test_filtros_antes_del_tope(self):
+        from . import busqueda
+
+        make_prop(titulo="Piscina piscina piscina", comuna="Santiago", publicada=False)
+        self.assertEqual(
+            busqueda.buscar_ids("piscina", Propiedad.objects.filter(publicada=True, comuna="Santiago"), limite=1),
+            [self.en_desc.id],
+        )
+        resp = self.client.get(reverse("core:propiedad_list"), {"q": "piscina", "comuna": "Santiago"})
+        self.assertEqual([p.id for p in resp.context["propiedades"].object_list], [self.en_desc.id])
+
+    def test_caracteres_especiales_no_rompen(self):
+        resp = self.client.get(reverse("core:propiedad_list"), {"q": 'casa" OR (NEAR'})
+        self.assertEqual(resp.status_code, 200)
+
+
+class TextosNormalizadosTests(TestCase):
+    def test_columnas_norm_en_save(self):
+        p = make_prop(titulo="Casa  en Peñalolén", comuna="Peñalolén")
+        self.assertEqual(p.titulo_norm, "casa en penalolen")
+        self.assertEqual(p.comuna_norm, "penalolen")
+
+    def test_norm_no_excede_la_columna(self):
+        titulo = "Casa ½ " + "x" * 172  # 180 caracteres; NFKD los alarga
+        p = make_prop(titulo=titulo)
+        p.refresh_from_db()
+        self.assertEqual(len(p.titulo_norm), 180)
+        self.assertTrue(p.titulo_norm.startswith("casa 1⁄2 x"))
+
+    def test_admin_busca_direccion_con_tildes(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        p = make_prop(titulo="Depto", comuna="Ñuñoa")
+        Propiedad.objects.filter(pk=p.pk).update(direccion="Av. Irarrázaval 3000")
+        otra = make_prop(titulo="Casa en Peñalolén")
+        admin_prop = site._registry[Propiedad]
+        request = RequestFactory().get("/admin/")
+
+        def buscar(termino):
+            qs, _ = admin_prop.get_search_results(request, Propiedad.objects.all(), termino)
+            return set(qs.values_list("id", flat=True))
+
+        self.assertEqual(buscar("Irarrázaval"), {p.id})        # direccion, término original
+        self.assertEqual(buscar("penalolen"), {otra.id})       # *_norm, término normalizado
+        self.assertEqual(buscar("NUNOA Irarrázaval"), {p.id})  # cada palabra en algún campo
+        self.assertEqual(buscar('"casa en"'), {otra.id})
+
+    def test_update_fields_incluye_norm(self):
+        p = make_prop(titulo="Depto", comuna="Maipú")
+        p.titulo = "Depto Maipú"
+        p.save(update_fields=["titulo"])
+        p.refresh_from_db()
+        self.assertEqual(p.titulo_norm, "depto maipu")
+
+    def test_fallback_sin_motor_usa_norm(self):
+        from unittest import mock
+        from . import busqueda
+        p = make_prop(titulo="Casa", comuna="Ñuñoa")
+        with mock.patch.object(busqueda, "motor", return_value=None):
+            resp = self.client.get(reverse("core:propiedad_list"), {"q": "NUNOA"})
+        self.assertEqual([x.id for x in resp.context["propiedades"].object_list], [p.id])
+
+    def test_backfill_command(self):
+        from django.core.management import call_command
+        p = make_prop(titulo="Casa Ñuñoa")
+        Propiedad.objects.filter(pk=p.pk).update(titulo_norm="")
+        call_command("normalizar_textos", stdout=io.StringIO())
+        p.refresh_from_db()
+        self.assertEqual(p.titulo_norm, "casa nunoa")
+
+
+class IndicesListadoTests(TestCase):
+    def test_listado_usa_indice_compuesto(self):
+        from django.db import connection
+        if connection.vendor != "sqlite":
+            self.skipTest("El plan se verifica solo en SQLite")
+        qs = Propiedad.objects.filter(publicada=True, comuna="Las Condes").order_by("-destacada", "-creado")[:12]
+        plan = qs.explain()
+        self.assertIn("prop_pub_comuna_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_equivalentes_para_motores_sin_indices_parciales(self):
+        import importlib
+        from types import SimpleNamespace
+        from django.apps import apps
+
+        migracion = importlib.import_module("core.migrations.0019_indices_listado_sin_parciales")
+        parciales = [list(i.fields) for i in Propiedad._meta.indexes if i.condition is not None]
+        equivalentes = [campos[1:] for _, campos in migracion.INDICES]
+        self.assertEqual(sorted(parciales), sorted(equivalentes))
+
+        creados = []
+
+        def editor(parciales):
+            return SimpleNamespace(
+                connection=SimpleNamespace(features=SimpleNamespace(supports_partial_indexes=parciales)),
+                add_index=lambda modelo, indice: creados.append(indice.name),
+            )
+
+        migracion.crear_sin_parciales(apps, editor(True))
+        self.assertEqual(creados, [])
+        migracion.crear_sin_parciales(apps, editor(False))  # MySQL
+        self.assertEqual(creados, [n for n, _ in migracion.INDICES])
+
+
+class KeysetPaginacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for i in range(30):
+            # creado repetido a propósito para ejercitar el desempate por id
+            make_prop(titulo=f"K{i}", destacada=(i % 6 == 0), creado=now - timedelta(hours=i // 2))
+
+    def _esperado(self):
+        return list(
+            Propiedad.objects.filter(publicada=True)
+            .order_by("-destacada", "-creado", "id")
+            .values_list("id", flat=True)
+        )
+
+    def test_recorre_todo_con_cursores_ida_y_vuelta(self):
+        url = reverse("core:propiedad_list")
+        vistos, paginas, cursor = [], [], None
+        while True:
+            resp = self.client.get(url, {"cursor": cursor} if cursor else {})
+            page = resp.context["propiedades"]
+            paginas.append((page.number, [p.id for p in page]))
+            vistos += [p.id for p in page]
+            if not page.has_next():
+                break
+            cursor = page.cursor_siguiente
+        self.assertEqual(vistos, self._esperado())
+        self.assertEqual([n for n, _ in paginas], [1, 2, 3])
+
+        # Volver atrás desde la última página reproduce las anteriores
+        cursor = page.cursor_anterior
+        resp = self.client.get(url, {"cursor": cursor})
+        atras = resp.context["propiedades"]
+        self.assertEqual((atras.number, [p.id for p in atras]), paginas[1])
+        self.assertTrue(atras.has_previous())
+
+    def test_cursor_adulterado_sirve_primera_pagina(self):
+        resp = self.client.get(reverse("core:propiedad_list"), {"cursor": "no-es-un-cursor"})
+        page = resp.context["propiedades"]
+        self.assertEqual(page.number, 1)
+        self.assertEqual([p.id for p in page], self._esperado()[:12])
+
+    def test_links_preservan_filtros_y_total(self):
+        resp = self.client.get(reverse("core:propiedad_list"), {"tipo_operacion": "venta"})
+        self.assertEqual(resp.context["qs"], "tipo_operacion=venta")
+        self.assertEqual(resp.context["total"], 30)
+        self.assertContains(resp, "?tipo_operacion=venta&cursor=")
+
+
+class FacetasTests(TestCase):
+    def _desde_cero(self):
+        from django.db.models import Count
+        esperado = {}
+        for campo in ("comuna", "tipo_operacion", "tipo_propiedad"):
+            for row in Propiedad.objects.filter(publicada=True).values(campo).annotate(n=Count("id")):
+                esperado[(campo, str(row[campo]))] = row["n"]
+        return esperado
+
+    def _actuales(self):
+        from .models import ConteoFaceta
+        return {(c.faceta, c.valor): c.total for c in ConteoFaceta.objects.filter(total__gt=0)}
+
+    def test_incremental_igual_a_group_by(self):
+        a = make_prop(comuna="Las Condes")
+        b = make_prop(comuna="Las Condes", tipo_operacion="arriendo")
+        c = make_prop(comuna="Macul", publicada=False)
+        self.assertEqual(self._actuales(), self._desde_cero())
+
+        b.comuna = "Macul"                 # cambio de valor
+        b.save()
+        c.publicada = True                 # publicación
+        c.save()
+        a.publicada = False                # despublicación
+        a.save()
+        self.assertEqual(self._actuales(), self._desde_cero())
+
+        c.delete()
+        self.assertEqual(self._actuales(), self._desde_cero())
+
+    def test_listado_muestra_conteos_sin_agregados(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        make_prop(comuna="Las Condes")
+        make_prop(comuna="Las Condes")
+        url = reverse("core:propiedad_list")
+        self.client.get(url)  # calienta la caché
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertContains(resp, "Las Condes (2)")
+        self.assertFalse([q for q in ctx.captured_queries if "core_conteofaceta" in q["sql"]])
+
+    def test_cada_faceta_llega_al_formulario(self):
+        from .facetas import FACETAS
+        from .forms import BusquedaPropiedadForm
+        self.assertEqual(set(FACETAS), set(BusquedaPropiedadForm.CAMPOS_CON_CONTEO))
+
+    def test_recalcular_command(self):
+        from django.core.management import call_command
+        make_prop(comuna="Macul")
+        Propiedad.objects.update(comuna="Renca")  # no pasa por señales
+        call_command("recalcular_facetas", stdout=io.StringIO())
+        self.assertEqual(self._actuales(), self._desde_cero())
+
+
+class CacheResultadosTests(TestCase):
+    def setUp(self):
+        from . import cache_resultados
+        self.cache = cache_resultados.cache
+        self.lc = make_prop(comuna="Las Condes", tipo_propiedad="casa")
+        self.macul = make_prop(comuna="Macul", tipo_propiedad="casa")
+
+    def _ids(self, **params):
+        resp = self.client.get(reverse("core:propiedad_list"), params)
+        return [p.id for p in resp.context["propiedades"]]
+
+    def test_hit_miss_y_clave_normalizada(self):
+        antes = self.cache.metricas()
+        self._ids(comuna="Las Condes", min_precio="")
+        self._ids(comuna="Las Condes")
+        m = self.cache.metricas()
+        self.assertEqual((m["fallos"] - antes["fallos"], m["aciertos"] - antes["aciertos"]), (1, 1))
+
+    def test_invalidacion_precisa(self):
+        self.assertEqual(self._ids(comuna="Las Condes"), [self.lc.id])
+        self.assertEqual(self._ids(comuna="Macul"), [self.macul.id])
+        self.assertEqual(self.cache.metricas()["entradas"], 2)
+
+        nueva = make_prop(comuna="Las Condes", tipo_propiedad="casa")
+        # Solo cae la entrada de Las Condes
+        self.assertEqual(self.cache.metricas()["entradas"], 1)
+        self.assertEqual(self._ids(comuna="Las Condes"), [nueva.id, self.lc.id])
+
+        # Mover Macul -> Las Condes invalida ambas
+        self._ids(comuna="Macul")
+        self.macul.comuna = "Las Condes"
+        self.macul.save()
+        self.assertEqual(self.cache.metricas()["entradas"], 0)
+        self.assertEqual(self._ids(comuna="Macul"), [])
+
+    def test_lru_acotada_y_ttl(self):
+        from .cache_local import CacheLocal
+        ahora = [0.0]
+        c = CacheLocal("test-lru", max_entradas=2, ttl=10, reloj=lambda: ahora[0])
+        c.guardar("a", 1)
+        c.guardar("b", 2)
+        c.obtener("a")
+        c.guardar("c", 3)  # desaloja "b", la menos usada
+        self.assertIsNone(c.obtener("b"))
+        self.assertEqual(c.obtener("a"), 1)
+        ahora[0] = 11
+        self.assertIsNone(c.obtener("a"))
+        self.assertEqual(c.metricas()["desalojos"], 1)
+
+    def test_metricas_solo_staff(self):
+        url = reverse("core:api_metricas")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User = get_user_model()
+        User.objects.create_user(username="staff", password="x", is_staff=True)
+        self.client.login(username="staff", password="x")
+        data = self.client.get(url).json()
+        self.assertIn("resultados", data["caches"])
+
+
+class TarjetasCacheTests(TestCase):
+    def test_pagina_completa_en_un_get_many(self):
+        from unittest import mock
+        from . import tarjetas
+        props = [make_prop(titulo=f"Casa {i}") for i in range(3)]
+        primera = tarjetas.renderizar(props)
+        self.assertIn("Casa 1", primera[props[1].pk])
+
+        with mock.patch.object(tarjetas, "render_to_string") as render, \
+                mock.patch.object(tarjetas.cache, "get_many", wraps=tarjetas.cache.get_many) as get_many:
+            segunda = tarjetas.renderizar(props, props[:1])  # duplicadas se ignoran
+        render.assert_not_called()
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(segunda, primera)
+
+    def test_guardar_invalida_la_tarjeta(self):
+        p = make_prop(titulo="Titulo viejo")
+        self.assertContains(self.client.get(reverse("core:propiedad_list")), "Titulo viejo")
+        p.titulo = "Titulo nuevo"
+        p.save()
+        resp = self.client.get(reverse("core:propiedad_list"))
+        self.assertContains(resp, "Titulo nuevo")
+        self.assertNotContains(resp, "Titulo viejo")
+
+
+class ApiPropiedadesTests(TestCase):
+    def setUp(self):
+        base = timezone.now()
+        self.props = [
+            make_prop(titulo=f"Casa {i}", comuna="Macul" if i % 2 else "Ñuñoa", creado=base - timedelta(hours=i))
+            for i in range(5)
+        ]
+        self.url = reverse("core:api_propiedades")
+
+    def test_filtros_y_proyeccion(self):
+        data = self.client.get(self.url, {"comuna": "Macul"}).json()
+        self.assertEqual(data["total"], 2)
+        self.assertEqual([r["id"] for r in data["resultados"]], [self.props[1].id, self.props[3].id])
+        self.assertNotIn("descripcion", data["resultados"][0])
+
+        data = self.client.get(self.url, {"fields": "titulo,precio_clp,no_existe"}).json()
+        self.assertEqual(set(data["resultados"][0]), {"id", "titulo", "precio_clp"})
+
+    def test_paginado(self):
+        data = self.client.get(self.url, {"page": 2, "por_pagina": 2}).json()
+        self.assertEqual((data["pagina"], data["paginas"]), (2, 3))
+        self.assertEqual([r["id"] for r in data["resultados"]], [self.props[2].id, self.props[3].id])
+
+    def test_gzip_y_get_condicional(self):
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        etag = resp["ETag"]
+        self.assertTrue(resp["Last-Modified"])
+
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self.props[4].titulo = "Casa editada"
+        self.props[4].save()
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+class MapaTests(TestCase):
+    def setUp(self):
+        self.url = reverse("core:api_mapa")
+        # Plaza de Armas y Costanera Center (coordenadas propias)
+        self.plaza = make_prop(titulo="Plaza", comuna="Santiago")
+        self.plaza.latitud, self.plaza.longitud = -33.4378, -70.6504
+        self.plaza.save()
+        self.costanera = make_prop(titulo="Costanera", comuna="Providencia")
+        self.costanera.latitud, self.costanera.longitud = -33.4175, -70.6065
+        self.costanera.save()
+        # Sin coordenadas: centroide de Maipú
+        self.maipu = make_prop(titulo="Maipu", comuna="Maipú")
+
+    def test_geohash_y_geocelda(self):
+        from . import geo
+        self.assertEqual(geo.geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(self.plaza.geocelda, geo.geohash(-33.4378, -70.6504))
+        self.assertEqual(self.maipu.geocelda, geo.geohash(*geo.CENTROIDES_COMUNAS["Maipú"]))
+        self.assertEqual(self.maipu.ubicacion[2], True)
+
+    def test_celdas_cubren_el_rectangulo(self):
+        from . import geo
+        caja = (-33.50, -70.70, -33.40, -70.55)
+        celdas = geo.celdas_bbox(*caja)
+        self.assertLessEqual(len(celdas), geo.MAX_CELDAS)
+        for lat in (-33.50, -33.45, -33.40):
+            for lng in (-70.70, -70.62, -70.55):
+                self.assertTrue(any(geo.geohash(lat, lng).startswith(c) for c in celdas))
+
+    def test_bbox_radio_y_filtros(self):
+        data = self.client.get(self.url, {"bbox": "-70.66,-33.45,-70.60,-33.41"}).json()
+        self.assertEqual({r["id"] for r in data["resultados"]}, {self.plaza.id, self.costanera.id})
+
+        data = self.client.get(self.url, {"lat": -33.4378, "lng": -70.6504, "radio_km": 30}).json()
+        ids = [r["id"] for r in data["resultados"]]
+        self.assertEqual(ids, [self.plaza.id, self.costanera.id, self.maipu.id])
+        self.assertTrue(data["resultados"][2]["aproximada"])
+
+        data = self.client.get(self.url, {"lat": -33.4378, "lng": -70.6504, "radio_km": 2}).json()
+        self.assertEqual([r["id"] for r in data["resultados"]], [self.plaza.id])
+
+        data = self.client.get(self.url, {"bbox": "-71,-34,-70,-33", "comuna": "Maipú"}).json()
+        self.assertEqual([r["id"] for r in data["resultados"]], [self.maipu.id])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+    def test_coordenadas_no_finitas_dan_400(self):
+        for params in ({"lat": "inf", "lng": "1", "radio_km": "1"}, {"lat": "-33.4", "lng": "nan", "radio_km": "1"},
+                       {"lat": "-33.4", "lng": "-70.6", "radio_km": "-inf"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_bbox_no_finito_da_400(self):
+        for bbox in ("nan,-34,-70,-33", "-71,-34,inf,-33", "-inf,-34,-70,-33"):
+            self.assertEqual(self.client.get(self.url, {"bbox": bbox}).status_code, 400, bbox)
+
+    def test_consulta_usa_indice_geocelda(self):
+        from django.db import connection
+        from . import geo
+        if connection.vendor != "sqlite":
+            self.skipTest("El plan se verifica solo en SQLite")
+        celdas = geo.celdas_bbox(-33.45, -70.66, -33.41, -70.60)
+        plan = Propiedad.objects.filter(geo.filtro_celdas(celdas)).explain()
+        self.assertIn("geocelda", plan)
+        self.assertNotIn("SCAN core_propiedad\n", plan + "\n")
+
+
+class AutocompletarTests(TestCase):
+    def setUp(self):
+        self.url = reverse("core:api_autocompletar")
+        self.p = make_prop(titulo="Casa con piscina en Peñalolén", comuna="Peñalolén")
+
+    def _textos(self, q):
+        return [s["texto"] for s in self.client.get(self.url, {"q": q}).json()["sugerencias"]]
+
+    def test_sin_tildes_y_por_palabra(self):
+        self.assertIn("Peñalolén", self._textos("penalo"))
+        self.assertIn("Las Condes", self._textos("cond"))
+        self.assertIn("Departamento", self._textos("DEPA"))
+        self.assertIn("Casa con piscina en Peñalolén", self._textos("piscina"))
+        # Comunas antes que títulos con el mismo prefijo
+        self.assertEqual(self._textos("penalolen")[0], "Peñalolén")
+        self.assertEqual(self._textos(""), [])
+
+    def test_sin_consultas_por_tecla(self):
+        self._textos("ca")  # construye el índice
+        with self.assertNumQueries(0):
+            self._textos("cas")
+            self._textos("casa con")
+
+    def test_se_reconstruye_al_cambiar_una_propiedad(self):
+        self.assertEqual(self._textos("quincho"), [])
+        self.p.titulo = "Casa con quincho"
+        self.p.save()
+        self.assertEqual(self._textos("quincho"), ["Casa con quincho"])
+
+        self.p.publicada = False
+        self.p.save()
+        self.assertEqual(self._textos("quincho"), [])
+
+        # Un cambio que no se sugiere no descarta el índice
+        from . import autocompletar
+        self._textos("x")
+        antes = autocompletar.cache.metricas()["invalidaciones"]
+        self.p.precio_clp = 1
+        self.p.save()
+        self.assertEqual(autocompletar.cache.metricas()["invalidaciones"], antes)
+
+
+class SimilaresTests(TestCase):
+    def setUp(self):
+        from . import similares
+        self.similares = similares
+        self.base = make_prop(titulo="Base", comuna="Ñuñoa", tipo_propiedad="departamento")
+        self.gemela = make_prop(titulo="Gemela", comuna="Providencia", tipo_propiedad="departamento")
+        self.lejana = make_prop(titulo="Lejana", comuna="Talagante", tipo_propiedad="departamento")
+        self.casa = make_prop(titulo="Casa", comuna="Ñuñoa", tipo_propiedad="casa")
+        self.arriendo = make_prop(titulo="Arriendo", comuna="Ñuñoa", tipo_operacion="arriendo")
+        for p, uf, m2 in ((self.base, 5000, 70), (self.gemela, 5200, 72), (self.lejana, 5000, 70),
+                          (self.casa, 5000, 70), (self.arriendo, 20, 70)):
+            p.precio_uf, p.sup_construida_m2 = uf, m2
+            p.save()
+
+    def test_orden_por_parecido_y_misma_operacion(self):
+        ids = self.similares.para(self.base, k=10)
+        self.assertEqual(ids, [self.gemela.id, self.lejana.id, self.casa.id])
+
+    def test_actualizacion_incremental_sin_reconstruir(self):
+        m = self.similares.matriz()
+        self.similares.para(self.base)
+        nueva = make_prop(titulo="Nueva", comuna="Ñuñoa")
+        nueva.precio_uf, nueva.sup_construida_m2 = 5000, 70
+        nueva.save()
+        self.assertIs(self.similares.matriz(), m)
+        self.assertEqual(self.similares.para(self.base, k=1), [nueva.id])
+
+        nueva.publicada = False
+        nueva.save()
+        self.assertEqual(self.similares.para(self.base, k=1), [self.gemela.id])
+        self.assertNotIn(nueva.id, m.posiciones)
+
+    def test_matriz_acotada(self):
+        from datetime import datetime, timezone as tz
+        filas = [
+            {"id": i, "tipo_operacion": "venta", "tipo_propiedad": "casa", "comuna": "Macul", "precio_uf_efectivo": 1000 + i,
+             "sup_construida_m2": 80, "dormitorios": 3, "banos": 2, "creado": datetime(2024, 1, 1 + i, tzinfo=tz.utc)}
+            for i in range(5)
+        ]
+        m = self.similares.MatrizSimilares(filas, max_filas=5)
+        m.actualizar(dict(filas[0], id=99, creado=datetime(2025, 1, 1, tzinfo=tz.utc)))
+        self.assertEqual(m.n, 5)
+        self.assertNotIn(0, m.posiciones)  # salió la más antigua
+        self.assertEqual(set(m.posiciones), {1, 2, 3, 4, 99})
+
+    def test_seccion_en_la_ficha(self):
+        resp = self.client.get(reverse("core:propiedad_detail", args=[self.base.slug]))
+        self.assertEqual([p.id for p in resp.context["similares"]], [self.gemela.id, self.lejana.id, self.casa.id])
+        self.assertContains(resp, "Propiedades similares")
+
+
+class BusquedasGuardadasTests(TestCase):
+    def _busqueda(self, **kw):
+        base = {"id": 0, "q": "", "region": "", "tipo_operacion": "", "tipo_propiedad": "", "comuna": "",
+                "min_precio": None, "max_precio": None, "dormitorios": None}
+        base.update(kw)
+        return base
+
+    def test_indice_invertido(self):
+        from .alertas import IndiceBusquedas
+        indice = IndiceBusquedas([
+            self._busqueda(id=1, comuna="Macul", tipo_operacion="venta"),
+            self._busqueda(id=2, comuna="Macul", min_precio=3000, max_precio=4000),
+            self._busqueda(id=3, min_precio=5000),
+            self._busqueda(id=4, tipo_propiedad="casa", dormitorios=3),
+            self._busqueda(id=5, q="piscina"),
+            self._busqueda(id=6, comuna="Ñuñoa"),
+            self._busqueda(id=7),
+        ])
+        prop = {"id": 1, "titulo_norm": "depto con piscina", "descripcion_norm": "", "comuna_norm": "macul",
+                "region": "RM", "tipo_operacion": "venta", "tipo_propiedad": "departamento", "comuna": "Macul",
+                "precio_uf_efectivo": 3500, "dormitorios": 2}
+        self.assertEqual(sorted(indice.calces(prop)), [1, 2, 5, 7])
+        prop.update(precio_uf_efectivo=None, tipo_propiedad="casa", dormitorios=3, titulo_norm="casa")
+        self.assertEqual(sorted(indice.calces(prop)), [1, 4, 7])
+
+    def test_guardar_emparejar_y_enviar(self):
+        from django.core import mail
+        from django.core.management import call_command
+        from .models import AvisoBusqueda, BusquedaGuardada
+
+        resp = self.client.post(reverse("core:busqueda_guardar"), {"comuna": "Macul", "email": "Ana@Test.cl"})
+        self.assertRedirects(resp, reverse("core:propiedad_list") + "?comuna=Macul", fetch_redirect_response=False)
+        guardada = BusquedaGuardada.objects.get(comuna="Macul")
+        self.assertIsNone(guardada.confirmada)
+        confirmar = reverse("core:busqueda_confirmar", args=[guardada.token])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(confirmar, mail.outbox[0].body)
+        mail.outbox.clear()
+        BusquedaGuardada.objects.create(email="ana@test.cl", tipo_operacion="venta", confirmada=timezone.now())
+        BusquedaGuardada.objects.create(email="otro@test.cl", comuna="Renca", confirmada=timezone.now())
+
+        # Sin confirmar no hay avisos
+        make_prop(titulo="Depto Macul", comuna="Macul", tipo_operacion="arriendo")
+        call_command("enviar_avisos_busquedas", stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+
+        # El link del correo solo muestra la confirmación; el cambio es por POST
+        self.assertContains(self.client.get(confirmar), "Confirmar y recibir avisos")
+        guardada.refresh_from_db()
+        self.assertIsNone(guardada.confirmada)
+        self.client.post(confirmar)
+        guardada.refresh_from_db()
+        self.assertIsNotNone(guardada.confirmada)
+
+        p1 = make_prop(titulo="Casa Macul", comuna="Macul")
+        make_prop(titulo="Borrador", comuna="Macul", publicada=False)
+        call_command("enviar_avisos_busquedas", stdout=io.StringIO())
+
+        self.assertEqual(AvisoBusqueda.objects.filter(propiedad=p1).count(), 2)
+        self.assertEqual(len(mail.outbox), 1)  # un solo correo por email
+        self.assertEqual(mail.outbox[0].to, ["ana@test.cl"])
+        self.assertIn("Casa Macul", mail.outbox[0].body)
+
+        # Ya enviados: una segunda pasada no repite nada
+        call_command("enviar_avisos_busquedas", stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Editar una publicada no la vuelve a avisar; darse de baja (por POST) corta los avisos
+        p1.titulo = "Casa Macul editada"
+        p1.save()
+        baja = reverse("core:busqueda_baja", args=[guardada.token])
+        self.assertContains(self.client.get(baja), "Darme de baja")
+        guardada.refresh_from_db()
+        self.assertTrue(guardada.activa)
+        self.client.post(baja)
+        guardada.refresh_from_db()
+        self.assertFalse(guardada.activa)
+        make_prop(titulo="Otra en Macul", comuna="Macul", tipo_operacion="arriendo")
+        call_command("enviar_avisos_busquedas", stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_guardar_con_filtros_fuera_de_rango(self):
+        from urllib.parse import urlencode
+        from django.core import mail
+        from .models import BusquedaGuardada
+
+        url = reverse("core:busqueda_guardar")
+        for filtros in ({"dormitorios": "-1"}, {"q": "x" * 300}):
+            resp = self.client.post(url, {"email": "ana@test.cl", **filtros})
+            self.assertRedirects(resp, reverse("core:propiedad_list") + "?" + urlencode(filtros),
+                                 fetch_redirect_response=False)
+        self.assertFalse(BusquedaGuardada.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class TasacionLoteTests(TestCase):
+    FILAS = [
+        {"comuna": "Las Condes", "tipo_propiedad": "departamento", "sup_construida": "85.5",
+         "banos": "2", "estacionamientos": "1", "bodegas": "1", "ano_construccion": "2012"},
+        {"comuna": "Maipú", "tipo_propiedad": "Casa", "sup_construida": 120, "sup_terreno": 300,
+         "banos": 2, "estacionamientos": 2, "ano_construccion": 2025},
+        {"comuna": "Colina", "tipo_propiedad": "oficina", "sup_construida": 55, "ano_construccion": 1950},
+        {"comuna": "Ñuñoa", "tipo_propiedad": "departamento", "sup_construida": 45},
+    ]
+
+    def test_lote_igual_a_escalar(self):
+        from .servicios_tasacion import estimar_precio_propiedad, estimar_precios_lote
+
+        esperado = [estimar_precio_propiedad(f) for f in self.FILAS]
+        precios_min, precios_max, errores = estimar_precios_lote(self.FILAS)
+        self.assertEqual(errores, {})
+        self.assertEqual(list(zip(precios_min.tolist(), precios_max.tolist())), esperado)
+
+        # Una fila mala no arrastra al resto
+        filas = self.FILAS + [{"comuna": "Macul", "banos": "dos"}, {"tipo_propiedad": "casa"}]
+        precios_min, precios_max, errores = estimar_precios_lote(filas)
+        self.assertEqual(sorted(errores), [4, 5])
+        self.assertEqual(list(zip(precios_min.tolist(), precios_max.tolist()))[:4], esperado)
+
+    def test_valores_fuera_de_rango_invalidan_solo_su_fila(self):
+        from .servicios_tasacion import FUERA_DE_RANGO, estimar_precio_propiedad, estimar_precios_lote
+
+        esperado = [estimar_precio_propiedad(f) for f in self.FILAS]
+        filas = self.FILAS + [
+            {"comuna": "Macul", "tipo_propiedad": "casa", "sup_construida": 80, "banos": 2**70},
+            {"comuna": "Macul", "tipo_propiedad": "casa", "sup_construida": 2**70},
+        ]
+        precios_min, precios_max, errores = estimar_precios_lote(filas)
+        self.assertEqual(errores, {4: FUERA_DE_RANGO, 5: FUERA_DE_RANGO})
+        rangos = list(zip(precios_min.tolist(), precios_max.tolist()))
+        self.assertEqual(rangos[:4], esperado)
+        self.assertEqual(rangos[4:], [(0, 0), (0, 0)])
+
+    def test_api_lote_json_y_csv(self):
+        from .servicios_tasacion import estimar_precio_propiedad
+
+        url = reverse("core:api_tasacion_lote")
+        self.assertEqual(self.client.post(url, [], content_type="application/json").status_code, 302)
+        get_user_model().objects.create_user(username="staff", password="x", is_staff=True)
+        self.client.login(username="staff", password="x")
+
+        data = self.client.post(url, {"propiedades": self.FILAS}, content_type="application/json").json()
+        self.assertEqual(data["total"], 4)
+        self.assertEqual(data["errores"], 0)
+        self.assertEqual(
+            (data["resultados"][1]["precio_min_uf"], data["resultados"][1]["precio_max_uf"]),
+            estimar_precio_propiedad(self.FILAS[1]),
+        )
+
+        contenido = "comuna;tipo_propiedad;sup_construida\nProvidencia;departamento;70\n;casa;90\n"
+        archivo = SimpleUploadedFile("cartera.csv", contenido.encode("utf-8-sig"), content_type="text/csv")
+        resp = self.client.post(url, {"archivo": archivo})
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        lineas = resp.content.decode().splitlines()
+        mn, mx = estimar_precio_propiedad({"comuna": "Providencia", "tipo_propiedad": "departamento", "sup_construida": "70"})
+        self.assertTrue(lineas[1].endswith(f",{mn},{mx},"))
+        self.assertTrue(lineas[2].endswith("Faltan datos de la comuna"))
+
+        self.assertEqual(self.client.post(url, "no es json", content_type="application/json").status_code, 400)
+
+
+@override_settings(VALORES_MERCADO_MIN_MUESTRAS=5)
+class ValoresMercadoTests(TestCase):
+    def _venta(self, comuna, tipo, precio_uf, sup, **kw):
+        p = make_prop(comuna=comuna, tipo_propiedad=tipo, **kw)
+        p.precio_uf = precio_uf
+        p.sup_construida_m2 = sup
+        p.save()
+        return p
+
+    def test_mediana_por_comuna_y_tipo_con_respaldo(self):
+        from .models import ValorMercadoComuna
+        from .servicios_tasacion import VALORES_COMUNA_UF_M2, estimar_precio_propiedad, valor_m2
+
+        casas = [self._venta("Talagante", "casa", uf, 100) for uf in (3000, 3100, 3200, 3300, 9000)]
+        self._venta("Talagante", "departamento", 2500, 50)
+        self._venta("Talagante", "casa", 1, 100, tipo_operacion="arriendo")  # fuera de la muestra
+
+        fila = ValorMercadoComuna.objects.get(comuna="Talagante", tipo_propiedad="casa")
+        self.assertEqual((fila.uf_m2, fila.muestras), (32, 5))
+        self.assertEqual(valor_m2("Talagante", "casa"), 32.0)
+        # Departamentos: 1 muestra -> mediana de toda la comuna (6 muestras)
+        self.assertEqual(valor_m2("Talagante", "departamento"), 32.5)
+        # Sin muestra: valor referencial
+        self.assertEqual(valor_m2("Vitacura", "casa"), VALORES_COMUNA_UF_M2["Vitacura"])
+        self.assertEqual(estimar_precio_propiedad({"comuna": "Talagante", "sup_construida": 100}), (2940, 3460))
+
+        # Incremental: al despublicar una casa el grupo queda bajo el mínimo
+        casas[0].publicada = False
+        casas[0].save()
+        self.assertEqual(ValorMercadoComuna.objects.get(comuna="Talagante", tipo_propiedad="casa").muestras, 4)
+        self.assertEqual(valor_m2("Talagante", "casa"), 33.0)  # mediana de la comuna
+        casas[1].delete()
+        casas[2].delete()
+        self.assertEqual(valor_m2("Talagante", "casa"), 45)  # PROMEDIO_DEFAULT
+
+    def test_recalcular_completo(self):
+        from django.core.management import call_command
+        from .models import ValorMercadoComuna
+
+        for uf in (5000, 6000, 7000):
+            self._venta("Ñuñoa", "departamento", uf, 100)
+        Propiedad.objects.filter(comuna="Ñuñoa").update(precio_uf=8000)  # sin señales
+        call_command("recalcular_valores_mercado", stdout=io.StringIO())
+        fila = ValorMercadoComuna.objects.get(comuna="Ñuñoa", tipo_propiedad="")
+        self.assertEqual((fila.uf_m2, fila.muestras), (80, 3))
+
+
+class ComparablesTests(TestCase):
+    def _venta(self, titulo, comuna, precio_uf, sup, dormitorios=2, tipo="departamento"):
+        p = make_prop(titulo=titulo, comuna=comuna, tipo_propiedad=tipo, dormitorios=dormitorios)
+        p.precio_uf = precio_uf
+        p.sup_construida_m2 = sup
+        p.ano_construccion = 2015
+        p.save()
+        return p
+
+    def test_arbol_kd_igual_a_fuerza_bruta(self):
+        import numpy as np
+        from .comparables import ArbolKD
+
+        rng = np.random.default_rng(3)
+        X = np.round(rng.normal(size=(500, 5)), 1)  # con empates
+        arbol = ArbolKD(X)
+        for _ in range(50):
+            q = rng.normal(size=5)
+            d = ((X - q) ** 2).sum(axis=1)
+            esperado = np.lexsort((np.arange(len(X)), d))[:7].tolist()
+            self.assertEqual([pos for _, pos in arbol.consultar(q, 7)], esperado)
+        self.assertEqual(ArbolKD(np.zeros((0, 5))).consultar(np.zeros(5), 3), [])
+
+    def test_api_modo_comparables(self):
+        from . import comparables
+
+        for i, (comuna, uf) in enumerate([("Providencia", 5000), ("Providencia", 5400), ("Ñuñoa", 4600),
+                                          ("Providencia", 6000), ("Puente Alto", 1500)]):
+            self._venta(f"Depto {i}", comuna, uf, 60)
+        self._venta("Casa lejana", "Providencia", 20000, 60, tipo="casa")
+        comparables.reconstruir()
+
+        url = reverse("core:api_tasacion")
+        data = self.client.get(url, {
+            "modo": "comparables", "comuna": "Providencia", "tipo_propiedad": "departamento",
+            "sup_construida": "120", "dormitorios": "2",
+        }).json()
+        self.assertEqual(data["modo"], "comparables")
+        self.assertEqual(len(data["comparables"]), 5)
+        self.assertEqual(data["comparables"][-1]["comuna"], "Puente Alto")  # la más lejana
+        self.assertEqual(data["precio_uf"], 10000)  # mediana: 5000 UF / 60 m² * 120 m²
+        self.assertLess(data["precio_min_uf"], data["precio_uf"])
+        self.assertGreater(data["precio_max_uf"], data["precio_uf"])
+
+        resp = self.client.get(url, {"modo": "comparables", "comuna": "Providencia", "tipo_propiedad": "oficina",
+                                     "sup_construida": "80"})
+        self.assertEqual(resp.status_code, 422)
+
+        base = {"modo": "comparables", "comuna": "Providencia", "tipo_propiedad": "departamento",
+                "sup_construida": "120"}
+        for malo in ({"sup_construida": "inf"}, {"sup_construida": "nan"},
+                     {"latitud": "nan", "longitud": "-70.6"}, {"latitud": "-33.4", "longitud": "-inf"}):
+            resp = self.client.get(url, {**base, **malo})
+            self.assertEqual(resp.status_code, 422, malo)
+
+    def test_cambio_programa_reconstruccion(self):
+        from . import comparables
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            make_prop(titulo="Arriendo", tipo_operacion="arriendo")
+        self.assertNotIn(comparables.reconstruir_en_segundo_plano, callbacks)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self._venta("Venta", "Macul", 3000, 70)
+        self.assertIn(comparables.reconstruir_en_segundo_plano, callbacks)
+
+
+class ColaLeadsTests(TestCase):
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool, ignore_errors=True)
+        ajuste = override_settings(LEADS_SPOOL_DIR=self.spool)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_tasacion_encola_y_worker_guarda(self):
+        from django.core.management import call_command
+        from . import cola_leads
+
+        resp = self.client.post(
+            reverse("core:api_tasacion"),
+            {"comuna": "Macul", "sup_construida": "70", "lead_nombre": "Ana", "lead_email": "ana@test.cl"},
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(Lead.objects.exists())  # la respuesta no esperó el INSERT
+        self.assertEqual(len(cola_leads.pendientes()), 1)
+
+        call_command("procesar_leads", stdout=io.StringIO())
+        lead = Lead.objects.get()
+        self.assertEqual((lead.nombre, lead.origen, lead.comuna), ("Ana", "tasador_virtual", "Macul"))
+        self.assertIn("Tasación sugerida", lead.mensaje)
+        self.assertEqual(cola_leads.pendientes(), [])
+
+    def test_reproceso_sin_duplicados_y_archivos_ilegibles(self):
+        import os
+        from . import cola_leads
+
+        ref = cola_leads.encolar(nombre="Beto", email="beto@test.cl", origen="tasador_virtual")
+        archivo = cola_leads.pendientes()[0]
+        contenido = archivo.read_bytes()
+        self.assertEqual(cola_leads.procesar(), (1, 0))
+
+        # Caída entre el INSERT y el borrado: el archivo sigue en la cola
+        archivo.write_bytes(contenido)
+        (archivo.parent / "zz-roto.json").write_text("{no es json", encoding="utf-8")
+        with self.assertLogs("core.cola_leads", "ERROR"):
+            self.assertEqual(cola_leads.procesar(), (1, 1))
+        self.assertEqual(Lead.objects.get().ref_externa, ref)
+        self.assertEqual(cola_leads.pendientes(), [])
+        self.assertEqual(os.listdir(os.path.join(self.spool, "errores")), ["zz-roto.json"])
+
+    def test_lead_rechazado_por_la_bd_no_traba_la_cola(self):
+        import os
+        from unittest import mock
+        from django.db import IntegrityError
+        from . import cola_leads
+
+        cola_leads.encolar(nombre="Malo", email="malo@test.cl")
+        malo = cola_leads.pendientes()[0]
+        cola_leads.encolar(nombre="x" * 300, email="ana@test.cl")
+        bulk_create = Lead.objects.bulk_create
+
+        def falla_con_malo(leads, **kw):
+            if any(lead.nombre == "Malo" for lead in leads):
+                raise IntegrityError("rechazado")
+            return bulk_create(leads, **kw)
+
+        with mock.patch.object(Lead.objects, "bulk_create", side_effect=falla_con_malo):
+            with self.assertLogs("core.cola_leads", "ERROR"):
+                self.assertEqual(cola_leads.procesar(), (1, 1))
+        self.assertEqual(Lead.objects.get().nombre, "x" * 120)  # cortado al max_length
+        self.assertEqual(cola_leads.pendientes(), [])
+        self.assertEqual(os.listdir(os.path.join(self.spool, "errores")), [malo.name])
+
+
+class TasacionMemoTests(TestCase):
+    def test_memo_normaliza_y_sigue_la_tabla_de_mercado(self):
+        from . import valores_mercado
+        from .servicios_tasacion import estimar_precio_memo, estimar_precio_propiedad, memo
+
+        datos = {"comuna": "Macul", "tipo_propiedad": "departamento", "sup_construida": "70", "banos": "2"}
+        esperado = estimar_precio_propiedad(datos)
+        antes = memo.metricas()
+        self.assertEqual(estimar_precio_memo(datos), esperado)
+        # Mismo resultado por construcción: número vs texto, dormitorios y terreno de un depto
+        self.assertEqual(estimar_precio_memo({**datos, "sup_construida": 70.0, "dormitorios": 3, "sup_terreno": 500}), esperado)
+        despues = memo.metricas()
+        self.assertEqual(
+            (despues["fallos"] - antes["fallos"], despues["aciertos"] - antes["aciertos"]), (1, 1)
+        )
+
+        # Cambia la tabla de mercado -> otra clave, sin servir el valor viejo
+        valores_mercado.cache.guardar("tabla", {("Macul", ""): 100.0})
+        self.assertEqual(estimar_precio_memo(datos), estimar_precio_propiedad(datos))
+        self.assertNotEqual(estimar_precio_memo(datos), esperado)
+
+    def test_etag_y_cache_control(self):
+        url = reverse("core:api_tasacion")
+        params = {"comuna": "Macul", "tipo_propiedad": "casa", "sup_construida": "90"}
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Cache-Control"], "public, max-age=300")
+        self.assertTrue(resp.has_header("ETag"))
+
+        resp2 = self.client.get(url, params, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp2.status_code, 304)
+
+        # Con datos de contacto (o por POST) no se cachea
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool, ignore_errors=True)
+        with override_settings(LEADS_SPOOL_DIR=spool):
+            resp3 = self.client.get(url, {**params, "lead_nombre": "Ana", "lead_email": "ana@test.cl"})
+        self.assertEqual(resp3["Cache-Control"], "private, no-store")
+        self.assertFalse(resp3.has_header("ETag"))
+        self.assertEqual(self.client.get(url, {"tipo_propiedad": "casa"}).status_code, 400)
+
+
+class UFServidorTests(TestCase):
+    def _archivo_uf(self, valores):
+        """JSON con el formato de mindicador.cl: fechas = medianoche de Chile en UTC."""
+        import json
+        from datetime import datetime, time, timezone as tz
+
+        serie = [
+            {"fecha": timezone.make_aware(datetime.combine(fecha, time())).astimezone(tz.utc)
+                .isoformat().replace("+00:00", "Z"), "valor": valor}
+            for fecha, valor in valores
+        ]
+        f = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8")
+        json.dump({"codigo": "uf", "serie": serie}, f)
+        f.close()
+        self.addCleanup(lambda: __import__("os").remove(f.name))
+        return f.name
+
+    def test_comando_con_fuente_archivo_y_uf_vigente(self):
+        from decimal import Decimal
+        from django.core.management import call_command
+        from . import servicios_uf
+        from .models import ValorUF
+
+        self.assertEqual(servicios_uf.uf_hoy(), (Decimal("37900"), None))  # respaldo sin datos
+        hoy = timezone.localdate()
+        ruta = self._archivo_uf([
+            (hoy + timedelta(days=1), 40100.5), (hoy, 40000.12), (hoy - timedelta(days=1), 39990),
+        ])
+        call_command("actualizar_uf", archivo=ruta, stdout=io.StringIO())
+        self.assertEqual(ValorUF.objects.count(), 3)
+        # La UF se publica por adelantado: vale la de hoy, no la de mañana
+        self.assertEqual(servicios_uf.uf_hoy(), (Decimal("40000.12"), hoy))
+        # Re-ejecutar no duplica
+        call_command("actualizar_uf", archivo=ruta, stdout=io.StringIO())
+        self.assertEqual(ValorUF.objects.count(), 3)
+
+    def test_precios_en_pesos_y_uf_desde_el_servidor(self):
+        from .models import ValorUF
+
+        ValorUF.objects.create(fecha=timezone.localdate(), valor=40000)
+        solo_uf = make_prop(titulo="Casa en UF", precio=1)
+        Propiedad.objects.filter(pk=solo_uf.pk).update(precio_clp=0, precio_uf=2500)
+        solo_clp = make_prop(titulo="Depto en pesos", precio=200000000)
+        Propiedad.objects.filter(pk=solo_clp.pk).update(precio_uf=None)
+
+        html = self.client.get(reverse("core:propiedad_list")).content.decode().replace("\xa0", ".")
+        self.assertIn("window.__UF_HOY_CLP = 40000.00;", html)
+        self.assertNotIn("mindicador", html)
+        self.assertIn("$ 100.000.000", html)  # 2.500 UF a pesos, en la tarjeta
+
+        html = self.client.get(reverse("core:propiedad_detail", args=[solo_clp.slug])).content.decode()
+        self.assertIn('<span data-uf-out>5000,00</span>', html)
+
+        # La tarjeta cacheada se vuelve a generar cuando cambia la UF
+        from . import servicios_uf
+        ValorUF.objects.update(valor=41000)
+        servicios_uf.invalidar()
+        html = self.client.get(reverse("core:propiedad_list")).content.decode().replace("\xa0", ".")
+        self.assertIn("$ 102.500.000", html)
+
+
+class PreciosEfectivosTests(TestCase):
+    def setUp(self):
+        from .models import ValorUF
+
+        ValorUF.objects.create(fecha=timezone.localdate() - timedelta(days=1), valor=40000)
+        self.solo_clp = make_prop(titulo="Legado en pesos", precio=200_000_000)  # 5.000 UF
+        self.solo_uf = make_prop(titulo="Solo UF", precio=1)
+        Propiedad.objects.filter(pk=self.solo_uf.pk).update(precio_clp=0)
+        self.solo_uf.precio_clp = 0
+        self.solo_uf.precio_uf = 3000  # $ 120.000.000
+        self.solo_uf.save()
+
+    def _titulos(self, **params):
+        r = self.client.get(reverse("core:propiedad_list"), params)
+        return {p.titulo for p in r.context["propiedades"]}
+
+    def test_filtro_por_moneda_incluye_precios_legados(self):
+        from decimal import Decimal
+
+        self.solo_clp.refresh_from_db()
+        self.assertEqual(self.solo_clp.precio_uf_efectivo, Decimal("5000.00"))
+        self.assertEqual(self.solo_uf.precio_clp_efectivo, 120_000_000)
+
+        self.assertEqual(self._titulos(min_precio="4000"), {"Legado en pesos"})
+        self.assertEqual(self._titulos(max_precio="4000", moneda="UF"), {"Solo UF"})
+        self.assertEqual(self._titulos(min_precio="100000000", max_precio="150000000", moneda="CLP"), {"Solo UF"})
+        self.assertEqual(self._titulos(moneda="CLP"), {"Legado en pesos", "Solo UF"})
+
+    def test_nueva_uf_recalcula_en_bloque_y_descarta_resultados(self):
+        import json
+        import os
+        from decimal import Decimal
+        from . import servicios_uf
+
+        antes = self._titulos(min_precio="125000000", moneda="CLP")
+        self.assertEqual(antes, {"Legado en pesos"})
+
+        # UF de hoy más alta: el precio en pesos de la propiedad en UF sube
+        f = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8")
+        json.dump({"serie": [{"fecha": timezone.localdate().isoformat(), "valor": 50000}]}, f)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        servicios_uf.actualizar(servicios_uf.FuenteArchivo(f.name))
+
+        filas = dict(Propiedad.objects.values_list("titulo", "precio_clp_efectivo"))
+        self.assertEqual(filas, {"Legado en pesos": 200_000_000, "Solo UF": 150_000_000})
+        self.assertEqual(
+            Propiedad.objects.get(pk=self.solo_clp.pk).precio_uf_efectivo, Decimal("4000.00")
+        )
+        self.assertEqual(self._titulos(min_precio="125000000", moneda="CLP"), {"Legado en pesos", "Solo UF"})
+
+    def test_aviso_de_busqueda_usa_el_precio_efectivo(self):
+        from . import alertas
+        from .models import AvisoBusqueda, BusquedaGuardada, PublicacionPendiente
+
+        rango = BusquedaGuardada.objects.create(
+            email="a@b.cl", min_precio=4000, max_precio=6000, confirmada=timezone.now()
+        )
+        PublicacionPendiente.objects.all().delete()
+        PublicacionPendiente.objects.create(propiedad=self.solo_clp)
+        alertas.emparejar_pendientes()
+        # Publicada solo en pesos: 5.000 UF, igual que en /propiedades/
+        self.assertTrue(AvisoBusqueda.objects.filter(busqueda=rango, propiedad=self.solo_clp).exists())
+
+    def test_busqueda_guardada_en_pesos_se_guarda_en_uf(self):
+        from .models import BusquedaGuardada
+
+        self.client.post(reverse("core:busqueda_guardar"), {
+            "email": "a@b.cl", "min_precio": "80.000.000", "max_precio": "200000000", "moneda": "CLP",
+        })
+        b = BusquedaGuardada.objects.get()
+        self.assertEqual((b.min_precio, b.max_precio), (2000, 5000))
+
+    def test_similares_usa_el_precio_efectivo(self):
+        from . import similares
+
+        base = make_prop(titulo="Base", precio=0)
+        barata = make_prop(titulo="Barata", precio=0)
+        for p, uf in ((base, 5000), (barata, 1000)):
+            p.precio_uf = uf
+            p.save()
+        # La legada en pesos (5.000 UF) se parece más a la base que las en UF
+        self.assertEqual(similares.para(base, k=3), [self.solo_clp.id, self.solo_uf.id, barata.id])
+
+
+class SerieUFTests(TestCase):
+    def _csv(self, contenido):
+        import os
+
+        f = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        f.write(contenido)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_carga_csv_y_consulta_con_interpolacion(self):
+        from datetime import date, datetime
+        from decimal import Decimal
+        import numpy as np
+        from django.core.management import call_command
+        from . import servicios_uf
+        from .models import ValorUF
+
+        ruta = self._csv("Fecha;Valor\n01-01-2020;28.309,94\n03-01-2020;28.311,94\n2020-01-10;28.330,00\n")
+        call_command("actualizar_uf", archivo=ruta, stdout=io.StringIO())
+        self.assertEqual(ValorUF.objects.count(), 3)
+        # Recargar no duplica y actualiza el valor
+        call_command("actualizar_uf", archivo=self._csv("2020-01-10,28330.50\n"), stdout=io.StringIO())
+        self.assertEqual(ValorUF.objects.count(), 3)
+
+        serie = servicios_uf.serie()
+        self.assertEqual(serie.valor(date(2020, 1, 1)), Decimal("28309.94"))
+        self.assertEqual(serie.valor(date(2020, 1, 2)), Decimal("28310.94"))  # interpolado
+        self.assertEqual(serie.valor(timezone.make_aware(datetime(2020, 1, 3, 23, 0))), Decimal("28311.94"))
+        self.assertIsNone(serie.valor(date(2019, 12, 31)))
+        self.assertEqual(serie.valor(date(2030, 1, 1)), Decimal("28330.50"))
+
+        # Vectorizado == escalar
+        fechas = [date(2019, 12, 31)] + [date(2020, 1, d) for d in range(1, 13)]
+        en_bloque = serie.valores_en(fechas)
+        self.assertTrue(np.isnan(en_bloque[0]))
+        for fecha, v in zip(fechas[1:], en_bloque[1:]):
+            self.assertAlmostEqual(v, float(serie.valor(fecha)), places=2)
+
+    def test_upsert_sin_columna_de_conflicto_en_mysql(self):
+        from datetime import date
+        from decimal import Decimal
+        from unittest import mock
+        from django.db import connection
+        from . import servicios_uf
+        from .models import ValorUF
+
+        # MySQL: supports_update_conflicts_with_target=False (ON DUPLICATE KEY UPDATE)
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False), \
+                mock.patch.object(ValorUF.objects, "bulk_create", wraps=ValorUF.objects.bulk_create) as bulk:
+            servicios_uf.guardar([(date(2020, 1, 1), Decimal("28309.94"))], "archivo")
+        opciones = bulk.call_args.kwargs
+        self.assertTrue(opciones["update_conflicts"])
+        self.assertNotIn("unique_fields", opciones)
+        self.assertEqual(ValorUF.objects.get().valor, Decimal("28309.94"))
+
+    def test_reporte_de_leads_a_la_uf_de_su_fecha(self):
+        import csv
+        from datetime import datetime
+        from django.core.management import call_command
+        from . import servicios_uf
+
+        servicios_uf.guardar([
+            (datetime(2020, 1, 1).date(), 28000), (datetime(2024, 1, 1).date(), 36000),
+        ])
+        en_pesos = make_prop(titulo="En pesos", precio=72_000_000)
+        en_uf = make_prop(titulo="En UF", precio=1)
+        Propiedad.objects.filter(pk=en_uf.pk).update(precio_clp=0, precio_uf=1000)
+        for prop, anio in ((en_pesos, 2020), (en_uf, 2024), (None, 2024)):
+            Lead.objects.create(
+                nombre="x", email="x@x.cl", propiedad=prop, creado=timezone.make_aware(datetime(anio, 1, 1, 12))
+            )
+
+        out = io.StringIO()
+        with self.assertNumQueries(2):
+            call_command("reporte_uf", "leads", stdout=out, stderr=io.StringIO())
+        filas = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(
+            [(f["titulo"], f["uf_del_dia"], f["precio_uf"], f["precio_clp"]) for f in filas],
+            [
+                ("En pesos", "28000.00", "2571.43", "72000000"),
+                ("En UF", "36000.00", "1000.00", "36000000"),
+                ("", "36000.00", "", ""),
+            ],
+        )
+
+
+class DerivadasImagenTests(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self._tmpdir)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _jpeg(self, nombre, ancho, alto):
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("RGB", (ancho, alto), (200, 120, 40)).save(buf, "JPEG")
+        return SimpleUploadedFile(nombre, buf.getvalue(), content_type="image/jpeg")
+
+    def test_portada_genera_webp_y_srcset(self):
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from django.db import transaction
+        from . import imagenes
+        from .models import DerivadaImagen, DerivadaPendiente
+
+        p = make_prop(titulo="Con foto")
+        with self.captureOnCommitCallbacks(execute=True):
+            p.portada = self._jpeg("portada.jpg", 2400, 1200)
+            p.save()
+        # El save solo encola: las genera el worker
+        self.assertFalse(DerivadaImagen.objects.exists())
+        self.assertEqual(imagenes.procesar_pendientes(), 1)
+
+        derivadas = list(DerivadaImagen.objects.filter(original=p.portada.name))
+        self.assertEqual([(d.ancho, d.alto) for d in derivadas], [(320, 160), (640, 320), (960, 480), (1280, 640), (1920, 960)])
+        with default_storage.open(derivadas[0].archivo.name) as f, Image.open(f) as img:
+            self.assertEqual((img.format, img.size), ("WEBP", (320, 160)))
+
+        html = self.client.get(reverse("core:propiedad_list")).content.decode()
+        self.assertIn(f'{derivadas[0].archivo.url} 320w, ', html)
+        self.assertIn('sizes="(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw" width="1920" height="960"', html)
+        self.assertNotIn(p.portada.url, html)
+
+        # Si el save se revierte, la portada anterior conserva sus derivadas
+        anterior = p.portada.name
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    p.portada = self._jpeg("revertida.jpg", 500, 400)
+                    p.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(DerivadaImagen.objects.filter(original=anterior).count(), 5)
+        self.assertTrue(default_storage.exists(derivadas[0].archivo.name))
+        self.assertFalse(DerivadaPendiente.objects.exists())
+
+        # Reemplazar la portada borra las derivadas de la anterior al confirmar
+        p = Propiedad.objects.get(pk=p.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            p.portada = self._jpeg("otra.jpg", 500, 400)
+            p.save()
+            self.assertTrue(DerivadaImagen.objects.filter(original=anterior).exists())
+        self.assertEqual(imagenes.procesar_pendientes(), 1)
+        self.assertFalse(DerivadaImagen.objects.filter(original=anterior).exists())
+        self.assertFalse(default_storage.exists(derivadas[0].archivo.name))
+        self.assertEqual(
+            list(DerivadaImagen.objects.filter(original=p.portada.name).values_list("ancho", flat=True)), [320, 500]
+        )
+
+    def test_galeria_banners_y_comando_de_backfill(self):
+        from django.core.management import call_command
+        from .models import DerivadaImagen, DerivadaPendiente
+
+        p = make_prop(titulo="Galería")
+        foto = ImagenPropiedad.objects.create(propiedad=p, imagen=self._jpeg("g.jpg", 800, 600))
+        slide = CarouselSlide.objects.create(titulo="Hero", imagen=self._jpeg("b.jpg", 1000, 400))
+        self.assertEqual(DerivadaPendiente.objects.count(), 2)
+        # Vaciar la cola: como imágenes subidas antes del pipeline
+        DerivadaPendiente.objects.all().delete()
+        html = self.client.get(reverse("core:propiedad_detail", args=[p.slug])).content.decode()
+        self.assertIn(f'src="{foto.imagen.url}"', html)  # sin derivadas: el original
+
+        out = io.StringIO()
+        call_command("generar_derivadas", stdout=out)
+        # 800 px: 320, 640, 800; 1000 px: 320, 640, 960, 1000
+        self.assertIn("2 imágenes procesadas, 7 derivadas", out.getvalue())
+        call_command("generar_derivadas", stdout=out)  # idempotente
+        self.assertEqual(DerivadaImagen.objects.count(), 7)
+
+        html = self.client.get(reverse("core:propiedad_detail", args=[p.slug])).content.decode()
+        self.assertIn('sizes="96px"', html)
+        self.assertIn(' 800w" sizes="(min-width: 992px) 58vw, 100vw"', html)
+        html = self.client.get(reverse("core:home")).content.decode()
+        self.assertIn(' 1000w" sizes="100vw" width="1000" height="400"', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            foto.delete()
+            slide.delete()
+            self.assertEqual(DerivadaImagen.objects.count(), 7)
+        self.assertEqual(DerivadaImagen.objects.count(), 0)
+
+    def test_reemplazar_imagen_de_galeria_y_banner_borra_derivadas(self):
+        from django.core.files.storage import default_storage
+        from . import imagenes
+        from .models import DerivadaImagen
+
+        foto = ImagenPropiedad.objects.create(propiedad=make_prop(titulo="Galería"), imagen=self._jpeg("g.jpg", 800, 600))
+        slide = CarouselSlide.objects.create(titulo="Hero", imagen=self._jpeg("b.jpg", 1000, 400))
+        self.assertEqual(imagenes.procesar_pendientes(), 2)
+        viejas = list(DerivadaImagen.objects.values_list("archivo", flat=True))
+
+        # Editar otro campo no toca las derivadas
+        with self.captureOnCommitCallbacks(execute=True):
+            slide.titulo = "Hero nuevo"
+            slide.save()
+        self.assertEqual(DerivadaImagen.objects.count(), 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            foto.imagen = self._jpeg("g2.jpg", 500, 400)
+            foto.save()
+            slide.imagen = self._jpeg("b2.jpg", 500, 200)
+            slide.save()
+            self.assertEqual(DerivadaImagen.objects.count(), 7)
+        self.assertFalse(DerivadaImagen.objects.exists())
+        self.assertFalse(any(default_storage.exists(nombre) for nombre in viejas))
+        self.assertEqual(imagenes.procesar_pendientes(), 2)
+        self.assertEqual(
+            set(DerivadaImagen.objects.values_list("original", flat=True)), {foto.imagen.name, slide.imagen.name}
+        )
+
+
+@override_settings(ROOT_URLCONF="kcm_site.urls", FOTOS_MAX_LADO=1000)
+class ColaFotosTests(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=os.path.join(self._tmpdir, "media"), FOTOS_STAGING_DIR=os.path.join(self._tmpdir, "staging")
+        )
+        self.override.enable()
+        self.prop = make_prop(titulo="Con galería")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _foto(self, nombre, modo, tamano, formato):
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new(modo, tamano).save(buf, formato)
+        return SimpleUploadedFile(nombre, buf.getvalue())
+
+    def _subir_desde_admin(self, archivos):
+        from django.contrib.admin.sites import site
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.test import RequestFactory
+
+        request = RequestFactory().post("/admin/")
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        form = type("Form", (), {"cleaned_data": {"fotos_multiples": archivos}})()
+        site._registry[Propiedad].save_model(request, self.prop, form, change=True)
+        return [str(m) for m in request._messages]
+
+    def test_admin_encola_y_el_worker_publica(self):
+        from PIL import Image
+        from django.core.management import call_command
+        from . import cola_fotos
+        from .models import DerivadaImagen, FotoPendiente
+
+        ImagenPropiedad.objects.create(propiedad=self.prop, imagen=self._foto("a.jpg", "RGB", (10, 10), "JPEG"), orden=0)
+        mensajes = self._subir_desde_admin([
+            self._foto("IMG_0001.JPG", "RGB", (3000, 2000), "JPEG"),
+            self._foto("plano.png", "RGBA", (400, 300), "PNG"),
+            SimpleUploadedFile("roto.jpg", b"no es una imagen"),
+        ])
+        self.assertEqual(mensajes, ["3 fotos en proceso; se agregarán a la galería en unos minutos."])
+        # El request no sube nada al storage
+        self.assertEqual(ImagenPropiedad.objects.filter(propiedad=self.prop).count(), 1)
+        self.assertEqual(FotoPendiente.objects.filter(estado=FotoPendiente.PENDIENTE).count(), 3)
+        self.assertEqual(len(os.listdir(os.path.join(self._tmpdir, "staging"))), 3)
+
+        with self.assertLogs("core.cola_fotos", level="ERROR"), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(cola_fotos.procesar(hilos=1), (2, 1))
+
+        fotos = {f.nombre: f for f in FotoPendiente.objects.select_related("imagen")}
+        self.assertEqual({n: f.estado for n, f in fotos.items()}, {
+            "IMG_0001.JPG": "lista", "plano.png": "lista", "roto.jpg": "error",
+        })
+        self.assertIn("UnidentifiedImageError", fotos["roto.jpg"].error)
+        jpg, png = fotos["IMG_0001.JPG"].imagen, fotos["plano.png"].imagen
+        self.assertEqual((jpg.orden, png.orden), (1, 2))
+        with jpg.imagen.open("rb") as f, Image.open(f) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (1000, 667)))
+        self.assertTrue(png.imagen.name.endswith(".png"))
+        self.assertFalse(DerivadaImagen.objects.filter(original=jpg.imagen.name).exists())
+        call_command("procesar_fotos", stdout=io.StringIO())  # las derivadas en cola
+        self.assertTrue(DerivadaImagen.objects.filter(original=jpg.imagen.name).exists())
+        # Solo queda en staging la que falló (para reintentar)
+        self.assertEqual(os.listdir(os.path.join(self._tmpdir, "staging")), [fotos["roto.jpg"].archivo])
+
+        # El admin de la propiedad muestra el estado por foto
+        User = get_user_model()
+        User.objects.create_superuser(username="admin", email="admin@test.cl", password="x")
+        self.client.login(username="admin", password="x")
+        html = self.client.get(reverse("admin:core_propiedad_change", args=[self.prop.pk])).content.decode()
+        self.assertIn("roto.jpg", html)
+        self.assertIn(">Error</span>", html)
+        self.assertIn(">Lista</span>", html)
+
+        self.assertEqual(cola_fotos.reintentar(FotoPendiente.objects.all()), 1)
+        self.assertEqual(FotoPendiente.objects.get(nombre="roto.jpg").estado, FotoPendiente.PENDIENTE)
+
+    def test_fotos_de_un_worker_caido_vuelven_a_la_cola(self):
+        from . import cola_fotos
+        from .models import FotoPendiente
+
+        cola_fotos.encolar(self.prop, [self._foto("x.jpg", "RGB", (20, 20), "JPEG")])
+        self.assertEqual(len(cola_fotos.reclamar(10)), 1)
+        self.assertEqual(cola_fotos.reclamar(10), [])  # ya tomada
+        self.assertEqual(cola_fotos.recuperar_colgadas(), 0)
+        FotoPendiente.objects.update(actualizado=timezone.now() - timedelta(hours=1))
+        self.assertEqual(cola_fotos.recuperar_colgadas(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(cola_fotos.procesar(hilos=1), (1, 0))
+
+
+class SubidorFalso:
+    """Reemplaza a cloudinary.uploader.upload: anota las subidas y falla con los archivos indicados."""
+
+    def __init__(self, fallar=()):
+        self.fallar = set(fallar)
+        self.subidas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, archivo, public_id, overwrite, resource_type):
+        if os.path.basename(archivo) in self.fallar:
+            raise ConnectionError("timeout")
+        with self._lock:
+            self.subidas.append((os.path.basename(archivo), public_id))
+        return {"public_id": public_id}
+
+
+class MigrarMediaCloudinaryTests(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.media = os.path.join(self._tmpdir, "media")
+        self.checkpoint = os.path.join(self._tmpdir, "avance.jsonl")
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.props = []
+        for nombre, contenido in (("a.jpg", b"uno"), ("b.jpg", b"dos"), ("c.jpg", b"uno"), ("d.jpg", b"tres")):
+            ruta = os.path.join(self.media, "propiedades", nombre)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, "wb") as f:
+                f.write(contenido)
+            prop = make_prop(titulo=f"Prop {nombre}")
+            # update(): sin señales, no intenta generar derivadas de bytes que no son imagen
+            Propiedad.objects.filter(pk=prop.pk).update(portada=f"propiedades/{nombre}")
+            self.props.append(prop)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _migrar(self, subidor, **opciones):
+        from django.core.management import call_command
+
+        salida = io.StringIO()
+        call_command(
+            "migrate_media_to_cloudinary", only="propiedades", checkpoint=self.checkpoint, uploader=subidor,
+            stdout=salida, **opciones,
+        )
+        return salida.getvalue()
+
+    def test_sube_en_paralelo_y_no_repite_contenido_igual(self):
+        subidor = SubidorFalso()
+        salida = self._migrar(subidor, hilos=3, lote=2)
+
+        # a.jpg y c.jpg tienen el mismo contenido: una sola subida (en el peor caso, dos si van a la vez)
+        subidos = sorted(n for n, _ in subidor.subidas)
+        self.assertIn(subidos, (["a.jpg", "b.jpg", "d.jpg"], ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]))
+        nombres = dict(Propiedad.objects.values_list("pk", "portada"))
+        a, b, c, d = self.props
+        self.assertEqual(nombres[b.pk], f"kcm/propiedades/b_{b.pk}")
+        self.assertEqual(nombres[d.pk], f"kcm/propiedades/d_{d.pk}")
+        self.assertIn(nombres[c.pk], (f"kcm/propiedades/a_{a.pk}", f"kcm/propiedades/c_{c.pk}"))
+        self.assertIn("Migrados: 4", salida)
+        self.assertIn("[PROGRESO] 4/4 (100%)", salida)
+        with open(self.checkpoint, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+    def test_retoma_desde_el_checkpoint(self):
+        salida = self._migrar(SubidorFalso(fallar={"b.jpg"}), hilos=1)
+        self.assertIn("Errores: 1", salida)
+        b = self.props[1]
+        self.assertEqual(Propiedad.objects.get(pk=b.pk).portada.name, "propiedades/b.jpg")
+
+        subidor = SubidorFalso()
+        salida = self._migrar(subidor, hilos=2)
+        self.assertEqual(subidor.subidas, [("b.jpg", f"media/kcm/propiedades/b_{b.pk}")])
+        self.assertIn("Saltados: 3", salida)
+        self.assertEqual(Propiedad.objects.get(pk=b.pk).portada.name, f"kcm/propiedades/b_{b.pk}")
+
+        # Con todo migrado no queda nada por subir
+        subidor = SubidorFalso()
+        self.assertIn("Saltados: 4", self._migrar(subidor))
+        self.assertEqual(subidor.subidas, [])
+
+    def test_error_al_guardar_no_corta_la_corrida(self):
+        from unittest import mock
+        from django.db import DatabaseError
+
+        with mock.patch.object(Propiedad.objects, "bulk_update", side_effect=DatabaseError("database is locked")):
+            salida = self._migrar(SubidorFalso(), hilos=2, lote=2)
+        self.assertIn("[ERROR-save]", salida)
+        self.assertIn("Errores: 4", salida)
+        self.assertIn("=== Resumen ===", salida)
+
+        # Ya subidos: al repetir solo se guarda en BD, sin volver a subir
+        subidor = SubidorFalso()
+        self.assertIn("Errores: 0", self._migrar(subidor, hilos=2))
+        self.assertEqual(subidor.subidas, [])
+        self.assertTrue(all(n.startswith("kcm/") for n in Propiedad.objects.values_list("portada", flat=True)))
+
+    def test_dry_run_no_sube_ni_anota(self):
+        subidor = SubidorFalso()
+        salida = self._migrar(subidor, dry_run=True)
+        self.assertIn("Migrados: 4", salida)
+        self.assertEqual(subidor.subidas, [])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(Propiedad.objects.get(pk=self.props[0].pk).portada.name, "propiedades/a.jpg")
+
+
+class RollbackPrimeraMigracionTests(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.media = os.path.join(self._tmpdir, "media")
+        self.indice = os.path.join(self._tmpdir, "indice.json")
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        for rel in ("propiedades/propiedades/casa.jpg", "otros/casa.png", "propiedades/galeria/living.webp",
+                    "banners/verano.jpg", "propiedades/notas.txt"):
+            self._archivo(rel)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _archivo(self, rel):
+        ruta = os.path.join(self.media, rel)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        open(ruta, "wb").close()
+
+    def _rollback(self, **opciones):
+        from django.core.management import call_command
+
+        salida = io.StringIO()
+        call_command("rollback_first_migration", indice=self.indice, stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_indice_de_un_recorrido(self):
+        from . import indice_media
+
+        indice = indice_media.construir(self.media)
+        self.assertEqual(indice["casa"], ["otros/casa.png", "propiedades/propiedades/casa.jpg"])
+        self.assertNotIn("notas", indice)
+        indice_media.guardar(indice, self.indice, self.media)
+        self.assertEqual(indice_media.cargar(self.indice, self.media), indice)
+        self.assertIsNone(indice_media.cargar(self.indice, os.path.join(self._tmpdir, "otro")))
+
+    def test_revierte_en_lote_con_el_indice(self):
+        casa, sin_archivo, local = make_prop(titulo="Casa"), make_prop(titulo="Sin archivo"), make_prop(titulo="Local")
+        Propiedad.objects.filter(pk=casa.pk).update(portada=f"kcm/propiedades/casa_{casa.pk}")
+        Propiedad.objects.filter(pk=sin_archivo.pk).update(portada="kcm/propiedades/perdida_9")
+        Propiedad.objects.filter(pk=local.pk).update(portada="propiedades/ya_local.jpg")
+        galeria = ImagenPropiedad.objects.create(propiedad=casa, imagen="x.jpg", orden=0)
+        ImagenPropiedad.objects.filter(pk=galeria.pk).update(imagen=f"kcm/galeria/living_{galeria.pk}")
+
+        salida = self._rollback(lote=1)
+
+        # Entre dos "casa" gana la carpeta preferida para portadas
+        self.assertEqual(Propiedad.objects.get(pk=casa.pk).portada.name, "propiedades/propiedades/casa.jpg")
+        self.assertEqual(Propiedad.objects.get(pk=sin_archivo.pk).portada.name, "kcm/propiedades/perdida_9")
+        self.assertEqual(Propiedad.objects.get(pk=local.pk).portada.name, "propiedades/ya_local.jpg")
+        self.assertEqual(ImagenPropiedad.objects.get(pk=galeria.pk).imagen.name, "propiedades/galeria/living.webp")
+        self.assertIn("Actualizados: 2", salida)
+        self.assertIn("Ambiguos (múltiples matches): 1", salida)
+        self.assertIn("Missing (sin archivo local): 1", salida)
+        self.assertTrue(os.path.exists(self.indice))
+
+    def test_reutiliza_el_indice_y_lo_rehace_si_quedo_viejo(self):
+        slide = CarouselSlide.objects.create(titulo="Verano", imagen="x.jpg")
+        CarouselSlide.objects.filter(pk=slide.pk).update(imagen=f"kcm/banners/verano_{slide.pk}")
+        self.assertIn("construido", self._rollback(only="slides", dry_run=True))
+
+        # El archivo se movió después de guardar el índice
+        os.remove(os.path.join(self.media, "banners/verano.jpg"))
+        self._archivo("banners/2024/verano.jpg")
+        salida = self._rollback(only="slides")
+        self.assertIn("reutilizado", salida)
+        self.assertIn("[REINDEX]", salida)
+        self.assertEqual(CarouselSlide.objects.get(pk=slide.pk).imagen.name, "banners/2024/verano.jpg")
+
+
+# =============== Presupuestos de consultas ===============
+
+class PresupuestoConsultasMixin:
+    """
+    assertPresupuesto(max, url): la vista responde 200 con a lo más `max`
+    consultas. Si se pasa, el mensaje lista el SQL para ubicar el N+1.
+    Medir siempre sobre un dataset con varias filas por relación: con una
+    sola fila un N+1 no se nota.
+    """
+
+    def assertPresupuesto(self, maximo, url, data=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, data or {})
+        self.assertEqual(resp.status_code, 200)
+        n = len(ctx.captured_queries)
+        if n > maximo:
+            detalle = "\n".join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+            self.fail(f"{url}: {n} consultas (presupuesto {maximo})\n{detalle}")
+        return resp
+
+
+class PresupuestoConsultasTests(PresupuestoConsultasMixin, TestCase):
+    N_PROPIEDADES = 30
+    FOTOS_POR_PROPIEDAD = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        agente = Agente.objects.create(nombre="Ana", email="ana@test.cl")
+        base = timezone.now()
+        cls.props = []
+        for i in range(cls.N_PROPIEDADES):
+            p = make_prop(
+                titulo=f"Propiedad {i}",
+                destacada=i % 3 == 0,
+                comuna=("Las Condes", "Macul", "Santiago")[i % 3],
+                creado=base - timedelta(hours=i),
+            )
+            p.agente = agente
+            p.portada = f"propiedades/portada{i}.png"
+            p.save()
+            ImagenPropiedad.objects.bulk_create(
+                ImagenPropiedad(propiedad=p, imagen=f"propiedades/galeria/{i}-{j}.png", orden=j)
+                for j in range(cls.FOTOS_POR_PROPIEDAD)
+            )
+            Lead.objects.create(propiedad=p, nombre=f"Lead {i}", email=f"l{i}@test.cl")
+            cls.props.append(p)
+
+    def setUp(self):
+        from . import servicios_uf
+        # La UF del día se lee una vez por worker y hora, no por request
+        servicios_uf.uf_hoy()
+
+    def test_vistas_publicas(self):
+        lista = reverse("core:propiedad_list")
+        # slides + destacadas + recientes + derivadas de portadas y banners
+        # (una consulta para todas; solo en frío, después salen de CacheLocal)
+        self.assertPresupuesto(4, reverse("core:home"))
+        self.assertPresupuesto(3, reverse("core:home"))
+        # ids (caché de resultados) + filas de la página + COUNT
+        # + derivadas de las portadas de tarjetas aún no cacheadas
+        self.assertPresupuesto(4, lista)
+        self.assertPresupuesto(3, lista)
+        self.assertPresupuesto(4, lista, {"page": 2})
+        self.assertPresupuesto(4, lista, {"comuna": "Macul"})
+        # propiedad (+ agente) + galería prefetcheada (recorrida dos veces)
+        # + matriz de similares y derivadas de la galería (solo en frío) + filas de las similares
+        detalle = reverse("core:propiedad_detail", args=[self.props[0].slug])
+        self.assertPresupuesto(5, detalle)
+        self.assertPresupuesto(3, detalle)
+
+    @override_settings(ROOT_URLCONF="kcm_site.urls")
+    def test_admin_changelists(self):
+        User = get_user_model()
+        User.objects.create_superuser(username="admin", email="admin@test.cl", password="x")
+        self.client.login(username="admin", password="x")
+        # Constantes respecto al número de filas (antes: +1 consulta por fila)
+        self.assertPresupuesto(7, reverse("admin:core_propiedad_changelist"))
+        self.assertPresupuesto(11, reverse("admin:core_lead_changelist"))
+
+
 # =============== Tests de formularios / leads ===============
 
 class LeadFlowTests(TestCase):
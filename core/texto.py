@@ -0,0 +1,16 @@
+"""
+Normalización de texto para búsquedas: sin tildes, minúsculas y espacios
+colapsados ("Peñalolén " -> "penalolen").
+
+Se aplica una sola vez al guardar (columnas *_norm de Propiedad) y sobre el
+término buscado, en vez de en cada consulta.
+"""
+import unicodedata
+
+
+def normalizar(texto):
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto))
+    sin_tildes = "".join(ch for ch in descompuesto if not unicodedata.combining(ch))
+    return " ".join(sin_tildes.lower().split())
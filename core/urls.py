@@ -8,10 +8,18 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('propiedades/', views.propiedad_list, name='propiedad_list'),
     path('propiedades/<slug:slug>/', views.propiedad_detail, name='propiedad_detail'),
+    path('busquedas/guardar/', views.busqueda_guardar, name='busqueda_guardar'),
+    path('busquedas/confirmar/<uuid:token>/', views.busqueda_confirmar, name='busqueda_confirmar'),
+    path('busquedas/baja/<uuid:token>/', views.busqueda_baja, name='busqueda_baja'),
     path('contacto/', views.contacto, name='contacto'),
     path('quiero-publicar/', views.quiero_publicar, name='quiero_publicar'),
     path('nosotros/', views.nosotros, name='nosotros'),
     path('simulador/', views.simulador_hipotecario, name='simulador'),
     path('estimador/', views.estimador_view, name='estimador'),
     path('api/tasacion/', views.api_tasacion, name='api_tasacion'),
+    path('api/tasacion/lote/', views.api_tasacion_lote, name='api_tasacion_lote'),
+    path('api/propiedades/', views.api_propiedades, name='api_propiedades'),
+    path('api/mapa/', views.api_mapa, name='api_mapa'),
+    path('api/autocompletar/', views.api_autocompletar, name='api_autocompletar'),
+    path('api/metricas/', views.api_metricas, name='api_metricas'),
 ]
@@ -0,0 +1,114 @@
+"""
+Tabla de valores de mercado (UF/m² construido) calculada con nuestras
+propias publicaciones, para la tasación.
+
+ValorMercadoComuna guarda la mediana de precio_uf / sup_construida_m2 de las
+propiedades publicadas en venta, por (comuna, tipo) y por comuna completa
+(tipo ""). Cuando una Propiedad cambia algo que entra en la muestra, las
+señales recalculan solo su comuna (una consulta y un reemplazo de filas).
+
+La tasación lee tabla(): un dict {(comuna, tipo): uf_m2} en una CacheLocal,
+con solo los grupos que tienen al menos VALORES_MERCADO_MIN_MUESTRAS
+propiedades. Con menos, manda el valor referencial de servicios_tasacion.
+"""
+import statistics
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache_local import CacheLocal
+from .models import Propiedad, ValorMercadoComuna
+
+# Campos de Propiedad que cambian la muestra
+CAMPOS_ESTADO = ("publicada", "tipo_operacion", "comuna", "tipo_propiedad", "precio_uf", "sup_construida_m2")
+
+cache = CacheLocal(
+    "valores_mercado",
+    max_entradas=1,
+    ttl=getattr(settings, "VALORES_MERCADO_TTL", 10 * 60),
+)
+
+
+def _muestra(qs):
+    return qs.filter(
+        publicada=True, tipo_operacion="venta", precio_uf__gt=0, sup_construida_m2__gt=0,
+    ).values_list("comuna", "tipo_propiedad", "precio_uf", "sup_construida_m2")
+
+
+def _filas(muestra):
+    """ValorMercadoComuna (sin guardar) con la mediana de cada grupo."""
+    por_grupo = defaultdict(list)
+    for comuna, tipo, precio, sup in muestra:
+        uf_m2 = precio / sup
+        por_grupo[(comuna, tipo)].append(uf_m2)
+        por_grupo[(comuna, "")].append(uf_m2)
+    return [
+        ValorMercadoComuna(
+            comuna=comuna,
+            tipo_propiedad=tipo,
+            uf_m2=statistics.median(valores).quantize(Decimal("0.01")),
+            muestras=len(valores),
+        )
+        for (comuna, tipo), valores in por_grupo.items()
+    ]
+
+
+def recalcular_comunas(comunas):
+    """Reemplaza las filas de `comunas` con sus medianas actuales."""
+    comunas = {c for c in comunas if c}
+    if not comunas:
+        return 0
+    filas = _filas(_muestra(Propiedad.objects.filter(comuna__in=comunas)))
+    with transaction.atomic():
+        ValorMercadoComuna.objects.filter(comuna__in=comunas).delete()
+        ValorMercadoComuna.objects.bulk_create(filas)
+    invalidar()
+    return len(filas)
+
+
+def recalcular():
+    """Reconstruye la tabla completa (cargas masivas, queryset.update())."""
+    filas = _filas(_muestra(Propiedad.objects.all()).iterator(chunk_size=5000))
+    with transaction.atomic():
+        ValorMercadoComuna.objects.all().delete()
+        ValorMercadoComuna.objects.bulk_create(filas, batch_size=1000)
+    invalidar()
+    return len(filas)
+
+
+def comunas_afectadas(anterior, nuevo):
+    """
+    Comunas a recalcular por el paso de `anterior` a `nuevo` (dicts con
+    CAMPOS_ESTADO, None si no existía / se borró).
+    """
+    if anterior is not None and nuevo is not None and all(
+        anterior.get(c) == nuevo.get(c) for c in CAMPOS_ESTADO
+    ):
+        return set()
+    return {
+        estado["comuna"]
+        for estado in (anterior, nuevo)
+        if estado and estado.get("publicada") and estado.get("tipo_operacion") == "venta"
+    }
+
+
+def tabla():
+    """{(comuna, tipo): uf_m2} con los grupos de muestra suficiente."""
+    valores = cache.obtener("tabla")
+    if valores is None:
+        minimo = getattr(settings, "VALORES_MERCADO_MIN_MUESTRAS", 8)
+        valores = cache.guardar("tabla", {
+            (comuna, tipo): float(uf_m2)
+            for comuna, tipo, uf_m2 in ValorMercadoComuna.objects.filter(
+                muestras__gte=minimo
+            ).values_list("comuna", "tipo_propiedad", "uf_m2")
+        })
+    return valores
+
+
+def invalidar():
+    cache.limpiar()
+    # Y de nuevo al confirmar, por si alguien recargó la tabla antes del commit
+    transaction.on_commit(cache.limpiar)
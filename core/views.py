@@ -1,14 +1,41 @@
 # core/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
+from django.urls import reverse
 from django.contrib import messages
-from .models import Propiedad, CarouselSlide, Lead
-from .forms import BusquedaPropiedadForm, LeadForm, QuieroPublicarForm
-from django.core.paginator import Paginator
+from .models import Propiedad, CarouselSlide, Lead, BusquedaGuardada
+from .forms import BusquedaPropiedadForm, GuardarBusquedaForm, LeadForm, QuieroPublicarForm
+from .paginacion import KeysetPaginator, PaginatorConteoCacheado, pagina_de_ids
+from .cache_resultados import ListaIds, ORDEN_LISTADO
 from urllib.parse import urlencode
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+import hashlib
 import json
-from .servicios_tasacion import estimar_precio_propiedad
+import math
+import os
+from datetime import datetime
+from decimal import Decimal
+from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db.models import Count, Max
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from .servicios_tasacion import escribir_csv, estimar_precio_memo, estimar_precios_lote, leer_csv
+from . import (
+    alertas, autocompletar, busqueda, cache_local, cache_resultados, cola_leads, comparables, facetas, geo, imagenes,
+    precios, similares,
+)
+
+
+def _publicadas():
+    """
+    Base de todas las vistas públicas. `agente` viene en el mismo SELECT
+    para que tarjetas y detalle no hagan una consulta extra por fila.
+    """
+    return Propiedad.objects.filter(publicada=True).select_related("agente")
 
 
 def home(request):
@@ -17,19 +44,22 @@ def home(request):
 
     # === Propiedades destacadas (máx. 6)
     destacadas = (
-        Propiedad.objects.filter(publicada=True, destacada=True)
+        _publicadas().filter(destacada=True)
         .order_by("-creado")[:6]
     )
 
     # === Propiedades recientes (máx. 9)
     recientes = (
-        Propiedad.objects.filter(publicada=True)
+        _publicadas()
         .order_by("-creado")[:9]
     )
 
     # === Formulario de búsqueda
     form = BusquedaPropiedadForm()
 
+    slides = list(slides)
+    imagenes.precargar([s.imagen.name for s in slides])
+
     return render(
         request,
         "core/home.html",
@@ -42,19 +72,18 @@ def home(request):
     )
 
 
-def propiedad_list(request):
-    form = BusquedaPropiedadForm(request.GET or None)
-    qs = Propiedad.objects.filter(publicada=True)
+def _filtrar_propiedades(form):
+    """
+    Aplica los filtros de BusquedaPropiedadForm sobre las publicadas.
 
-    if form.is_valid():
-        q = form.cleaned_data.get("q")
-        if q:
-            qs = qs.filter(
-                Q(titulo__icontains=q)
-                | Q(descripcion__icontains=q)
-                | Q(comuna__icontains=q)
-            )
+    Retorna (qs, ids_relevancia): si hubo búsqueda de texto con motor
+    disponible, ids_relevancia trae los ids rankeados (qs ya restringido a
+    ellos); si no, es None y el orden lo define quien llama.
+    """
+    qs = _publicadas()
+    ids_relevancia = None
 
+    if form.is_valid():
         tipo_operacion = form.cleaned_data.get("tipo_operacion")
         tipo_propiedad = form.cleaned_data.get("tipo_propiedad")
         region = form.cleaned_data.get("region")
@@ -62,6 +91,7 @@ def propiedad_list(request):
         max_precio = form.cleaned_data.get("max_precio")
         dormitorios = form.cleaned_data.get("dormitorios")
         comuna = form.cleaned_data.get("comuna")
+        campo_precio = precios.campo(form.cleaned_data.get("moneda"))
 
         if tipo_operacion:
             qs = qs.filter(tipo_operacion=tipo_operacion)
@@ -70,18 +100,55 @@ def propiedad_list(request):
         if region:
             qs = qs.filter(region=region)
 
-        # Filtros de precio ahora sobre UF
+        # Precio en la moneda elegida (UF por defecto), sobre los precios
+        # efectivos: incluye las propiedades que solo tienen precio_clp
         if min_precio is not None:
-            qs = qs.filter(precio_uf__gte=min_precio)
+            qs = qs.filter(**{f"{campo_precio}__gte": min_precio})
         if max_precio is not None:
-            qs = qs.filter(precio_uf__lte=max_precio)
+            qs = qs.filter(**{f"{campo_precio}__lte": max_precio})
 
         if dormitorios:
             qs = qs.filter(dormitorios__gte=dormitorios)
         if comuna:
             qs = qs.filter(comuna=comuna)
+
+        # El texto va al final: el motor recibe los demás filtros y el tope
+        # de resultados se aplica sobre las filas que sí se muestran
+        q = form.cleaned_data.get("q")
+        if q:
+            ids_relevancia = busqueda.buscar_ids(q, qs)
+            if ids_relevancia is None:
+                qs = qs.filter(busqueda.filtro_fallback(q))
+            else:
+                qs = qs.filter(id__in=ids_relevancia)
+
+    return qs, ids_relevancia
+
+
+def _resultados(form):
+    """
+    (qs, lista): ids ordenados por filtros normalizados desde
+    core/cache_resultados.py (en un miss se calculan y se guardan) y el
+    queryset filtrado para leer las filas. Armar qs sin `q` no toca la BD.
+    """
+    filtros = cache_resultados.filtros_de_form(form)
+    lista = cache_resultados.obtener(filtros)
+    if lista is None:
+        qs, ids_relevancia = _filtrar_propiedades(form)
+        lista = cache_resultados.guardar(filtros, ListaIds.desde_queryset(qs, ids_relevancia))
+    elif lista.por_relevancia:
+        # No repetimos la búsqueda de texto: la lista ya trae el resultado
+        qs = _publicadas()
     else:
-        tipo_operacion = tipo_propiedad = comuna = None
+        qs, _ = _filtrar_propiedades(form)
+    return qs, lista
+
+
+def propiedad_list(request):
+    form = BusquedaPropiedadForm(request.GET or None)
+
+    # ===== RESULTADOS =====
+    qs, lista = _resultados(form)
 
     # ===== TÍTULO DINÁMICO =====
     def choices_dict(field_name):
@@ -124,29 +191,47 @@ def propiedad_list(request):
         titulo = f"{titulo} en {form.cleaned_data['comuna']}"
 
     # ===== PAGINACIÓN =====
-    # ✅ FIX: el campo correcto es "destacada" (con 'a' al final)
-    qs = qs.order_by("-destacada", "-creado")
-
-    paginator = Paginator(qs, 12)
+    # - búsqueda de texto: por número de página sobre los ids rankeados
+    # - ?page=N (links antiguos): sobre la lista cacheada si está completa,
+    #   si no Paginator clásico con COUNT cacheado
+    # - resto: cursor (keyset), sin OFFSET ni COUNT por request
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    modo_cursor = False
+    if lista.por_relevancia or (page_number and lista.completa):
+        page_obj = pagina_de_ids(lista.ids, page_number, qs, 12)
+    elif page_number:
+        # ✅ FIX: el campo correcto es "destacada" (con 'a' al final)
+        qs = qs.order_by(*ORDEN_LISTADO)
+        page_obj = PaginatorConteoCacheado(qs, 12).get_page(page_number)
+    else:
+        modo_cursor = True
+        page_obj = KeysetPaginator(qs, 12, lista=lista).pagina(request.GET.get("cursor"))
+
+    # Conteos por opción en los selects (después del título, que usa las etiquetas limpias)
+    form.aplicar_conteos(facetas.conteos())
 
-    # ===== QUERYSTRING (sin 'page') para que el título/filtros persistan =====
+    # ===== QUERYSTRING (sin 'page'/'cursor') para que el título/filtros persistan =====
     params = request.GET.copy()
     params.pop("page", None)
+    params.pop("cursor", None)
     qs_str = params.urlencode()
 
     context = {
         "form": form,
+        "form_guardar": GuardarBusquedaForm(),
         "propiedades": page_obj,
         "titulo": titulo,
         "qs": qs_str,  # 👈 usar en los links del paginador
+        "modo_cursor": modo_cursor,
+        "total": page_obj.paginator.count,
     }
     return render(request, "core/propiedad_list.html", context)
 
 
 def propiedad_detail(request, slug):
-    prop = get_object_or_404(Propiedad, slug=slug, publicada=True)
+    # La galería recorre prop.imagenes.all dos veces (carrusel y miniaturas):
+    # con el prefetch es una sola consulta
+    prop = get_object_or_404(_publicadas().prefetch_related("imagenes"), slug=slug)
 
     form = LeadForm(request.POST or None)
     if request.method == "POST" and form.is_valid():
@@ -156,7 +241,79 @@ def propiedad_detail(request, slug):
         messages.success(request, "¡Gracias! Te contactaremos pronto.")
         return redirect("core:propiedad_detail", slug=slug)
 
-    return render(request, "core/propiedad_detail.html", {"prop": prop, "form": form})
+    # srcset de portada y galería: todas las derivadas en una consulta
+    imagenes.precargar([prop.portada.name] + [img.imagen.name for img in prop.imagenes.all()])
+
+    # Recomendaciones: ids desde la matriz en memoria (core/similares.py), filas en una consulta
+    ids_similares = similares.para(prop, k=4)
+    por_id = _publicadas().in_bulk(ids_similares)
+    lista_similares = [por_id[pk] for pk in ids_similares if pk in por_id]
+
+    return render(
+        request,
+        "core/propiedad_detail.html",
+        {"prop": prop, "form": form, "similares": lista_similares},
+    )
+
+
+@require_POST
+def busqueda_guardar(request):
+    """
+    Guarda los filtros actuales del listado con un email para avisar de
+    nuevas publicaciones (core/alertas.py) y envía el correo de confirmación:
+    sin confirmar no sale ningún aviso. Vuelve al mismo listado.
+    """
+    busqueda = BusquedaPropiedadForm(request.POST)
+    form = GuardarBusquedaForm(request.POST)
+    volver = reverse("core:propiedad_list")
+    if busqueda.is_valid() and form.is_valid():
+        guardada = BusquedaGuardada.desde_form(busqueda, form.cleaned_data["email"])
+        try:
+            # Rangos del modelo (p.ej. un precio que no cabe en la columna)
+            guardada.full_clean()
+        except ValidationError:
+            return HttpResponseBadRequest("Filtros inválidos")
+        guardada.save()
+        alertas.enviar_confirmacion(guardada)
+        messages.success(
+            request, f"Te enviamos un correo a {guardada.email}: confirma la búsqueda para empezar a recibir avisos."
+        )
+        qs = guardada.querystring()
+    else:
+        messages.error(request, "Revisa el email ingresado." if busqueda.is_valid() else "Revisa los filtros de la búsqueda.")
+        qs = urlencode({k: v for k, v in request.POST.items() if k in BusquedaGuardada.FILTROS and v})
+    return redirect(f"{volver}?{qs}" if qs else volver)
+
+
+def busqueda_confirmar(request, token):
+    """GET muestra la confirmación; el cambio va por POST (los links de correo se pre-cargan)."""
+    guardada = get_object_or_404(BusquedaGuardada, token=token, activa=True)
+    if request.method == "POST":
+        BusquedaGuardada.objects.filter(pk=guardada.pk, confirmada__isnull=True).update(confirmada=timezone.now())
+        messages.success(request, "¡Listo! Te avisaremos cuando se publique algo que calce con tu búsqueda.")
+        qs = guardada.querystring()
+        volver = reverse("core:propiedad_list")
+        return redirect(f"{volver}?{qs}" if qs else volver)
+    return render(request, "core/busqueda_accion.html", {
+        "busqueda": guardada,
+        "titulo": "Confirmar búsqueda guardada",
+        "texto": f"Recibirás en {guardada.email} un aviso por cada propiedad nueva que calce con:",
+        "boton": "Confirmar y recibir avisos",
+    })
+
+
+def busqueda_baja(request, token):
+    guardada = get_object_or_404(BusquedaGuardada, token=token)
+    if request.method == "POST":
+        BusquedaGuardada.objects.filter(pk=guardada.pk).update(activa=False)
+        messages.success(request, "Listo, no te enviaremos más avisos de esa búsqueda.")
+        return redirect("core:home")
+    return render(request, "core/busqueda_accion.html", {
+        "busqueda": guardada,
+        "titulo": "Dejar de recibir avisos",
+        "texto": f"Dejaremos de enviar a {guardada.email} los avisos de:",
+        "boton": "Darme de baja",
+    })
 
 
 def contacto(request):
@@ -237,11 +394,13 @@ def estimador_view(request):
     """
     return render(request, "core/estimador.html", {"comunas": COMUNAS_RM})
 
-def api_tasacion(request):
+def _tasacion(request):
     """
-    Endpoint JSON que recibe los datos de la propiedad (por POST o GET)
-    y devuelve el rango de precio estimado en UF.
+    (datos, status, resultado) del request, calculado una sola vez: lo usan
+    la ETag y la vista. Con error, `resultado` es {"error": ...}.
     """
+    if hasattr(request, "_tasacion"):
+        return request._tasacion
     # Intentar leer desde POST JSON primero, sino POST normal, sino GET
     if request.method == "POST":
         try:
@@ -252,37 +411,320 @@ def api_tasacion(request):
         datos = request.GET.dict()
 
     if not datos.get("comuna"):
-        return JsonResponse({"error": "Faltan datos de la comuna"}, status=400)
+        request._tasacion = (datos, 400, {"error": "Faltan datos de la comuna"})
+        return request._tasacion
 
     try:
-        precio_min, precio_max = estimar_precio_propiedad(datos)
-        
-        # Guardar el Lead si se envió información de contacto
-        nombre = datos.get("lead_nombre")
-        email = datos.get("lead_email")
-        if nombre and email:
-            telefono = datos.get("lead_telefono", "")
-            mensaje_tasacion = (
-                f"Consulta de Tasación:\n"
-                f"Comuna: {datos.get('comuna')}\n"
-                f"Tipo: {datos.get('tipo_propiedad')}\n"
-                f"Construidos: {datos.get('sup_construida')} m2\n"
-                f"Tasación sugerida: {precio_min} - {precio_max} UF"
-            )
-            Lead.objects.create(
-                propiedad=None,
-                nombre=nombre,
-                email=email,
-                telefono=telefono,
-                mensaje=mensaje_tasacion,
-                comuna=datos.get("comuna"),
-                origen="tasador_virtual"
-            )
-        
-        return JsonResponse({
-            "precio_min_uf": precio_min,
-            "precio_max_uf": precio_max
-        })
+        if datos.get("modo") == "comparables":
+            resultado = comparables.estimar(datos)
+            resultado["modo"] = "comparables"
+        else:
+            precio_min, precio_max = estimar_precio_memo(datos)
+            resultado = {"precio_min_uf": precio_min, "precio_max_uf": precio_max}
+        request._tasacion = (datos, 200, resultado)
+    except ValueError as e:
+        status = 422 if datos.get("modo") == "comparables" else 500
+        request._tasacion = (datos, status, {"error": str(e)})
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        request._tasacion = (datos, 500, {"error": str(e)})
+    return request._tasacion
+
+
+def _tasacion_cacheable(request):
+    """GET sin datos de contacto: la respuesta depende solo de la URL."""
+    datos, status, _ = _tasacion(request)
+    return request.method == "GET" and status == 200 and not (
+        datos.get("lead_nombre") or datos.get("lead_email")
+    )
+
+
+def _tasacion_etag(request):
+    if not _tasacion_cacheable(request):
+        return None
+    _, _, resultado = _tasacion(request)
+    return hashlib.md5(json.dumps(resultado, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@condition(etag_func=_tasacion_etag)
+def api_tasacion(request):
+    """
+    Endpoint JSON que recibe los datos de la propiedad (por POST o GET)
+    y devuelve el rango de precio estimado en UF.
+
+    Con `modo=comparables` el rango sale de las propiedades publicadas más
+    parecidas (core/comparables.py) y la respuesta incluye cuáles fueron.
+    Los GET sin datos de contacto llevan ETag y Cache-Control público: el
+    wizard repite las mismas consultas al ir y volver entre pasos.
+    """
+    datos, status, resultado = _tasacion(request)
+    if status != 200:
+        return JsonResponse(resultado, status=status)
+    precio_min, precio_max = resultado["precio_min_uf"], resultado["precio_max_uf"]
+
+    # Guardar el Lead si se envió información de contacto
+    nombre = datos.get("lead_nombre")
+    email = datos.get("lead_email")
+    if nombre and email:
+        telefono = datos.get("lead_telefono", "")
+        mensaje_tasacion = (
+            f"Consulta de Tasación:\n"
+            f"Comuna: {datos.get('comuna')}\n"
+            f"Tipo: {datos.get('tipo_propiedad')}\n"
+            f"Construidos: {datos.get('sup_construida')} m2\n"
+            f"Tasación sugerida: {precio_min} - {precio_max} UF"
+        )
+        # A la cola en disco: la respuesta no espera el INSERT (ver core/cola_leads.py)
+        cola_leads.encolar(
+            nombre=nombre,
+            email=email,
+            telefono=telefono,
+            mensaje=mensaje_tasacion,
+            comuna=datos.get("comuna"),
+            origen="tasador_virtual"
+        )
 
+    resp = JsonResponse(resultado, json_dumps_params={"ensure_ascii": False})
+    if _tasacion_cacheable(request):
+        resp["Cache-Control"] = f"public, max-age={getattr(settings, 'TASACION_CACHE_MAX_AGE', 300)}"
+    else:
+        resp["Cache-Control"] = "private, no-store"
+    return resp
+
+
+@staff_member_required
+@require_POST
+def api_tasacion_lote(request):
+    """
+    Tasación de carteras completas (bancos, inmobiliarias). Recibe un CSV
+    (`archivo`, multipart) o JSON (lista de dicts o {"propiedades": [...]})
+    con las mismas claves que api_tasacion, y tasa todo de una vez con
+    estimar_precios_lote(). Responde CSV o JSON según `formato` (por
+    defecto, el mismo formato de la entrada). Solo staff; no genera leads.
+    """
+    archivo = request.FILES.get("archivo")
+    try:
+        if archivo:
+            filas = leer_csv(archivo.read().decode("utf-8-sig"))
+        else:
+            datos = json.loads(request.body)
+            filas = datos.get("propiedades") if isinstance(datos, dict) else datos
+            if not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+                raise ValueError
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({"error": "Envía un CSV en 'archivo' o una lista JSON de propiedades"}, status=400)
+
+    max_filas = getattr(settings, "TASACION_LOTE_MAX_FILAS", 50000)
+    if len(filas) > max_filas:
+        return JsonResponse({"error": f"Máximo {max_filas} filas por lote"}, status=413)
+
+    precios_min, precios_max, errores = estimar_precios_lote(filas)
+
+    formato = request.GET.get("formato") or ("csv" if archivo else "json")
+    if formato == "csv":
+        resp = HttpResponse(content_type="text/csv; charset=utf-8")
+        resp["Content-Disposition"] = 'attachment; filename="tasacion.csv"'
+        escribir_csv(resp, filas, precios_min, precios_max, errores)
+        return resp
+
+    resultados = [
+        {"fila": i, "error": errores[i]} if i in errores
+        else {"fila": i, "precio_min_uf": mn, "precio_max_uf": mx}
+        for i, (mn, mx) in enumerate(zip(precios_min.tolist(), precios_max.tolist()))
+    ]
+    return JsonResponse(
+        {"total": len(filas), "errores": len(errores), "resultados": resultados},
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+# ===========================
+# API JSON del listado
+# ===========================
+# Columnas que se pueden pedir con ?fields=a,b,c. `descripcion` (TextField
+# largo) solo viaja si se pide explícitamente.
+API_CAMPOS = (
+    "id", "slug", "titulo", "tipo_operacion", "tipo_propiedad", "region", "comuna",
+    "direccion", "latitud", "longitud", "precio_uf", "precio_clp", "dormitorios", "banos", "estacionamientos",
+    "sup_construida_m2", "sup_terreno_m2", "ano_construccion", "destacada", "portada",
+    "creado", "actualizado", "descripcion",
+)
+API_CAMPOS_DEFECTO = tuple(c for c in API_CAMPOS if c != "descripcion")
+API_POR_PAGINA = 24
+API_POR_PAGINA_MAX = 100
+
+
+def _api_campos(request):
+    pedidos = [c.strip() for c in request.GET.get("fields", "").split(",") if c.strip()]
+    if not pedidos:
+        return API_CAMPOS_DEFECTO
+    # Orden del whitelist; lo desconocido se ignora. `id` siempre va.
+    return tuple(c for c in API_CAMPOS if c in pedidos or c == "id")
+
+
+def _api_por_pagina(request):
+    try:
+        n = int(request.GET.get("por_pagina", API_POR_PAGINA))
+    except ValueError:
+        n = API_POR_PAGINA
+    return max(1, min(n, API_POR_PAGINA_MAX))
+
+
+def _api_estado(request):
+    """
+    Filtra una sola vez por request (la usan el ETag, el Last-Modified y la
+    vista): (qs, lista, ultimo actualizado, total).
+    """
+    if not hasattr(request, "_api_estado"):
+        form = BusquedaPropiedadForm(request.GET or None)
+        qs, lista = _resultados(form)
+        base = qs.filter(id__in=lista.ids) if lista.completa else qs
+        agregado = base.order_by().aggregate(ultimo=Max("actualizado"), total=Count("id"))
+        request._api_estado = (qs, lista, agregado["ultimo"], agregado["total"])
+    return request._api_estado
+
+
+def _api_etag(request):
+    _, _, ultimo, total = _api_estado(request)
+    # `total` cubre bajas/despublicaciones, que no mueven el máximo de `actualizado`
+    firma = "|".join((
+        request.GET.urlencode(), ",".join(_api_campos(request)),
+        ultimo.isoformat() if ultimo else "", str(total),
+    ))
+    return hashlib.md5(firma.encode("utf-8")).hexdigest()
+
+
+def _api_last_modified(request):
+    return _api_estado(request)[2]
+
+
+def _api_valor(campo, valor):
+    if valor is None:
+        return None
+    if campo == "portada":
+        return default_storage.url(valor) if valor else None
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+@require_GET
+@gzip_page
+@condition(etag_func=_api_etag, last_modified_func=_api_last_modified)
+def api_propiedades(request):
+    """
+    Listado en JSON con los mismos filtros que /propiedades/ (mobile y
+    portales). Proyección con values() y ?fields= opcional, paginado con
+    ?page=N&por_pagina=M. Responde 304 si el resultado no cambió.
+    """
+    qs, lista, _, total = _api_estado(request)
+    campos = _api_campos(request)
+    por_pagina = _api_por_pagina(request)
+
+    if lista.completa:
+        page = Paginator(lista.ids, por_pagina).get_page(request.GET.get("page"))
+        filas = {f["id"]: f for f in qs.filter(id__in=page.object_list).values(*campos)}
+        filas = [filas[pk] for pk in page.object_list if pk in filas]
+    else:
+        page = PaginatorConteoCacheado(
+            qs.order_by(*ORDEN_LISTADO).values(*campos), por_pagina
+        ).get_page(request.GET.get("page"))
+        filas = list(page.object_list)
+
+    return JsonResponse({
+        "total": total,
+        "pagina": page.number,
+        "paginas": page.paginator.num_pages,
+        "resultados": [{c: _api_valor(c, f[c]) for c in campos} for f in filas],
+    }, json_dumps_params={"ensure_ascii": False})
+
+
+# ===========================
+# API de búsqueda en mapa
+# ===========================
+MAPA_CAMPOS = ("id", "slug", "titulo", "tipo_operacion", "tipo_propiedad", "comuna", "precio_uf", "destacada")
+MAPA_LIMITE = 500
+MAPA_RADIO_MAX_KM = 50
+
+
+def _finitos(textos):
+    """float() de cada texto; ValueError también con inf/nan (float() los acepta)."""
+    valores = [float(t) for t in textos]
+    if not all(map(math.isfinite, valores)):
+        raise ValueError("valor no finito")
+    return valores
+
+
+def _floats(request, *nombres):
+    try:
+        return _finitos(request.GET[n] for n in nombres)
+    except (KeyError, ValueError):
+        return None
+
+
+@require_GET
+@gzip_page
+def api_mapa(request):
+    """
+    Propiedades en un área del mapa, con los mismos filtros del listado:
+      ?bbox=min_lng,min_lat,max_lng,max_lat      (viewport)
+      ?lat=..&lng=..&radio_km=..                 (círculo; ordena por distancia)
+    Las sin coordenadas aparecen en el centroide de su comuna (aproximada=true).
+    """
+    centro = radio = None
+    if request.GET.get("bbox"):
+        try:
+            min_lng, min_lat, max_lng, max_lat = _finitos(request.GET["bbox"].split(","))
+        except ValueError:
+            return JsonResponse({"error": "bbox debe ser min_lng,min_lat,max_lng,max_lat"}, status=400)
+        if min_lat > max_lat or min_lng > max_lng:
+            return JsonResponse({"error": "bbox invertido"}, status=400)
+    else:
+        valores = _floats(request, "lat", "lng", "radio_km")
+        if valores is None:
+            return JsonResponse({"error": "Falta bbox o lat/lng/radio_km"}, status=400)
+        lat, lng, radio = valores
+        radio = max(0.0, min(radio, MAPA_RADIO_MAX_KM))
+        centro = (lat, lng)
+        min_lat, min_lng, max_lat, max_lng = geo.bbox_radio(lat, lng, radio)
+
+    form = BusquedaPropiedadForm(request.GET or None)
+    qs, _ = _filtrar_propiedades(form)
+    filas = geo.en_area(
+        qs.order_by(*ORDEN_LISTADO), min_lat, min_lng, max_lat, max_lng, MAPA_CAMPOS,
+        centro=centro, radio_km=radio, limite=MAPA_LIMITE,
+    )
+    for f in filas:
+        f["precio_uf"] = _api_valor("precio_uf", f["precio_uf"])
+    return JsonResponse({"total": len(filas), "limite": MAPA_LIMITE, "resultados": filas},
+                        json_dumps_params={"ensure_ascii": False})
+
+
+# ===========================
+# Autocompletado del buscador
+# ===========================
+@require_GET
+def api_autocompletar(request):
+    """
+    Sugerencias para el buscador del navbar (?q=prefijo): comunas, tipos y
+    títulos publicados, desde el trie en memoria de core/autocompletar.py.
+    """
+    try:
+        limite = max(1, min(int(request.GET.get("limite", 8)), autocompletar.TOP_POR_NODO))
+    except ValueError:
+        limite = 8
+    q = request.GET.get("q", "")
+    resp = JsonResponse({"q": q, "sugerencias": autocompletar.sugerir(q, limite)},
+                        json_dumps_params={"ensure_ascii": False})
+    resp["Cache-Control"] = "public, max-age=60"
+    return resp
+
+
+@staff_member_required
+def api_metricas(request):
+    """
+    Contadores de las cachés en proceso de este worker (aciertos, fallos,
+    desalojos...) para dimensionarlas. Solo staff.
+    """
+    return JsonResponse({"pid": os.getpid(), "caches": cache_local.metricas()})
@@ -107,6 +107,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.uf",
             ],
         },
     },
@@ -193,6 +194,92 @@ CLOUDINARY_STORAGE = {
     "SECURE": True, # <--- FORZAR HTTPS EN IMÁGENES
 }
 
+# =====================
+# LISTADO DE PROPIEDADES
+# =====================
+# Segundos que se cachea el COUNT(*) del listado ("N propiedades"); 0 = no mostrar total
+LISTADO_CONTEO_TTL = int(os.environ.get("LISTADO_CONTEO_TTL", "300"))
+
+# Caché en proceso de resultados del listado (filtros normalizados -> ids ordenados)
+RESULTADOS_CACHE_MAX_ENTRADAS = int(os.environ.get("RESULTADOS_CACHE_MAX_ENTRADAS", "256"))
+RESULTADOS_CACHE_TTL = int(os.environ.get("RESULTADOS_CACHE_TTL", "120"))
+RESULTADOS_CACHE_MAX_IDS = int(os.environ.get("RESULTADOS_CACHE_MAX_IDS", "1000"))
+
+# Caché de fragmentos de las tarjetas de propiedad (se invalida al guardar)
+TARJETAS_CACHE_TTL = int(os.environ.get("TARJETAS_CACHE_TTL", str(24 * 60 * 60)))
+
+# Índice de autocompletado (en memoria por worker); se reconstruye al cambiar
+# una propiedad en este worker y, en los demás, al vencer el TTL
+AUTOCOMPLETAR_TTL = int(os.environ.get("AUTOCOMPLETAR_TTL", "300"))
+
+# "Propiedades similares": matriz de características en memoria (filas
+# máximas y TTL por worker) y caché del resultado por propiedad
+SIMILARES_MAX_FILAS = int(os.environ.get("SIMILARES_MAX_FILAS", "50000"))
+SIMILARES_MATRIZ_TTL = int(os.environ.get("SIMILARES_MATRIZ_TTL", "600"))
+SIMILARES_CACHE_MAX_ENTRADAS = int(os.environ.get("SIMILARES_CACHE_MAX_ENTRADAS", "2048"))
+SIMILARES_CACHE_TTL = int(os.environ.get("SIMILARES_CACHE_TTL", "600"))
+
+# =====================
+# AVISOS DE BÚSQUEDAS GUARDADAS
+# =====================
+# URL pública para armar los links de los correos (el comando no tiene request)
+SITIO_URL = os.environ.get("SITIO_URL", "https://kcmpropiedades.cl")
+
+# =====================
+# TASACIÓN
+# =====================
+TASACION_LOTE_MAX_FILAS = int(os.environ.get("TASACION_LOTE_MAX_FILAS", "50000"))
+# Memo de tasaciones individuales y caché HTTP de los GET de /api/tasacion/
+TASACION_MEMO_MAX_ENTRADAS = int(os.environ.get("TASACION_MEMO_MAX_ENTRADAS", "4096"))
+TASACION_MEMO_TTL = int(os.environ.get("TASACION_MEMO_TTL", "3600"))
+TASACION_CACHE_MAX_AGE = int(os.environ.get("TASACION_CACHE_MAX_AGE", "300"))
+# Tabla de UF/m² calculada con las publicaciones (core/valores_mercado.py):
+# bajo este número de propiedades por grupo se usa el valor referencial.
+VALORES_MERCADO_MIN_MUESTRAS = int(os.environ.get("VALORES_MERCADO_MIN_MUESTRAS", "8"))
+VALORES_MERCADO_TTL = int(os.environ.get("VALORES_MERCADO_TTL", "600"))
+# Tasación por comparables (core/comparables.py)
+COMPARABLES_K = int(os.environ.get("COMPARABLES_K", "8"))
+COMPARABLES_TTL = int(os.environ.get("COMPARABLES_TTL", "600"))
+
+# =====================
+# COLA DE LEADS DEL TASADOR
+# =====================
+# Spool en disco que vacía `python manage.py procesar_leads` (core/cola_leads.py)
+LEADS_SPOOL_DIR = Path(os.environ.get("LEADS_SPOOL_DIR", BASE_DIR / "var" / "leads"))
+
+# =====================
+# IMÁGENES RESPONSIVAS
+# =====================
+# Derivadas WebP por ancho para srcset (core/imagenes.py); backfill con
+# `python manage.py generar_derivadas`.
+IMAGENES_ANCHOS = (320, 640, 960, 1280, 1920)
+IMAGENES_CALIDAD_WEBP = int(os.environ.get("IMAGENES_CALIDAD_WEBP", "78"))
+
+# =====================
+# FOTOS SUBIDAS EN LOTE (ADMIN)
+# =====================
+# El admin deja las fotos en este directorio local y `python manage.py
+# procesar_fotos` las procesa y sube al storage (core/cola_fotos.py).
+FOTOS_STAGING_DIR = Path(os.environ.get("FOTOS_STAGING_DIR", BASE_DIR / "var" / "fotos"))
+FOTOS_HILOS = int(os.environ.get("FOTOS_HILOS", "4"))
+# Lado mayor máximo de la foto publicada (px) y calidad JPEG
+FOTOS_MAX_LADO = int(os.environ.get("FOTOS_MAX_LADO", "2560"))
+FOTOS_CALIDAD_JPEG = int(os.environ.get("FOTOS_CALIDAD_JPEG", "85"))
+# Segundos tras los cuales una foto "procesando" (worker caído) vuelve a la cola
+FOTOS_PROCESANDO_TIMEOUT = int(os.environ.get("FOTOS_PROCESANDO_TIMEOUT", "900"))
+
+# =====================
+# UF DEL DÍA
+# =====================
+# `python manage.py actualizar_uf` (cron diario) la trae de UF_FUENTE a ValorUF.
+# Para ambientes sin internet: UF_FUENTE=core.servicios_uf.FuenteArchivo + UF_FUENTE_ARCHIVO.
+# La serie histórica se carga una vez con `actualizar_uf --archivo historico.csv`.
+UF_FUENTE = os.environ.get("UF_FUENTE", "core.servicios_uf.FuenteMindicador")
+UF_FUENTE_ARCHIVO = os.environ.get("UF_FUENTE_ARCHIVO", "")
+UF_CACHE_TTL = int(os.environ.get("UF_CACHE_TTL", "3600"))
+# Valor de respaldo si la tabla está vacía (recién desplegado, sin cron aún)
+UF_RESPALDO = os.environ.get("UF_RESPALDO", "37900")
+
 # =====================
 # DEFAULT PK
 # =====================
@@ -0,0 +1,66 @@
+/**
+ * autocompletar.js — Sugerencias del buscador (navbar y overlay)
+ *
+ * Cada <input data-autocompletar="URL" list="ID"> consulta /api/autocompletar/
+ * mientras se escribe (con debounce) y llena su <datalist>. Si al enviar el
+ * texto calza exacto con una sugerencia, se navega directo a su URL
+ * (comuna/tipo -> listado filtrado, título -> ficha).
+ *
+ * Dependencias: ninguna (vanilla JS).
+ */
+
+(function () {
+  "use strict";
+
+  const ESPERA_MS = 120;
+  const MIN_CARACTERES = 2;
+
+  function conectar(input) {
+    const url = input.dataset.autocompletar;
+    const lista = document.getElementById(input.getAttribute("list"));
+    if (!url || !lista) return;
+
+    let temporizador = null;
+    let ultimaConsulta = "";
+    let porTexto = new Map();
+
+    function pintar(sugerencias) {
+      porTexto = new Map();
+      lista.innerHTML = "";
+      sugerencias.forEach((s) => {
+        porTexto.set(s.texto.toLowerCase(), s);
+        const opt = document.createElement("option");
+        opt.value = s.texto;
+        lista.appendChild(opt);
+      });
+    }
+
+    function consultar() {
+      const q = input.value.trim();
+      if (q.length < MIN_CARACTERES || q === ultimaConsulta) return;
+      ultimaConsulta = q;
+      fetch(url + "?q=" + encodeURIComponent(q), { headers: { Accept: "application/json" } })
+        .then((r) => (r.ok ? r.json() : null))
+        .then((data) => {
+          // Descarta respuestas viejas si el usuario siguió escribiendo
+          if (data && data.q === input.value.trim()) pintar(data.sugerencias || []);
+        })
+        .catch(() => {});
+    }
+
+    input.addEventListener("input", () => {
+      clearTimeout(temporizador);
+      temporizador = setTimeout(consultar, ESPERA_MS);
+    });
+
+    input.form?.addEventListener("submit", (ev) => {
+      const elegida = porTexto.get(input.value.trim().toLowerCase());
+      if (elegida && elegida.url) {
+        ev.preventDefault();
+        window.location.href = elegida.url;
+      }
+    });
+  }
+
+  document.querySelectorAll("input[data-autocompletar]").forEach(conectar);
+})();
@@ -178,14 +178,6 @@
         input.addEventListener("input", () => calcular(sim));
       });
 
-      // Recalcular cuando llegue la UF del día (si aún no estaba disponible)
-      const observer = setInterval(() => {
-        if (Number.isFinite(window.__UF_HOY_CLP)) {
-          calcular(sim);
-          clearInterval(observer);
-        }
-      }, 400);
-      setTimeout(() => clearInterval(observer), 10000);
     }
   }
 